@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Compare the time taken to reset the test database between tests using
+Django's default strategy (flush every table, then reload the fixtures) and
+using database snapshots (restore the post-fixture snapshot at the start of
+each test and the empty one at the end; the ``SELENIUM_DATABASE_SNAPSHOTS``
+setting).  Uses the database configured in the test settings, with a
+generated fixture of users.
+
+Usage (from the repository root)::
+
+    python benchmarks/database_reset.py [number of users] [number of samples]
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+
+
+def write_fixture(directory, count):
+    """Create a fixture of the given number of users, returning its path"""
+    users = [{
+        'pk': i,
+        'model': 'auth.user',
+        'fields': {
+            'username': 'user%d' % i,
+            'password': '!',
+            'email': 'user%d@example.com' % i,
+            'date_joined': '2015-01-01T00:00:00Z',
+            'last_login': '2015-01-01T00:00:00Z',
+        },
+    } for i in range(1, count + 1)]
+    path = os.path.join(directory, 'benchmark_users.json')
+    with open(path, 'w') as f:
+        json.dump(users, f)
+    return path
+
+
+def median(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2]
+
+
+def main(users, count):
+    from django.core.management import call_command
+    from django.db import connection
+    from sbo_selenium import snapshots
+
+    directory = tempfile.mkdtemp()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        fixture = write_fixture(directory, users)
+
+        def flush_and_load():
+            call_command('flush', verbosity=0, interactive=False,
+                         skip_validation=True)
+            call_command('loaddata', fixture, verbosity=0,
+                         skip_validation=True)
+
+        flush_and_load()
+        default = []
+        for _i in range(count):
+            start = time.time()
+            flush_and_load()
+            default.append(time.time() - start)
+
+        call_command('flush', verbosity=0, interactive=False,
+                     skip_validation=True)
+        empty = snapshots.save('default', None)
+        call_command('loaddata', fixture, verbosity=0, skip_validation=True)
+        loaded = snapshots.save('default', (fixture,))
+        restore = []
+        for _i in range(count):
+            start = time.time()
+            empty.restore()
+            loaded.restore()
+            restore.append(time.time() - start)
+        snapshots.clear()
+
+        print('Resetting %s database with %d users (median of %d):' % (
+            connection.vendor, users, count))
+        print('  flush and loaddata  %8.1f ms' % (median(default) * 1000))
+        print('  snapshot restore    %8.1f ms' % (median(restore) * 1000))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Measure the cold-start import time of the ``selenium`` management command
+and of the SeleniumTestCase class.  Each sample is taken in a fresh Python
+interpreter, after Django's settings have been loaded, so only the cost of
+importing sbo-selenium and its dependencies is counted.
+
+Usage (from the repository root)::
+
+    python benchmarks/import_time.py [number of samples]
+"""
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = (
+    ('manage.py selenium', 'import sbo_selenium.management.commands.selenium'),
+    ('SeleniumTestCase', 'from sbo_selenium import SeleniumTestCase'),
+)
+
+SAMPLE_SCRIPT = """
+import time
+from django.conf import settings
+settings.INSTALLED_APPS
+start = time.time()
+%s
+print(time.time() - start)
+"""
+
+
+def sample(statement):
+    """Time a single import of the given statement in a new interpreter"""
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+    env['PYTHONPATH'] = ROOT_DIR
+    output = subprocess.check_output(
+        [sys.executable, '-c', SAMPLE_SCRIPT % statement], cwd=ROOT_DIR,
+        env=env)
+    return float(output.strip().splitlines()[-1]) * 1000
+
+
+def main(count):
+    for label, statement in TARGETS:
+        samples = sorted(sample(statement) for _ in range(count))
+        median = samples[len(samples) // 2]
+        print('%-20s median %7.1f ms  min %7.1f ms  max %7.1f ms' % (
+            label, median, samples[0], samples[-1]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
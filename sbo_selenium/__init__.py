@@ -1 +1,28 @@
-from testcase import SeleniumTestCase  # flake8: noqa
+"""
+Selenium testing framework for Django applications.
+
+``SeleniumTestCase`` is only imported from ``sbo_selenium.testcase`` the first
+time it's accessed, so code which just needs the settings or the ``selenium``
+management command doesn't pay for importing Selenium, Django's test server,
+and so forth.
+"""
+import sys
+import types
+
+
+class LazyPackage(types.ModuleType):
+    """Module type for this package which imports its contents on demand"""
+
+    def __getattr__(self, name):
+        if name == 'SeleniumTestCase':
+            from sbo_selenium.testcase import SeleniumTestCase
+            return SeleniumTestCase
+        raise AttributeError("'module' object has no attribute '%s'" % name)
+
+
+_package = LazyPackage(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+# Python 2 clears a module's globals when it's garbage collected, so keep the
+# original around
+_package._original_module = sys.modules[__name__]
+sys.modules[__name__] = _package
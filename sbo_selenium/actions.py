@@ -0,0 +1,80 @@
+"""
+Performing a sequence of form filling and clicking actions in a single
+WebDriver command.  Each action is a ``(name, selector[, value])`` sequence:
+
+* ``('set', selector, value)`` sets the value of a text field or text area,
+  selects the option of a select box with the given value or text (numbers
+  and other non-string values are compared as strings), or
+  checks (or unchecks, if the value is false) a checkbox or radio button,
+  then fires ``input`` and ``change`` events for it
+* ``('click', selector)`` clicks the element
+
+The script first finds all the elements (and for select boxes, the options);
+if any are missing or not visible yet, it does nothing and returns their
+selectors so the caller can try again.  Otherwise it performs all the actions
+in order and returns an empty list.
+"""
+from __future__ import absolute_import
+
+PERFORM_SCRIPT = """
+var actions = arguments[0], elements = [], waiting = [];
+function findOption(select, value) {
+  var text = String(value);
+  for (var i = 0; i < select.options.length; i++) {
+    var option = select.options[i];
+    if (option.value === text || option.text === text) { return option; }
+  }
+  return null;
+}
+function fire(element, name) {
+  var event = document.createEvent('HTMLEvents');
+  event.initEvent(name, true, true);
+  element.dispatchEvent(event);
+}
+for (var i = 0; i < actions.length; i++) {
+  var element = document.querySelector(actions[i][1]);
+  if (!element || !(element.offsetWidth || element.offsetHeight ||
+                    element.getClientRects().length) ||
+      (actions[i][0] === 'set' && element.tagName === 'SELECT' &&
+       !findOption(element, actions[i][2]))) {
+    waiting.push(actions[i][1]);
+  }
+  elements.push(element);
+}
+if (waiting.length) { return waiting; }
+for (var i = 0; i < actions.length; i++) {
+  var element = elements[i], value = actions[i][2];
+  if (actions[i][0] === 'click') {
+    element.click();
+    continue;
+  }
+  if (element.focus) { element.focus(); }
+  if (element.tagName === 'SELECT') {
+    findOption(element, value).selected = true;
+  } else if (element.type === 'checkbox' || element.type === 'radio') {
+    element.checked = !!value;
+  } else {
+    element.value = value;
+  }
+  fire(element, 'input');
+  fire(element, 'change');
+  if (element.blur) { element.blur(); }
+}
+return [];
+"""
+
+ACTIONS = frozenset(['click', 'set'])
+
+
+def normalize(actions):
+    """ Check a sequence of actions, returning them as a list of
+    ``[name, selector, value]`` lists for the script """
+    result = []
+    for action in actions:
+        action = list(action)
+        if len(action) not in (2, 3) or action[0] not in ACTIONS:
+            raise ValueError('Not a valid action: %r' % (action,))
+        if len(action) == 2:
+            action.append(None)
+        result.append(action)
+    return result
@@ -0,0 +1,220 @@
+"""
+Per-test performance baselines, for noticing when tests get slower.  When
+``SELENIUM_BASELINE_FILE`` (or the ``--baseline`` option of the ``selenium``
+command) is set, the duration of each passing test, the time it spent in each
+helper method (see ``sbo_selenium.steps``), and the number of times its waits
+had to poll again are recorded (including those of the threads started by
+``run_concurrently()``), and added to the file at the end of the run.
+The file keeps the measurements from the last ``SELENIUM_BASELINE_RUNS``
+runs of each test.
+
+With ``--compare-baseline``, the run's measurements are first compared to
+those from earlier runs: a measurement is a regression if it exceeds the
+earlier median by more than ``SELENIUM_BASELINE_THRESHOLD`` times the median
+absolute deviation (scaled to be comparable to a standard deviation), with
+some slack so that very consistent or very fast tests aren't flagged for
+noise.
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+
+from sbo_selenium import steps
+from sbo_selenium.conf import settings
+
+VERSION = 1
+# Number of earlier runs needed before a test's measurements are compared
+MIN_RUNS = 3
+# Scales the median absolute deviation to estimate the standard deviation
+MAD_SCALE = 1.4826
+# Increases smaller than these are never regressions
+MIN_RATIO = 0.1
+MIN_SECONDS = 0.1
+MIN_POLLS = 2
+
+_lock = threading.Lock()
+_local = threading.local()
+# Measurements from the current run: test ID -> metric -> list of values
+_measurements = {}
+_recording = []
+
+
+def path():
+    return os.getenv('SELENIUM_BASELINE_FILE', settings.SELENIUM_BASELINE_FILE)
+
+
+def enabled():
+    return bool(path())
+
+
+def start():
+    """ Start recording measurements for this run """
+    with _lock:
+        _measurements.clear()
+        if not _recording:
+            steps.add_listener(record_step)
+            _recording.append(True)
+
+
+def stop():
+    with _lock:
+        _measurements.clear()
+        if _recording:
+            steps.remove_listener(record_step)
+            del _recording[:]
+
+
+def recording():
+    return bool(_recording)
+
+
+class Counts(object):
+    """
+    The wait polls and helper times of one test run, which can be shared by
+    the threads it starts (see share_counts()).
+    """
+
+    def __init__(self):
+        self.polls = 0
+        self.steps = {}
+        self.lock = threading.Lock()
+
+
+def start_test():
+    """ Reset the current thread's count of wait polls and helper times """
+    _local.counts = Counts()
+
+
+def current_counts():
+    """ The counts of the test running in the current thread, if any """
+    return getattr(_local, 'counts', None)
+
+
+def share_counts(counts):
+    """ Add the wait polls and helper times of the current thread to the
+    given counts (from current_counts() in the thread which started it) """
+    _local.counts = counts
+
+
+def count_poll():
+    """ Note that a wait in the current thread had to poll again """
+    counts = current_counts()
+    if counts is None:
+        counts = _local.counts = Counts()
+    with counts.lock:
+        counts.polls += 1
+
+
+def record_step(test, name, seconds):
+    counts = current_counts()
+    if counts is None:
+        return
+    with counts.lock:
+        counts.steps[name] = counts.steps.get(name, 0.0) + seconds
+
+
+def record_test(test_id, duration):
+    """ Record the measurements of a passing test run in the current thread """
+    if not _recording:
+        return
+    counts = current_counts() or Counts()
+    with counts.lock:
+        values = {'duration': duration, 'polls': counts.polls}
+        for name, seconds in counts.steps.items():
+            values['step:%s' % name] = seconds
+    with _lock:
+        metrics = _measurements.setdefault(test_id, {})
+        for metric, value in values.items():
+            metrics.setdefault(metric, []).append(value)
+
+
+def measurements():
+    with _lock:
+        return dict((test_id, dict((metric, list(values))
+                                   for metric, values in metrics.items()))
+                    for test_id, metrics in _measurements.items())
+
+
+def load(file_path):
+    """ Read a baseline file, returning its test ID -> metric -> list of
+    values dictionary (empty if there's no file yet) """
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path) as f:
+        data = json.load(f)
+    if data.get('version') != VERSION:
+        return {}
+    return data.get('tests', {})
+
+
+def save(file_path, current=None, runs=None):
+    """ Add the current run's measurements (the median of each, if a test was
+    run more than once) to the baseline file, keeping only the most recent
+    ones """
+    current = measurements() if current is None else current
+    runs = runs or settings.SELENIUM_BASELINE_RUNS
+    tests = load(file_path)
+    for test_id, metrics in current.items():
+        history = tests.setdefault(test_id, {})
+        for metric, values in metrics.items():
+            kept = history.get(metric, []) + [median(values)]
+            history[metric] = kept[-runs:]
+    directory = os.path.dirname(os.path.abspath(file_path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    temp_path = '%s.%d.tmp' % (file_path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump({'version': VERSION, 'tests': tests}, f, indent=1,
+                  sort_keys=True)
+    os.rename(temp_path, file_path)
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def limit(history, threshold, metric):
+    """ The largest value of a metric which isn't a regression, given its
+    earlier values """
+    center = median(history)
+    mad = median([abs(value - center) for value in history])
+    floor = MIN_POLLS if metric == 'polls' else MIN_SECONDS
+    return center + max(threshold * MAD_SCALE * mad, center * MIN_RATIO,
+                        floor)
+
+
+def _describe(metric, value):
+    if metric == 'polls':
+        return '%g polls' % value
+    return '%.2f s' % value
+
+
+def compare(file_path, current=None, threshold=None):
+    """ Compare the current run's measurements to the baseline file,
+    returning a description of each regression """
+    current = measurements() if current is None else current
+    if threshold is None:
+        threshold = settings.SELENIUM_BASELINE_THRESHOLD
+    tests = load(file_path)
+    regressions = []
+    for test_id in sorted(current):
+        history = tests.get(test_id, {})
+        for metric in sorted(current[test_id]):
+            earlier = history.get(metric, [])
+            if len(earlier) < MIN_RUNS:
+                continue
+            value = median(current[test_id][metric])
+            if value > limit(earlier, threshold, metric):
+                center = median(earlier)
+                mad = median([abs(item - center) for item in earlier])
+                name = metric.replace('step:', '', 1)
+                regressions.append('%s %s: %s, was median %s (MAD %s)' % (
+                    test_id, name, _describe(metric, value),
+                    _describe(metric, center), _describe(metric, mad)))
+    return regressions
@@ -1,69 +1,369 @@
 from django.conf import settings as django_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
 
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
 
-class LazySettings(object):
+NUMBER_TYPES = six.integer_types + (float,)
 
-    @property
-    def DJANGO_LIVE_TEST_SERVER_ADDRESS(self):
-        """Address at which to run the test server"""
-        return getattr(django_settings, 'DJANGO_LIVE_TEST_SERVER_ADDRESS',
-                       'localhost:9001')
 
-    @property
-    def SELENIUM_DEFAULT_BROWSER(self):
-        """Default browser to use when running tests"""
-        return getattr(django_settings, 'SELENIUM_DEFAULT_BROWSER', ['chrome'])
+def is_boolean(value):
+    return isinstance(value, bool)
 
-    @property
-    def SELENIUM_DEFAULT_TESTS(self):
-        """Default Selenium test package to run"""
-        return getattr(django_settings, 'SELENIUM_DEFAULT_TESTS', [])
 
-    @property
-    def SELENIUM_POLL_FREQUENCY(self):
-        """Default operation retry frequency"""
-        return getattr(django_settings, 'SELENIUM_POLL_FREQUENCY', 0.5)
+def is_string(value):
+    return isinstance(value, six.string_types)
 
-    @property
-    def SELENIUM_JAR_PATH(self):
-        """Absolute path to the Selenium server jar file"""
-        return getattr(django_settings, 'SELENIUM_JAR_PATH', '')
 
-    @property
-    def SELENIUM_SAUCE_API_KEY(self):
-        """API key for the Sauce Labs account to use for running tests"""
-        return getattr(django_settings, 'SELENIUM_SAUCE_API_KEY', '')
+def is_string_list(value):
+    return isinstance(value, (list, tuple)) and all(is_string(item) for item in value)
 
-    @property
-    def SELENIUM_SAUCE_CONNECT_PATH(self):
-        """Absolute path to the Sauce Connect binary (for Sauce Labs)"""
-        return getattr(django_settings, 'SELENIUM_SAUCE_CONNECT_PATH', '')
 
-    @property
-    def SELENIUM_SAUCE_USERNAME(self):
-        """Username for the Sauce Labs account to use for running tests"""
-        return getattr(django_settings, 'SELENIUM_SAUCE_USERNAME', '')
+def is_browser_name(value):
+    # Older versions defaulted to a one-element list, which is still accepted
+    return is_string(value) or (is_string_list(value) and len(value) == 1)
 
-    @property
-    def SELENIUM_SAUCE_VERSION(self):
-        """Version of Selenium to use in the Sauce Labs virtual machines.  If
-        omitted, uses the current default version used by Sauce Labs."""
-        return getattr(django_settings, 'SELENIUM_SAUCE_VERSION', '')
 
-    @property
-    def SELENIUM_SCREENSHOT_DIR(self):
-        """Directory in which to store screenshots"""
-        return getattr(django_settings, 'SELENIUM_SCREENSHOT_DIR', '')
+def first_item(value):
+    return value if is_string(value) else value[0]
+
+
+def is_positive_number(value):
+    return (isinstance(value, NUMBER_TYPES) and not isinstance(value, bool) and
+            value > 0)
+
+
+def is_non_negative_number(value):
+    return (isinstance(value, NUMBER_TYPES) and not isinstance(value, bool) and
+            value >= 0)
+
+
+def is_non_negative_integer(value):
+    return (isinstance(value, six.integer_types) and
+            not isinstance(value, bool) and value >= 0)
+
+
+def is_positive_integer(value):
+    return is_non_negative_integer(value) and value > 0
+
+
+def is_fraction(value):
+    return is_positive_number(value) and value <= 1
+
+
+def is_image_format(value):
+    return value in ('png', 'jpeg', 'webp')
+
+
+def is_image_quality(value):
+    return is_positive_integer(value) and value <= 100
 
-    @property
-    def SELENIUM_TIMEOUT(self):
-        """Default operation timeout in seconds"""
-        return getattr(django_settings, 'SELENIUM_TIMEOUT', 10)
+
+# Options which can be set in each SELENIUM_BROWSER_PROFILES entry
+PROFILE_OPTIONS = {
+    'extensions': lambda value: isinstance(value, bool),
+    'gpu': lambda value: isinstance(value, bool),
+    'headless': lambda value: isinstance(value, bool),
+    'images': lambda value: isinstance(value, bool),
+    'log_level': lambda value: value in (None, 'DEBUG', 'INFO', 'WARN', 'ERROR'),
+    'sync': lambda value: isinstance(value, bool),
+    'window_size': lambda value: value is None or (
+        isinstance(value, (list, tuple)) and len(value) == 2 and
+        all(is_positive_number(item) for item in value)),
+}
+
+
+# Launch profile for the fastest browser startup and page loads
+DEFAULT_BROWSER_PROFILES = {
+    'ci': {
+        'extensions': False,
+        'gpu': False,
+        'headless': True,
+        'images': False,
+        'log_level': 'WARN',
+        'sync': False,
+        'window_size': (1280, 1024),
+    },
+}
+
+
+def is_profile_map(value):
+    if not isinstance(value, dict):
+        return False
+    for name, profile in value.items():
+        if not is_string(name) or not isinstance(profile, dict):
+            return False
+        for option, option_value in profile.items():
+            check = PROFILE_OPTIONS.get(option)
+            if check is None or not check(option_value):
+                return False
+    return True
+
+
+class Setting(object):
+    """
+    Definition of a single sbo-selenium setting: its name, default value,
+    documentation, a check which any configured value must pass, and an
+    optional function to convert accepted values into the form used.
+    """
+
+    def __init__(self, name, default, doc, check, requirement, normalize=None):
+        self.name = name
+        self.default = default
+        self.__doc__ = doc
+        self.check = check
+        self.requirement = requirement
+        self.normalize = normalize
+
+    def load(self):
+        """Get the configured value of this setting, verifying that it's
+        valid"""
+        value = getattr(django_settings, self.name, self.default)
+        if not self.check(value):
+            msg = '%s must be %s, not %r' % (self.name, self.requirement, value)
+            raise ImproperlyConfigured(msg)
+        if self.normalize is not None:
+            value = self.normalize(value)
+        return value
+
+
+SETTINGS = (
+    Setting('DJANGO_LIVE_TEST_SERVER_ADDRESS', 'localhost:9001',
+            'Address at which to run the test server',
+            lambda value: is_string(value) and value,
+            'a non-empty string'),
+    Setting('SELENIUM_BASELINE_FILE', '',
+            'File in which to keep per-test performance baselines',
+            is_string, 'a string'),
+    Setting('SELENIUM_BASELINE_RUNS', 10,
+            'Number of recent runs of each test to keep in the performance '
+            'baseline file',
+            is_positive_integer, 'a positive integer'),
+    Setting('SELENIUM_BASELINE_THRESHOLD', 3,
+            'Number of (scaled) median absolute deviations above the baseline '
+            'median at which a measurement counts as a regression',
+            is_positive_number, 'a positive number'),
+    Setting('SELENIUM_BROWSER_PROFILE', '',
+            'Name of the SELENIUM_BROWSER_PROFILES entry to launch browsers '
+            'with by default (if empty, browsers are launched with their '
+            'standard options)',
+            is_string, 'a string'),
+    Setting('SELENIUM_BROWSER_PROFILES', DEFAULT_BROWSER_PROFILES,
+            'Named sets of browser launch options',
+            is_profile_map,
+            'a dictionary of dictionaries containing only the options %s' %
+            ', '.join(sorted(PROFILE_OPTIONS))),
+    Setting('SELENIUM_CAPTURE_CONSOLE', False,
+            'Whether to collect browser console messages and JavaScript '
+            'errors from each page loaded by a Selenium test',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_COMMAND_TIMEOUT', 0,
+            'Maximum number of seconds a single browser driver command may '
+            'take before the test is failed and the driver killed (0 for no '
+            'limit)',
+            is_non_negative_number, 'a non-negative number'),
+    Setting('SELENIUM_COUNT_QUERIES', False,
+            'Whether to count and time the database queries made for each '
+            'live server request',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_DATABASE_SNAPSHOTS', False,
+            'Whether to reset the database between tests by restoring '
+            'snapshots instead of flushing it and reloading fixtures',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_DEFAULT_BROWSER', 'chrome',
+            'Default browser to use when running tests',
+            is_browser_name, 'a string', first_item),
+    Setting('SELENIUM_DEFAULT_TESTS', [],
+            'Default Selenium test package to run',
+            is_string_list, 'a list of strings'),
+    Setting('SELENIUM_DRIVER_POOL_SIZE', 0,
+            'Number of browsers to keep launching in the background for '
+            'upcoming tests (0 launches each one when its test starts)',
+            is_non_negative_integer, 'a non-negative integer'),
+    Setting('SELENIUM_JUNIT_XML', '',
+            'File in which to write a JUnit XML report of the Selenium test '
+            'results at the end of the run',
+            is_string, 'a string'),
+    Setting('SELENIUM_LIVE_SERVER_PORTS', 0,
+            'Number of unused ports for the selenium command to find for the '
+            'live server (0 uses those in DJANGO_LIVE_TEST_SERVER_ADDRESS)',
+            is_non_negative_integer, 'a non-negative integer'),
+    Setting('SELENIUM_LOG_QUEUE_SIZE', 10000,
+            'Maximum number of live server log messages waiting to be '
+            'written; further messages are dropped until there is room',
+            is_positive_integer, 'a positive integer'),
+    Setting('SELENIUM_PAGE_METRICS', False,
+            'Whether to collect page load performance metrics after each '
+            'get()',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_PID_DIR', '',
+            'Directory in which to record the processes started by test runs '
+            '(defaults to "sbo-selenium" in the temporary directory)',
+            is_string, 'a string'),
+    Setting('SELENIUM_POLL_FREQUENCY', 0.5,
+            'Default operation retry frequency',
+            is_positive_number, 'a positive number'),
+    Setting('SELENIUM_PROFILE_TEMPLATE_DIR', '',
+            'Directory in which to create browser profile templates and their '
+            'copies (defaults to the temporary directory)',
+            is_string, 'a string'),
+    Setting('SELENIUM_PROFILE_TEMPLATE_URLS', [],
+            'Live server URLs to visit when building the browser profile '
+            'template each driver starts with a copy of (empty to start each '
+            'one with a new profile)',
+            is_string_list, 'a list of strings'),
+    Setting('SELENIUM_PROFILE_THRESHOLD', 0,
+            'Profile live server requests, saving statistics for those which '
+            'take at least this many seconds (0 disables profiling)',
+            is_non_negative_number, 'a non-negative number'),
+    Setting('SELENIUM_PROXY', False,
+            'Whether to route browser traffic through a local caching proxy',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_PROXY_CACHE_DIR', '',
+            'Directory of cached third-party resources served by the proxy',
+            is_string, 'a string'),
+    Setting('SELENIUM_PROXY_CACHE_HOSTS', [],
+            'Hosts whose resources the proxy serves from its cache (a '
+            'leading "." also matches all subdomains)',
+            is_string_list, 'a list of strings'),
+    Setting('SELENIUM_PROXY_FETCH', True,
+            'Whether the proxy fetches and caches resources missing from '
+            'its cache',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_PROXY_TUNNEL_HOSTS', [],
+            'Hosts to which the proxy passes HTTPS requests through unchanged '
+            '(a leading "." also matches all subdomains); HTTPS requests to '
+            'any other host are refused',
+            is_string_list, 'a list of strings'),
+    Setting('SELENIUM_REMOTE_POOL_SIZE', 0,
+            'Number of idle keep-alive connections to keep open to each '
+            'remote WebDriver server (0 uses a new connection for each '
+            'command)',
+            is_non_negative_integer, 'a non-negative integer'),
+    Setting('SELENIUM_REMOTE_TIMEOUT', 120,
+            'Seconds to wait for a remote WebDriver server to respond to '
+            'pooled connections',
+            is_positive_number, 'a positive number'),
+    Setting('SELENIUM_REQUEST_TIMELINE_SIZE', 100,
+            'Number of live server requests to remember for each test',
+            is_non_negative_integer, 'a non-negative integer'),
+    Setting('SELENIUM_RESULTS_JSON', '',
+            'File to append each Selenium test result to as a line of JSON',
+            is_string, 'a string'),
+    Setting('SELENIUM_RETRIES', 0,
+            'Number of times to immediately re-run a Selenium test which '
+            'fails, with a new browser each time',
+            is_non_negative_integer, 'a non-negative integer'),
+    Setting('SELENIUM_JAR_PATH', '',
+            'Absolute path to the Selenium server jar file',
+            is_string, 'a string'),
+    Setting('SELENIUM_SAUCE_API_KEY', '',
+            'API key for the Sauce Labs account to use for running tests',
+            is_string, 'a string'),
+    Setting('SELENIUM_SAUCE_CONNECT_PATH', '',
+            'Absolute path to the Sauce Connect binary (for Sauce Labs)',
+            is_string, 'a string'),
+    Setting('SELENIUM_SAUCE_USERNAME', '',
+            'Username for the Sauce Labs account to use for running tests',
+            is_string, 'a string'),
+    Setting('SELENIUM_SAUCE_VERSION', '',
+            'Version of Selenium to use in the Sauce Labs virtual machines.  '
+            'If omitted, uses the current default version used by Sauce Labs.',
+            is_string, 'a string'),
+    Setting('SELENIUM_SCREENSHOT_DIR', '',
+            'Directory in which to store screenshots',
+            is_string, 'a string'),
+    Setting('SELENIUM_SCREENSHOT_ELEMENTS', False,
+            'If True, helpers which find an element (like wait_for_element()) '
+            'screenshot just that element rather than the whole window',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_SCREENSHOT_FORMAT', 'png',
+            'Image format in which to save screenshots (requires Pillow for '
+            'anything other than PNG)',
+            is_image_format, "'png', 'jpeg', or 'webp'"),
+    Setting('SELENIUM_SCREENSHOT_GRAYSCALE', False,
+            'If True, screenshots are saved in grayscale (requires Pillow)',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_SCREENSHOT_QUALITY', 75,
+            'Quality of JPEG and WebP screenshots, from 1 to 100',
+            is_image_quality, 'an integer from 1 to 100'),
+    Setting('SELENIUM_SCREENSHOT_SCALE', 1,
+            'Factor by which to downscale screenshots (requires Pillow)',
+            is_fraction, 'a number greater than 0 and no more than 1'),
+    Setting('SELENIUM_TEST_TIMEOUT', 0,
+            'Maximum number of seconds a Selenium test may take before it is '
+            'failed and its driver killed (0 for no limit)',
+            is_non_negative_number, 'a non-negative number'),
+    Setting('SELENIUM_TIMEOUT', 10,
+            'Default operation timeout in seconds',
+            is_positive_number, 'a positive number'),
+    Setting('SELENIUM_TRACK_MEMORY', False,
+            'Whether to track the memory usage of the test process, live '
+            'server requests, and browsers, and report the largest growth',
+            is_boolean, 'True or False'),
+    Setting('SELENIUM_PAGE_LOAD_TIMEOUT', 10,
+            'Connection timeout for page load GET requests in seconds',
+            is_positive_number, 'a positive number'),
+)
+
+SETTING_NAMES = frozenset(setting.name for setting in SETTINGS)
+
+
+class SettingsSnapshot(object):
+    """
+    Immutable set of sbo-selenium setting values, read from the Django
+    settings and validated all at once.
+    """
+    __slots__ = tuple(setting.name for setting in SETTINGS)
+
+    def __init__(self):
+        for setting in SETTINGS:
+            object.__setattr__(self, setting.name, setting.load())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('sbo-selenium settings are read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('sbo-selenium settings are read-only')
+
+
+class LazySettings(object):
+    """
+    Access point for the sbo-selenium settings.  They're loaded on first use
+    and then served from a cached snapshot until one of them is changed (for
+    example, by ``override_settings``).
+    """
+    __slots__ = ('_snapshot',)
+
+    def __init__(self):
+        self._snapshot = None
+
+    def __getattr__(self, name):
+        return getattr(self.snapshot, name)
 
     @property
-    def SELENIUM_PAGE_LOAD_TIMEOUT(self):
-        """Connection timeout for page load GET requests in seconds"""
-        return getattr(django_settings, 'SELENIUM_PAGE_LOAD_TIMEOUT', 10)
+    def snapshot(self):
+        """The current SettingsSnapshot, loading it first if necessary"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = SettingsSnapshot()
+        return snapshot
+
+    def reset(self):
+        """Discard the cached values so they'll be reloaded on next access"""
+        self._snapshot = None
 
 
 settings = LazySettings()
+
+
+def reset_settings(sender, setting, **kwargs):
+    """Signal handler to discard cached settings when any of them change"""
+    if setting in SETTING_NAMES:
+        settings.reset()
+
+setting_changed.connect(reset_settings)
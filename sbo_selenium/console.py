@@ -0,0 +1,99 @@
+"""
+Collection of browser console messages and uncaught JavaScript errors, which
+are often the real cause of a test failure, enabled by the
+``SELENIUM_CAPTURE_CONSOLE`` setting.
+
+After each ``SeleniumTestCase.get()``, ``INSTALL_SCRIPT`` hooks the page's
+``console.error()`` and ``console.warn()`` and listens for uncaught errors,
+buffering them in the page's ``sessionStorage`` so they survive later page
+loads on the same site.  Nothing is sent back to the test until
+``HARVEST_SCRIPT`` collects (and clears) the whole buffer in one command,
+which normally happens once at the end of the test.  Browsers whose drivers
+provide the "browser" log type (such as Chrome) have that log collected at
+the same time, which also includes errors from before the hooks were
+installed.
+"""
+from __future__ import absolute_import
+
+from selenium.common.exceptions import WebDriverException
+
+# Maximum number of messages buffered by each page
+BUFFER_SIZE = 200
+
+INSTALL_SCRIPT = """
+if (window.__sboConsoleInstalled) { return; }
+window.__sboConsoleInstalled = true;
+var key = '__sbo_console', limit = %d;
+function push(level, message) {
+  try {
+    var entries = JSON.parse(window.sessionStorage.getItem(key) || '[]');
+    if (entries.length < limit) {
+      entries.push({level: level, message: String(message),
+                    url: window.location.href, timestamp: Date.now()});
+      window.sessionStorage.setItem(key, JSON.stringify(entries));
+    }
+  } catch (e) {}
+}
+window.addEventListener('error', function (event) {
+  push('SEVERE', event.message + ' (' + event.filename + ':' + event.lineno + ')');
+});
+if (window.console) {
+  var wrap = function (name, level) {
+    var original = window.console[name];
+    window.console[name] = function () {
+      push(level, Array.prototype.slice.call(arguments).join(' '));
+      if (original) { return original.apply(window.console, arguments); }
+    };
+  };
+  wrap('error', 'SEVERE');
+  wrap('warn', 'WARNING');
+}
+""" % BUFFER_SIZE
+
+HARVEST_SCRIPT = """
+var key = '__sbo_console';
+try {
+  var entries = JSON.parse(window.sessionStorage.getItem(key) || '[]');
+  window.sessionStorage.removeItem(key);
+  return entries;
+} catch (e) {
+  return [];
+}
+"""
+
+# Levels (as used in WebDriver logs) which count as errors
+ERROR_LEVELS = frozenset(['SEVERE'])
+
+
+def install(driver):
+    """ Start buffering console messages in the current page """
+    try:
+        driver.execute_script(INSTALL_SCRIPT)
+    except WebDriverException:
+        # JavaScript may be disabled, or the page not HTML
+        pass
+
+
+def harvest(driver):
+    """ Collect and clear the buffered console messages, and the driver's
+    browser log if it has one.  Each is a dictionary with the message's
+    level, text, and (if known) page URL and timestamp. """
+    entries = []
+    try:
+        entries.extend(driver.execute_script(HARVEST_SCRIPT) or [])
+    except WebDriverException:
+        pass
+    try:
+        if 'browser' in driver.log_types:
+            entries.extend(driver.get_log('browser'))
+    except WebDriverException:
+        pass
+    return entries
+
+
+def errors(entries):
+    return [entry for entry in entries if entry.get('level') in ERROR_LEVELS]
+
+
+def describe(entry):
+    return '%s %s' % (entry.get('level', ''), entry.get('message', ''))
@@ -0,0 +1,317 @@
+"""
+Factories for the WebDriver instances used by SeleniumTestCase, one per
+supported browser.  Each one imports the Selenium code for its browser only
+when it's actually used.
+"""
+from __future__ import absolute_import
+
+import os
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+from sbo_selenium.conf import settings
+
+# Chrome's --log-level values for our log level names
+CHROME_LOG_LEVELS = {'DEBUG': 0, 'INFO': 0, 'WARN': 1, 'ERROR': 2}
+
+# Address of the Selenium standalone server started by the selenium command
+SELENIUM_SERVER_URL = 'http://127.0.0.1:4444/wd/hub'
+
+# Firefox's webdriver.log.* preference values for our log level names
+FIREFOX_LOG_LEVELS = {'DEBUG': 'FINE', 'INFO': 'INFO', 'WARN': 'WARNING',
+                      'ERROR': 'SEVERE'}
+
+
+class BrowserProfile(object):
+    """
+    Options for launching a browser, from an entry in the
+    SELENIUM_BROWSER_PROFILES setting.  Options the entry doesn't specify get
+    the browser's usual behavior.
+    """
+    DEFAULTS = {
+        'extensions': True,
+        'gpu': True,
+        'headless': False,
+        'images': True,
+        'log_level': None,
+        'sync': True,
+        'window_size': None,
+    }
+    # Profile directory to launch the browser with (set for copies of a
+    # profile template, not configurable in SELENIUM_BROWSER_PROFILES)
+    user_data_dir = None
+
+    def __init__(self, name='', options=None):
+        self.name = name
+        values = dict(self.DEFAULTS)
+        if options:
+            values.update(options)
+        for option, value in values.items():
+            setattr(self, option, value)
+
+
+def get_profile(name=None):
+    """ Get the named browser launch profile.  If no name is given, the one
+    selected via the selenium command's --profile option or the
+    SELENIUM_BROWSER_PROFILE setting is used. """
+    if name is None:
+        name = os.getenv('SELENIUM_BROWSER_PROFILE',
+                         settings.SELENIUM_BROWSER_PROFILE)
+    if not name:
+        return BrowserProfile()
+    profiles = settings.SELENIUM_BROWSER_PROFILES
+    if name not in profiles:
+        msg = 'Unknown browser profile "%s"; the options are %s' % (
+            name, ', '.join(sorted(profiles)))
+        raise ImproperlyConfigured(msg)
+    return BrowserProfile(name, profiles[name])
+
+
+def chrome_options(profile, proxy=None):
+    """ The Chrome options for the given launch profile and proxy """
+    from selenium.webdriver.chrome.options import Options
+    options = Options()
+    if profile.headless:
+        options.add_argument('--headless')
+    if not profile.gpu:
+        options.add_argument('--disable-gpu')
+    if not profile.extensions:
+        options.add_argument('--disable-extensions')
+    if not profile.sync:
+        options.add_argument('--disable-sync')
+    if not profile.images:
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+        })
+    if profile.window_size:
+        options.add_argument('--window-size=%d,%d' % tuple(profile.window_size))
+    if profile.log_level:
+        level = CHROME_LOG_LEVELS[profile.log_level]
+        options.add_argument('--log-level=%d' % level)
+    if proxy:
+        options.add_argument('--proxy-server=http://%s' % proxy)
+        # Don't skip the proxy for the live server on localhost
+        options.add_argument('--proxy-bypass-list=<-loopback>')
+    if profile.user_data_dir:
+        options.add_argument('--user-data-dir=%s' % profile.user_data_dir)
+    return options
+
+
+def chrome(test, profile, proxy=None):
+    from selenium.webdriver.chrome.webdriver import WebDriver as Chrome
+    return Chrome(chrome_options=chrome_options(profile, proxy))
+
+
+def fake(test, profile, proxy=None):
+    from sbo_selenium.fake import FakeWebDriver
+    return FakeWebDriver(proxy=proxy, user_data_dir=profile.user_data_dir)
+
+
+def firefox_options(test, profile, proxy=None):
+    """ The FirefoxProfile (None for a default one) and extra command line
+    options to launch Firefox with for the given launch profile and proxy """
+    from selenium.webdriver.firefox.firefox_profile import FirefoxProfile
+    firefox_profile = test.get_firefox_profile()
+    if firefox_profile is None and profile.user_data_dir:
+        # Makes its own temporary copy of the directory
+        firefox_profile = FirefoxProfile(profile.user_data_dir)
+    if profile.user_data_dir:
+        # Keep the disk cache in the profile, so it's part of any template
+        firefox_profile.set_preference('browser.cache.disk.parent_directory',
+                                       firefox_profile.path)
+    if proxy:
+        if firefox_profile is None:
+            firefox_profile = FirefoxProfile()
+        host, port = proxy.rsplit(':', 1)
+        firefox_profile.set_preference('network.proxy.type', 1)
+        firefox_profile.set_preference('network.proxy.http', host)
+        firefox_profile.set_preference('network.proxy.http_port', int(port))
+        firefox_profile.set_preference('network.proxy.ssl', host)
+        firefox_profile.set_preference('network.proxy.ssl_port', int(port))
+        firefox_profile.set_preference('network.proxy.no_proxies_on', '')
+        firefox_profile.set_preference('network.proxy.allow_hijacking_localhost', True)
+    if not profile.name:
+        return firefox_profile, []
+    if firefox_profile is None:
+        firefox_profile = FirefoxProfile()
+    options = []
+    if profile.headless:
+        # Supported by Firefox 56 and later
+        options.append('-headless')
+    if not profile.gpu:
+        firefox_profile.set_preference('layers.acceleration.disabled', True)
+    if not profile.extensions:
+        # Can't disable them outright, the driver itself is an extension
+        firefox_profile.set_preference('extensions.update.enabled', False)
+        firefox_profile.set_preference('extensions.blocklist.enabled', False)
+    if not profile.sync:
+        firefox_profile.set_preference('services.sync.enabled', False)
+        firefox_profile.set_preference('identity.fxaccounts.enabled', False)
+    if not profile.images:
+        firefox_profile.set_preference('permissions.default.image', 2)
+    if profile.log_level:
+        level = FIREFOX_LOG_LEVELS[profile.log_level]
+        firefox_profile.set_preference('webdriver.log.driver', level)
+        firefox_profile.set_preference('webdriver.log.browser', level)
+    return firefox_profile, options
+
+
+def firefox(test, profile, proxy=None):
+    from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+    from selenium.webdriver.firefox.webdriver import WebDriver as Firefox
+    firefox_profile, options = firefox_options(test, profile, proxy)
+    if not profile.name:
+        return Firefox(firefox_profile)
+    binary = FirefoxBinary()
+    if options:
+        binary.add_command_line_options(*options)
+    return Firefox(firefox_profile, binary)
+
+
+def htmlunit(test, profile, proxy=None):
+    return remote(test, 'HTMLUNITWITHJS', proxy)
+
+
+def ios(test, profile, proxy=None):
+    from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+    capabilities = {
+        'app': 'safari',
+        'browserName': '',
+        'device': 'iPhone Simulator',
+        'os': 'iOS 6.1'
+    }
+    from sbo_selenium.transport import command_executor
+    if proxy:
+        capabilities = proxy_capabilities(capabilities, proxy)
+    return RemoteWebDriver(
+        command_executor=command_executor(test.appium_command_executor()),
+        desired_capabilities=capabilities)
+
+
+def iexplore(test, profile, proxy=None):
+    return remote(test, 'INTERNETEXPLORER', proxy)
+
+
+def opera(test, profile, proxy=None):
+    return remote(test, 'OPERA', proxy)
+
+
+def phantomjs_args(profile, proxy=None):
+    """ The PhantomJS command line arguments for the given launch profile
+    and proxy """
+    log_level = profile.log_level
+    if not profile.name:
+        log_level = 'DEBUG'
+    service_args = []
+    if log_level:
+        service_args.append('--webdriver-loglevel=%s' % log_level)
+    if log_level == 'DEBUG':
+        service_args.append('--debug=true')
+    if not profile.images:
+        service_args.append('--load-images=false')
+    if proxy:
+        service_args.append('--proxy=%s' % proxy)
+        service_args.append('--proxy-type=http')
+    return service_args
+
+
+def phantomjs(test, profile, proxy=None):
+    from selenium.webdriver.phantomjs.webdriver import WebDriver as PhantomJS
+    return PhantomJS(service_args=phantomjs_args(profile, proxy))
+
+
+def safari(test, profile, proxy=None):
+    # requires a Safari extension to be built from source and installed
+    return remote(test, 'SAFARI', proxy)
+
+
+def remote(test, capabilities_name, proxy=None):
+    """ Create a driver for a browser controlled by the Selenium standalone
+    server, given the name of its DesiredCapabilities entry """
+    from selenium.webdriver.common.desired_capabilities import \
+        DesiredCapabilities
+    from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+    from sbo_selenium.transport import command_executor
+    capabilities = getattr(DesiredCapabilities, capabilities_name)
+    if proxy:
+        capabilities = proxy_capabilities(capabilities, proxy)
+    return RemoteWebDriver(
+        command_executor=command_executor(SELENIUM_SERVER_URL),
+        desired_capabilities=capabilities)
+
+
+def proxy_capabilities(capabilities, proxy):
+    """ Get a copy of the given desired capabilities which routes the
+    browser's traffic through the proxy at the given address """
+    capabilities = dict(capabilities)
+    capabilities['proxy'] = {
+        'proxyType': 'MANUAL',
+        'httpProxy': proxy,
+        'sslProxy': proxy,
+        'noProxy': '',
+    }
+    return capabilities
+
+
+BROWSERS = {
+    'chrome': chrome,
+    'fake': fake,
+    'firefox': firefox,
+    'htmlunit': htmlunit,
+    'iexplore': iexplore,
+    'ios': ios,
+    'ipad': ios,
+    'iphone': ios,
+    'ipod': ios,
+    'opera': opera,
+    'phantomjs': phantomjs,
+    'safari': safari,
+}
+
+
+def create_driver(browser, test, profile=None):
+    """ Create a new WebDriver for the named browser on behalf of the given
+    test case, defaulting to Chrome for unrecognized names.  The browser is
+    launched with the options of the given BrowserProfile, or of the
+    currently selected one if none is given, uses the local caching proxy
+    if the SELENIUM_PROXY setting is True, and starts with a copy of a
+    warmed-up profile template if SELENIUM_PROFILE_TEMPLATE_URLS is set. """
+    from sbo_selenium.proxy import get_proxy_address
+    if profile is None:
+        profile = get_profile()
+    from sbo_selenium import processes, profile_templates
+    factory = BROWSERS.get(browser, chrome)
+    proxy = get_proxy_address()
+    profile_copy = None
+    if profile_templates.enabled(browser):
+        profile, profile_copy = profile_templates.prepare(
+            browser, test, profile, factory, proxy)
+    driver = factory(test, profile, proxy)
+    if profile_copy:
+        profile_templates.remove_after_quit(driver, profile_copy)
+    pid = driver_pid(driver)
+    if pid:
+        processes.register(pid, '%s driver' % browser)
+    if profile.window_size:
+        width, height = profile.window_size
+        driver.set_window_size(width, height)
+    if factory is not fake:
+        settle()
+    return driver
+
+
+def driver_pid(driver):
+    """ The ID of the local process started for a driver (chromedriver,
+    Firefox, etc.), or None if there isn't one """
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None:
+        process = getattr(getattr(driver, 'binary', None), 'process', None)
+    return process.pid if process is not None else None
+
+
+def settle():
+    """ Give a newly launched browser a little time; Firefox throws random
+    errors if you hit it too soon """
+    time.sleep(1)
@@ -0,0 +1,1257 @@
+"""
+An in-process stand-in for a real browser, selected via ``-b fake`` or
+``SELENIUM_DEFAULT_BROWSER = 'fake'``.  ``FakeWebDriver`` is a normal Selenium
+``RemoteWebDriver`` whose command executor answers the WebDriver wire protocol
+commands itself using a simple model of the page's DOM, so the code under test
+goes through all the usual Selenium client code without starting a browser.
+
+Pages are fetched over HTTP (normally from the live test server) and parsed
+into the DOM model, or can be supplied directly via ``driver.pages``.  If the
+driver is given a user data directory, fetched pages are cached there like a
+real browser's disk cache.  There's no JavaScript engine; tests can instead
+change the DOM from Python (now or after a delay via ``driver.later()``),
+register handlers for the scripts the code under test executes via
+``driver.register_script()``, slow down commands via
+``driver.command_delays``, and make commands fail via ``driver.fail_next()``.
+The page metrics script used by ``SeleniumTestCase.page_metrics()`` is
+answered with timings of the fake page loads.  This makes it possible to
+deterministically exercise timeouts, stale element references, and other
+error handling in milliseconds.
+"""
+from __future__ import absolute_import
+
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from django.utils import six
+from django.utils.six.moves import html_parser, http_cookiejar
+from django.utils.six.moves.urllib.error import HTTPError
+from django.utils.six.moves.urllib.parse import urlencode, urljoin, urlsplit
+from django.utils.six.moves.urllib.request import build_opener, \
+    HTTPCookieProcessor, ProxyHandler, Request
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.errorhandler import ErrorCode
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+from sbo_selenium.actions import PERFORM_SCRIPT
+from sbo_selenium.console import HARVEST_SCRIPT, INSTALL_SCRIPT
+from sbo_selenium.metrics import PAGE_METRICS_SCRIPT
+from sbo_selenium.screenshots import ELEMENT_BOX_SCRIPT
+
+# Elements which never have content or a closing tag
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                           'input', 'link', 'meta', 'param', 'source',
+                           'track', 'wbr'])
+
+# Attributes referring to the subresources of a page, by resource timing
+# initiator type
+RESOURCE_SELECTORS = (
+    ('script', 'script[src]', 'src'),
+    ('link', 'link[rel="stylesheet"][href]', 'href'),
+    ('img', 'img[src]', 'src'),
+)
+
+# Elements which are never rendered
+HIDDEN_ELEMENTS = frozenset(['head', 'link', 'meta', 'noscript', 'script',
+                             'style', 'template', 'title'])
+
+# Elements which are implicitly closed by the start of another of the same
+# type
+SELF_CLOSING_SIBLINGS = frozenset(['li', 'option', 'p', 'td', 'th', 'tr'])
+
+# Computed CSS property values to report for properties that weren't set
+DEFAULT_CSS = {
+    'background-color': 'rgba(0, 0, 0, 0)',
+    'color': 'rgba(0, 0, 0, 1)',
+    'display': 'block',
+    'opacity': '1',
+    'visibility': 'visible',
+}
+
+DEFAULT_LOCATION = {'x': 0, 'y': 0}
+DEFAULT_SIZE = {'width': 100, 'height': 20}
+
+# Responses for scripts which just return a literal value
+LITERAL_SCRIPT = re.compile(
+    r'^\s*return\s+(true|false|null|-?\d+(?:\.\d+)?|"[^"\\]*")\s*;?\s*$')
+
+# Error names which can be passed to fail_next(), and their status codes
+ERRORS = {
+    'element not visible': ErrorCode.ELEMENT_NOT_VISIBLE[0],
+    'invalid cookie domain': ErrorCode.INVALID_COOKIE_DOMAIN[0],
+    'invalid selector': ErrorCode.INVALID_SELECTOR[0],
+    'javascript error': ErrorCode.JAVASCRIPT_ERROR[0],
+    'no such element': ErrorCode.NO_SUCH_ELEMENT[0],
+    'stale element reference': ErrorCode.STALE_ELEMENT_REFERENCE[0],
+    'timeout': ErrorCode.TIMEOUT[0],
+    'unable to set cookie': ErrorCode.UNABLE_TO_SET_COOKIE[0],
+    'unknown error': ErrorCode.UNKNOWN_ERROR[0],
+}
+
+
+_png_cache = {}
+
+
+def _png(width, height):
+    """A blank white PNG image of the given size"""
+    if (width, height) not in _png_cache:
+        _png_cache[(width, height)] = _make_png(width, height)
+    return _png_cache[(width, height)]
+
+
+def _make_png(width, height):
+    def chunk(kind, data):
+        checksum = zlib.crc32(kind + data) & 0xffffffff
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', checksum)
+    row = b'\x00' + b'\xff\xff\xff' * width
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(row * height)) +
+            chunk(b'IEND', b''))
+
+
+def _milliseconds():
+    return int(time.time() * 1000)
+
+
+class FakeError(Exception):
+    """ An error to be reported to the WebDriver client with the given wire
+    protocol status code """
+
+    def __init__(self, status, message):
+        super(FakeError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+def invalid_selector(selector):
+    return FakeError(ERRORS['invalid selector'],
+                     'The fake browser does not support the selector %r' % selector)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ DOM model ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class FakeElement(object):
+    """
+    An element in the fake browser's DOM.  Children are either other
+    FakeElements or strings of text.  Layout information which can't be
+    derived from the markup (``location`` and ``size``) can be assigned
+    directly, as can ``visible = False`` to hide the element.
+    """
+
+    def __init__(self, tag, attributes=None):
+        self.tag = tag.lower()
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.parent = None
+        self.visible = True
+        self.location = None
+        self.size = None
+        self.listeners = []
+        self.value = self.attributes.get('value', '')
+        self.selected = 'selected' in self.attributes or \
+            'checked' in self.attributes
+
+    def __repr__(self):
+        return '<FakeElement %s>' % self.tag
+
+    # Tree structure
+
+    def append(self, child):
+        """Add a child element or string of text"""
+        if isinstance(child, FakeElement):
+            child.remove()
+            child.parent = self
+        self.children.append(child)
+        return child
+
+    def remove(self):
+        """Remove this element from the document"""
+        if self.parent is not None:
+            self.parent.children.remove(self)
+            self.parent = None
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def descendants(self):
+        """All descendant elements in document order"""
+        for child in self.children:
+            if isinstance(child, FakeElement):
+                yield child
+                for descendant in child.descendants():
+                    yield descendant
+
+    def element_children(self):
+        return [child for child in self.children
+                if isinstance(child, FakeElement)]
+
+    @property
+    def root(self):
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    # Content
+
+    def set_text(self, text):
+        """Replace the element's content with the given text"""
+        for child in self.element_children():
+            child.parent = None
+        self.children = [text]
+        if self.tag == 'textarea':
+            self.value = text
+
+    @property
+    def string_value(self):
+        """All the text in the element, whether visible or not"""
+        parts = []
+        for child in self.children:
+            if isinstance(child, FakeElement):
+                parts.append(child.string_value)
+            else:
+                parts.append(child)
+        return ''.join(parts)
+
+    @property
+    def own_text(self):
+        return ''.join(child for child in self.children
+                       if not isinstance(child, FakeElement))
+
+    @property
+    def text(self):
+        """The visible text of the element, with whitespace normalized"""
+        if not self.is_displayed():
+            return ''
+        parts = []
+        for child in self.children:
+            if isinstance(child, FakeElement):
+                parts.append(child.text)
+            else:
+                parts.append(child)
+        return ' '.join(' '.join(parts).split())
+
+    # Attributes and styles
+
+    @property
+    def classes(self):
+        return self.attributes.get('class', '').split()
+
+    @property
+    def style(self):
+        declarations = {}
+        for declaration in self.attributes.get('style', '').split(';'):
+            if ':' in declaration:
+                name, value = declaration.split(':', 1)
+                declarations[name.strip().lower()] = value.strip()
+        return declarations
+
+    def set_style(self, name, value):
+        """Set an inline CSS property of the element"""
+        style = self.style
+        style[name] = value
+        self.attributes['style'] = '; '.join(
+            '%s: %s' % item for item in sorted(style.items()))
+
+    def css_value(self, name):
+        return self.style.get(name, DEFAULT_CSS.get(name, ''))
+
+    def get_attribute(self, name):
+        """The attribute or property value WebDriver would report"""
+        if name == 'value':
+            if self.tag == 'select':
+                selected = [option for option in self.options
+                            if option.selected]
+                return selected[0].get_attribute('value') if selected else ''
+            if self.tag == 'option' and 'value' not in self.attributes:
+                return self.text
+            if self.tag in ('input', 'textarea', 'option', 'button'):
+                return self.value
+        if name in ('checked', 'selected'):
+            return 'true' if self.selected else None
+        if name == 'index' and self.tag == 'option':
+            select = self.select
+            if select is not None:
+                return str(select.options.index(self))
+        if name in ('disabled', 'hidden', 'multiple', 'readonly'):
+            return 'true' if name in self.attributes else None
+        return self.attributes.get(name)
+
+    @property
+    def options(self):
+        return [element for element in self.descendants()
+                if element.tag == 'option']
+
+    @property
+    def select(self):
+        for ancestor in self.ancestors():
+            if ancestor.tag == 'select':
+                return ancestor
+        return None
+
+    @property
+    def form(self):
+        for ancestor in self.ancestors():
+            if ancestor.tag == 'form':
+                return ancestor
+        return None
+
+    # State
+
+    def is_displayed(self):
+        for node in [self] + list(self.ancestors()):
+            if not node.visible or node.tag in HIDDEN_ELEMENTS:
+                return False
+            if 'hidden' in node.attributes:
+                return False
+            if node.tag == 'input' and \
+                    node.attributes.get('type', '').lower() == 'hidden':
+                return False
+            style = node.style
+            if style.get('display') == 'none':
+                return False
+            if style.get('visibility') == 'hidden':
+                return False
+        return True
+
+    def is_enabled(self):
+        return 'disabled' not in self.attributes
+
+    def on_click(self, callback):
+        """Register a function to be called with this element when it's
+        clicked"""
+        self.listeners.append(callback)
+
+    # Serialization
+
+    def serialize(self):
+        attributes = ''.join(' %s="%s"' % (name, _escape(value, True))
+                             for name, value in sorted(self.attributes.items()))
+        if self.tag == '#document':
+            return ''.join(_serialize(child) for child in self.children)
+        if self.tag in VOID_ELEMENTS:
+            return '<%s%s>' % (self.tag, attributes)
+        content = ''.join(_serialize(child) for child in self.children)
+        return '<%s%s>%s</%s>' % (self.tag, attributes, content, self.tag)
+
+
+def _escape(text, quote=False):
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if quote:
+        text = text.replace('"', '&quot;')
+    return text
+
+
+def _serialize(node):
+    if isinstance(node, FakeElement):
+        return node.serialize()
+    return _escape(node)
+
+
+class DocumentParser(html_parser.HTMLParser):
+    """Builds a FakeElement tree from an HTML document"""
+
+    def __init__(self):
+        html_parser.HTMLParser.__init__(self)
+        self.document = FakeElement('#document')
+        self.current = self.document
+
+    def handle_starttag(self, tag, attrs):
+        tag = tag.lower()
+        if tag in SELF_CLOSING_SIBLINGS and self.current.tag == tag:
+            self.current = self.current.parent
+        element = FakeElement(tag, [(name, value if value is not None else '')
+                                    for name, value in attrs])
+        self.current.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag.lower() not in VOID_ELEMENTS:
+            self.current = self.current.parent
+
+    def handle_endtag(self, tag):
+        tag = tag.lower()
+        for node in [self.current] + list(self.current.ancestors()):
+            if node.tag == tag:
+                self.current = node.parent
+                return
+
+    def handle_data(self, data):
+        self.current.append(data)
+        if self.current.tag == 'textarea':
+            self.current.value = self.current.string_value
+
+    def handle_entityref(self, name):
+        self.handle_data(self.unescape('&%s;' % name))
+
+    def handle_charref(self, name):
+        self.handle_data(self.unescape('&#%s;' % name))
+
+
+def parse_html(html):
+    """Parse an HTML document into a FakeElement tree"""
+    if isinstance(html, six.binary_type):
+        html = html.decode('utf-8', 'replace')
+    parser = DocumentParser()
+    parser.feed(html)
+    parser.close()
+    return parser.document
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ Selectors ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+SIMPLE_SELECTOR = re.compile(r'''
+    (?P<tag>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*
+        (?:(?P<op>[~|^$*]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\]
+  | :(?P<pseudo>[\w-]+)(?:\((?P<arg>[^)]*)\))?
+''', re.VERBOSE)
+
+COMBINATOR = re.compile(r'\s*([>+~])\s*|\s+')
+
+
+def _split_top_level(text, separator):
+    """Split on a separator character, except within quotes, brackets or
+    parentheses"""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(value):
+    if value and value[0] in '"\'' and value[-1] == value[0]:
+        return value[1:-1]
+    return value
+
+
+class CSSSelector(object):
+    """A CSS selector (or comma-separated group of them) which can be matched
+    against FakeElements"""
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.alternatives = []
+        for alternative in _split_top_level(selector, ','):
+            self.alternatives.append(self._parse(alternative.strip()))
+
+    def _parse(self, text):
+        """Parse a single selector into a list of (combinator, compound)
+        pairs, where the combinator relates the compound to the previous
+        one"""
+        if not text:
+            raise invalid_selector(self.selector)
+        parts = []
+        position = 0
+        combinator = None
+        while position < len(text):
+            compound = []
+            while position < len(text):
+                match = SIMPLE_SELECTOR.match(text, position)
+                if not match:
+                    break
+                compound.append(match)
+                position = match.end()
+            if not compound:
+                raise invalid_selector(self.selector)
+            parts.append((combinator, compound))
+            if position == len(text):
+                break
+            match = COMBINATOR.match(text, position)
+            if not match:
+                raise invalid_selector(self.selector)
+            combinator = match.group(1) or ' '
+            position = match.end()
+        return parts
+
+    def matches(self, element):
+        return any(self._matches(element, parts, len(parts) - 1)
+                   for parts in self.alternatives)
+
+    def _matches(self, element, parts, index):
+        combinator, compound = parts[index]
+        if not all(self._simple_matches(element, match) for match in compound):
+            return False
+        if index == 0:
+            return True
+        if combinator == '>':
+            parent = element.parent
+            return parent is not None and parent.tag != '#document' and \
+                self._matches(parent, parts, index - 1)
+        if combinator == ' ':
+            return any(self._matches(ancestor, parts, index - 1)
+                       for ancestor in element.ancestors()
+                       if ancestor.tag != '#document')
+        siblings = element.parent.element_children() if element.parent else []
+        previous = siblings[:siblings.index(element)]
+        if combinator == '+':
+            return bool(previous) and self._matches(previous[-1], parts, index - 1)
+        return any(self._matches(sibling, parts, index - 1)
+                   for sibling in previous)
+
+    def _simple_matches(self, element, match):
+        groups = match.groupdict()
+        if groups['tag']:
+            return groups['tag'] == '*' or groups['tag'].lower() == element.tag
+        if groups['id']:
+            return element.attributes.get('id') == groups['id']
+        if groups['cls']:
+            return groups['cls'] in element.classes
+        if groups['attr']:
+            actual = element.attributes.get(groups['attr'])
+            if actual is None:
+                return False
+            op = groups['op']
+            if not op:
+                return True
+            expected = _unquote(groups['value'])
+            if op == '=':
+                return actual == expected
+            if op == '~=':
+                return expected in actual.split()
+            if op == '|=':
+                return actual == expected or actual.startswith(expected + '-')
+            if op == '^=':
+                return actual.startswith(expected)
+            if op == '$=':
+                return actual.endswith(expected)
+            return expected in actual
+        return self._pseudo_matches(element, groups['pseudo'], groups['arg'])
+
+    def _pseudo_matches(self, element, pseudo, arg):
+        siblings = element.parent.element_children() if element.parent else [element]
+        if pseudo == 'first-child':
+            return siblings[0] is element
+        if pseudo == 'last-child':
+            return siblings[-1] is element
+        if pseudo == 'nth-child' and arg and arg.strip().isdigit():
+            return siblings.index(element) + 1 == int(arg)
+        if pseudo in ('checked', 'selected'):
+            return element.selected
+        if pseudo == 'disabled':
+            return not element.is_enabled()
+        if pseudo == 'enabled':
+            return element.is_enabled()
+        raise invalid_selector(self.selector)
+
+
+XPATH_STEP = re.compile(
+    r'(?P<axis>//|/)(?P<test>\*|\.\.|\.|[a-zA-Z][\w-]*)(?P<predicates>(?:\[[^\]]*\])*)')
+
+XPATH_PREDICATE = re.compile(r'\[([^\]]*)\]')
+
+XPATH_COMPARISON = re.compile(
+    r'^(?P<subject>.+?)\s*=\s*(?P<value>"[^"]*"|\'[^\']*\')$')
+
+XPATH_FUNCTION = re.compile(
+    r'^(?P<function>contains|starts-with)\(\s*(?P<subject>[^,]+?)\s*,\s*'
+    r'(?P<value>"[^"]*"|\'[^\']*\')\s*\)$')
+
+
+class XPathSelector(object):
+    """The subset of XPath used for locating elements in typical tests:
+    child and descendant steps with attribute, text, and position
+    predicates"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        text = expression.strip()
+        self.relative = text.startswith('.')
+        if text.startswith('./'):
+            text = text[1:]
+        elif text == '.':
+            text = '/.'
+        self.steps = []
+        position = 0
+        while position < len(text):
+            match = XPATH_STEP.match(text, position)
+            if not match:
+                raise invalid_selector(expression)
+            predicates = XPATH_PREDICATE.findall(match.group('predicates'))
+            self.steps.append((match.group('axis'), match.group('test'),
+                               predicates))
+            position = match.end()
+        if not self.steps:
+            raise invalid_selector(expression)
+
+    def select(self, context):
+        """Find all the elements matching the expression, in document
+        order"""
+        nodes = [context if self.relative else context.root]
+        for axis, test, predicates in self.steps:
+            matches = []
+            for node in nodes:
+                if test == '.':
+                    candidates = [node]
+                elif test == '..':
+                    candidates = [node.parent] if node.parent else []
+                elif axis == '//':
+                    candidates = list(node.descendants())
+                else:
+                    candidates = node.element_children()
+                if test not in ('.', '..', '*'):
+                    candidates = [candidate for candidate in candidates
+                                  if candidate.tag == test.lower()]
+                for predicate in predicates:
+                    candidates = self._filter(candidates, predicate.strip())
+                for candidate in candidates:
+                    if candidate not in matches:
+                        matches.append(candidate)
+            nodes = matches
+        return [node for node in nodes if node.tag != '#document']
+
+    def _filter(self, candidates, predicate):
+        if predicate.isdigit():
+            index = int(predicate) - 1
+            return candidates[index:index + 1]
+        if predicate == 'last()':
+            return candidates[-1:]
+        conditions = [condition.strip()
+                      for condition in re.split(r'\s+and\s+', predicate)]
+        return [candidate for candidate in candidates
+                if all(self._test(candidate, condition)
+                       for condition in conditions)]
+
+    def _value(self, node, subject):
+        if subject in ('.', 'string()', 'string(.)'):
+            return node.string_value
+        if subject == 'text()':
+            return node.own_text
+        if subject.startswith('normalize-space('):
+            inner = subject[len('normalize-space('):-1].strip() or '.'
+            return ' '.join(self._value(node, inner).split())
+        if subject.startswith('@'):
+            return node.attributes.get(subject[1:])
+        raise invalid_selector(self.expression)
+
+    def _test(self, node, condition):
+        if condition.startswith('@') and re.match(r'^@[\w-]+$', condition):
+            return condition[1:] in node.attributes
+        match = XPATH_COMPARISON.match(condition)
+        if match:
+            return self._value(node, match.group('subject')) == \
+                _unquote(match.group('value'))
+        match = XPATH_FUNCTION.match(condition)
+        if match:
+            actual = self._value(node, match.group('subject'))
+            if actual is None:
+                return False
+            expected = _unquote(match.group('value'))
+            if match.group('function') == 'contains':
+                return expected in actual
+            return actual.startswith(expected)
+        raise invalid_selector(self.expression)
+
+
+def find_elements(context, using, value):
+    """Find the elements within the given context (a document or element)
+    which match the given WebDriver locator strategy and value"""
+    if using == 'xpath':
+        return XPathSelector(value).select(context)
+    candidates = list(context.descendants())
+    if using == 'css selector':
+        selector = CSSSelector(value)
+        return [element for element in candidates if selector.matches(element)]
+    if using == 'id':
+        return [e for e in candidates if e.attributes.get('id') == value]
+    if using == 'name':
+        return [e for e in candidates if e.attributes.get('name') == value]
+    if using == 'class name':
+        return [e for e in candidates if value in e.classes]
+    if using == 'tag name':
+        return [e for e in candidates if e.tag == value.lower()]
+    if using == 'link text':
+        return [e for e in candidates if e.tag == 'a' and e.text == value]
+    if using == 'partial link text':
+        return [e for e in candidates if e.tag == 'a' and value in e.text]
+    raise invalid_selector(value)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ The browser ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def _find_option(select, value):
+    value = six.text_type(value)
+    for option in select.options:
+        if value in (option.get_attribute('value'), option.text):
+            return option
+    return None
+
+
+class FakeBrowser(object):
+    """
+    The state of a fake browser session, acting as the command executor for
+    a FakeWebDriver.
+    """
+
+    def __init__(self, proxy=None, user_data_dir=None):
+        self.session_id = str(uuid.uuid4())
+        self.user_data_dir = user_data_dir
+        self.lock = threading.RLock()
+        self.document = parse_html('<html><head></head><body></body></html>')
+        self.current_url = 'about:blank'
+        self.pages = {}
+        self.cookies = http_cookiejar.CookieJar()
+        proxies = {'http': 'http://%s' % proxy} if proxy else {}
+        self.opener = build_opener(ProxyHandler(proxies),
+                                   HTTPCookieProcessor(self.cookies))
+        self.window_size = {'width': 1280, 'height': 1024}
+        self.page_load_timeout = None
+        self.timing = {}
+        self.document_size = 0
+        self.command_delays = {}
+        self.scripts = [(PAGE_METRICS_SCRIPT, FakeBrowser.page_metrics),
+                        (PERFORM_SCRIPT, FakeBrowser.perform),
+                        (INSTALL_SCRIPT, FakeBrowser.install_console),
+                        (HARVEST_SCRIPT, FakeBrowser.harvest_console),
+                        (ELEMENT_BOX_SCRIPT, FakeBrowser.element_box)]
+        self.console = []
+        self.console_installed = False
+        self.history = []
+        self._element_ids = {}
+        self._elements = {}
+        self._failures = []
+        self._scheduled = []
+        self.handlers = {
+            Command.NEW_SESSION: self.new_session,
+            Command.QUIT: lambda params: None,
+            Command.GET: self.get,
+            Command.GET_CURRENT_URL: lambda params: self.current_url,
+            Command.GET_TITLE: self.get_title,
+            Command.GET_PAGE_SOURCE: lambda params: self.document.serialize(),
+            Command.REFRESH: lambda params: self.load(self.current_url),
+            Command.SET_TIMEOUTS: self.set_timeouts,
+            Command.IMPLICIT_WAIT: lambda params: None,
+            Command.SET_WINDOW_SIZE: self.set_window_size,
+            Command.GET_WINDOW_SIZE: lambda params: dict(self.window_size),
+            Command.SCREENSHOT: self.screenshot,
+            Command.EXECUTE_SCRIPT: self.execute_script,
+            Command.FIND_ELEMENT: self.find_element,
+            Command.FIND_ELEMENTS: self.find_elements,
+            Command.FIND_CHILD_ELEMENT: self.find_element,
+            Command.FIND_CHILD_ELEMENTS: self.find_elements,
+            Command.CLICK_ELEMENT: self.click,
+            Command.CLEAR_ELEMENT: self.clear,
+            Command.SUBMIT_ELEMENT: self.submit_element,
+            Command.SEND_KEYS_TO_ELEMENT: self.send_keys,
+            Command.GET_ELEMENT_TEXT: lambda params: self.element(params).text,
+            Command.GET_ELEMENT_TAG_NAME: lambda params: self.element(params).tag,
+            Command.GET_ELEMENT_ATTRIBUTE: lambda params: self.element(params).get_attribute(params['name']),
+            Command.GET_ELEMENT_VALUE_OF_CSS_PROPERTY: lambda params: self.element(params).css_value(params['propertyName']),
+            Command.IS_ELEMENT_DISPLAYED: lambda params: self.element(params).is_displayed(),
+            Command.IS_ELEMENT_ENABLED: lambda params: self.element(params).is_enabled(),
+            Command.IS_ELEMENT_SELECTED: lambda params: self.element(params).selected,
+            Command.GET_ELEMENT_LOCATION: lambda params: dict(self.element(params).location or DEFAULT_LOCATION),
+            Command.GET_ELEMENT_LOCATION_ONCE_SCROLLED_INTO_VIEW: lambda params: dict(self.element(params).location or DEFAULT_LOCATION),
+            Command.GET_ELEMENT_SIZE: lambda params: dict(self.element(params).size or DEFAULT_SIZE),
+            Command.ADD_COOKIE: self.add_cookie,
+            Command.GET_ALL_COOKIES: self.get_cookies,
+            Command.DELETE_COOKIE: self.delete_cookie,
+            Command.DELETE_ALL_COOKIES: lambda params: self.cookies.clear(),
+        }
+
+    # Command execution
+
+    def execute(self, command, params):
+        """Execute a WebDriver command, returning the wire protocol
+        response"""
+        delay = self.command_delays.get(command)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            self.run_scheduled()
+            self.history.append(command)
+            try:
+                failure = self._pop_failure(command)
+                if failure:
+                    raise failure
+                handler = self.handlers.get(command)
+                if handler is None:
+                    raise FakeError(ErrorCode.UNKNOWN_COMMAND[0],
+                                    'The fake browser does not support %s' % command)
+                value = self.wrap(handler(params))
+            except FakeError as e:
+                return {'status': e.status, 'value': {'message': e.message}}
+        return {'status': ErrorCode.SUCCESS, 'value': value,
+                'sessionId': self.session_id}
+
+    def _pop_failure(self, command):
+        for i, (failing_command, error) in enumerate(self._failures):
+            if failing_command == command:
+                del self._failures[i]
+                return error
+        return None
+
+    def fail_next(self, command, error='unknown error', message=None,
+                  count=1):
+        """ Make the next ``count`` executions of the given WebDriver command
+        (one of the ``selenium.webdriver.remote.command.Command`` constants)
+        fail with the named error (a key of ``ERRORS``) """
+        message = message or 'Simulated %s' % error
+        with self.lock:
+            for _i in range(count):
+                self._failures.append((command, FakeError(ERRORS[error], message)))
+
+    def later(self, delay, callback):
+        """ Call the given function with the current document once the given
+        number of seconds have passed (checked before each command) """
+        with self.lock:
+            self._scheduled.append((time.time() + delay, callback))
+
+    def run_scheduled(self):
+        now = time.time()
+        due = [item for item in self._scheduled if item[0] <= now]
+        for item in sorted(due, key=lambda item: item[0]):
+            self._scheduled.remove(item)
+            item[1](self.document)
+
+    def register_script(self, script, handler):
+        """ Respond to executions of a script (either an exact string, or a
+        compiled regular expression to search for in it) by calling the given
+        handler with this FakeBrowser and the script arguments; the handler's
+        return value is returned to the client """
+        with self.lock:
+            self.scripts.insert(0, (script, handler))
+
+    # Value conversion
+
+    def element_id(self, element):
+        key = id(element)
+        if key not in self._element_ids:
+            element_id = str(len(self._element_ids) + 1)
+            self._element_ids[key] = element_id
+            self._elements[element_id] = element
+        return self._element_ids[key]
+
+    def wrap(self, value):
+        if isinstance(value, FakeElement):
+            return {'ELEMENT': self.element_id(value)}
+        if isinstance(value, (list, tuple)):
+            return [self.wrap(item) for item in value]
+        if isinstance(value, dict):
+            return dict((key, self.wrap(item)) for key, item in value.items())
+        return value
+
+    def unwrap(self, value):
+        if isinstance(value, dict) and 'ELEMENT' in value:
+            return self.element({'id': value['ELEMENT']})
+        if isinstance(value, list):
+            return [self.unwrap(item) for item in value]
+        return value
+
+    def element(self, params):
+        """The element referred to by a command, if it's still attached to
+        the current document"""
+        element = self._elements.get(params['id'])
+        if element is None or element.root is not self.document:
+            raise FakeError(ErrorCode.STALE_ELEMENT_REFERENCE[0],
+                            'Element is no longer attached to the DOM')
+        return element
+
+    # Navigation
+
+    def new_session(self, params):
+        return {'browserName': 'fake', 'javascriptEnabled': False,
+                'takesScreenshot': True}
+
+    def cache_path(self, url):
+        """The file in which the page at the given URL is cached, if the
+        browser has a user data directory"""
+        if not self.user_data_dir:
+            return None
+        digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.user_data_dir, 'Cache', digest)
+
+    def load(self, url, data=None):
+        """Load the document at the given URL (from ``pages`` if present
+        there, otherwise from the cache in the user data directory, otherwise
+        via HTTP)"""
+        start = _milliseconds()
+        response_start = start
+        cache_path = self.cache_path(url) if data is None else None
+        if url in self.pages:
+            html = self.pages[url]
+        elif cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                html = f.read()
+        else:
+            request = Request(url, data)
+            try:
+                response = self.opener.open(request, timeout=self.page_load_timeout)
+            except HTTPError as e:
+                response = e
+            except Exception as e:
+                raise FakeError(ERRORS['unknown error'],
+                                'Error loading %s: %s' % (url, e))
+            response_start = _milliseconds()
+            html = response.read()
+            if cache_path and response.getcode() == 200 and \
+                    response.geturl() == url:
+                if not os.path.isdir(os.path.dirname(cache_path)):
+                    os.makedirs(os.path.dirname(cache_path))
+                with open(cache_path, 'wb') as f:
+                    f.write(html)
+            url = response.geturl()
+        response_end = _milliseconds()
+        self.document = parse_html(html)
+        self.console_installed = False
+        self.current_url = url
+        self.document_size = len(html)
+        loaded = _milliseconds()
+        self.timing = {
+            'navigationStart': start,
+            'fetchStart': start,
+            'responseStart': response_start,
+            'responseEnd': response_end,
+            'domContentLoadedEventEnd': loaded,
+            'domComplete': loaded,
+            'loadEventEnd': loaded,
+        }
+
+    def page_metrics(self):
+        """Response to the page metrics script: the timing of the last page
+        load, and a resource entry for each script, stylesheet, and image it
+        refers to (which aren't actually fetched)"""
+        resources = []
+        for initiator_type, selector, attribute in RESOURCE_SELECTORS:
+            for element in find_elements(self.document, 'css selector', selector):
+                resources.append({
+                    'name': urljoin(self.current_url, element.get_attribute(attribute)),
+                    'initiatorType': initiator_type,
+                    'duration': 0,
+                    'transferSize': 0,
+                })
+        return {'url': self.current_url, 'timing': dict(self.timing),
+                'documentTransferSize': self.document_size,
+                'resources': resources}
+
+    def get(self, params):
+        self.load(params['url'])
+
+    def install_console(self):
+        self.console_installed = True
+
+    def harvest_console(self):
+        entries = self.console
+        self.console = []
+        return entries
+
+    def log_console(self, level, message):
+        """Simulate a console message or uncaught error in the current page
+        (only recorded if the console buffer was installed in it)"""
+        with self.lock:
+            if self.console_installed:
+                self.console.append({'level': level, 'message': message,
+                                     'url': self.current_url,
+                                     'timestamp': _milliseconds()})
+
+    def element_box(self, element):
+        """Response to the element screenshot script: the element's bounding
+        box (empty if it's hidden), scroll position, viewport size, and pixel
+        ratio"""
+        if element.is_displayed():
+            location = element.location or DEFAULT_LOCATION
+            size = element.size or DEFAULT_SIZE
+        else:
+            location, size = DEFAULT_LOCATION, {'width': 0, 'height': 0}
+        return [location['x'], location['y'], size['width'], size['height'],
+                0, 0, self.window_size['width'], self.window_size['height'], 1]
+
+    def perform(self, actions):
+        """Response to the action sequence script: the selectors of any
+        elements (or select box options) which can't be found or aren't
+        visible, or else an empty list after performing the actions"""
+        elements = []
+        waiting = []
+        for name, selector, value in actions:
+            found = find_elements(self.document, 'css selector', selector)
+            element = found[0] if found else None
+            if element is None or not element.is_displayed() or \
+                    (name == 'set' and element.tag == 'select' and
+                     _find_option(element, value) is None):
+                waiting.append(selector)
+            elements.append(element)
+        if waiting:
+            return waiting
+        for (name, selector, value), element in zip(actions, elements):
+            element_type = element.attributes.get('type', '').lower()
+            if name == 'click':
+                self.click({'id': self.element_id(element)})
+            elif element.tag == 'select':
+                option = _find_option(element, value)
+                if 'multiple' not in element.attributes:
+                    for other in element.options:
+                        other.selected = False
+                option.selected = True
+            elif element_type in ('checkbox', 'radio'):
+                element.selected = bool(value)
+            else:
+                element.value = '' if value is None else six.text_type(value)
+        return []
+
+    def get_title(self, params):
+        titles = find_elements(self.document, 'tag name', 'title')
+        return titles[0].string_value.strip() if titles else ''
+
+    def set_timeouts(self, params):
+        if params.get('type') == 'page load':
+            self.page_load_timeout = params['ms'] / 1000.0
+
+    def set_window_size(self, params):
+        self.window_size = {'width': params['width'],
+                            'height': params['height']}
+
+    def screenshot(self, params):
+        png = _png(self.window_size['width'], self.window_size['height'])
+        return base64.b64encode(png).decode('ascii')
+
+    # Cookies
+
+    def add_cookie(self, params):
+        """Set a cookie for the current page's domain, which (as in a real
+        browser) it must have"""
+        values = params['cookie']
+        host = urlsplit(self.current_url).hostname
+        if not host:
+            raise FakeError(ERRORS['unable to set cookie'],
+                            'Cannot set cookies for %s' % self.current_url)
+        domain = values.get('domain') or host
+        bare_domain = domain.lstrip('.')
+        if host != bare_domain and not host.endswith('.' + bare_domain):
+            raise FakeError(ERRORS['invalid cookie domain'],
+                            'Cannot set a cookie for %s on %s' % (domain, host))
+        if 'domain' not in values:
+            # The form of the host name the cookie jar itself would use for
+            # a cookie without a domain ("localhost.local" for "localhost")
+            domain = http_cookiejar.eff_request_host(Request(self.current_url))[1]
+        expiry = values.get('expiry')
+        cookie = http_cookiejar.Cookie(
+            0, values['name'], values['value'], None, False, domain,
+            'domain' in values, domain.startswith('.'),
+            values.get('path') or '/', True, values.get('secure', False),
+            int(expiry) if expiry is not None else None, expiry is None,
+            None, None, {'HttpOnly': None} if values.get('httpOnly') else {})
+        self.cookies.set_cookie(cookie)
+
+    def get_cookies(self, params):
+        """The cookies which would be sent with a request for the current
+        page"""
+        request = Request(self.current_url)
+        self.cookies.add_cookie_header(request)
+        header = request.get_header('Cookie') or ''
+        names = set(pair.split('=', 1)[0] for pair in header.split('; ') if pair)
+        host = urlsplit(self.current_url).hostname
+        return [{'name': cookie.name, 'value': cookie.value,
+                 'domain': cookie.domain if cookie.domain_specified else host,
+                 'path': cookie.path,
+                 'secure': cookie.secure, 'expiry': cookie.expires,
+                 'httpOnly': cookie.has_nonstandard_attr('HttpOnly')}
+                for cookie in self.cookies if cookie.name in names]
+
+    def delete_cookie(self, params):
+        for cookie in list(self.cookies):
+            if cookie.name == params['name']:
+                self.cookies.clear(cookie.domain, cookie.path, cookie.name)
+
+    # Scripts
+
+    def execute_script(self, params):
+        script = params['script']
+        args = self.unwrap(params.get('args', []))
+        for pattern, handler in self.scripts:
+            if isinstance(pattern, six.string_types):
+                matched = pattern.strip() == script.strip()
+            else:
+                matched = pattern.search(script) is not None
+            if matched:
+                return handler(self, *args)
+        match = LITERAL_SCRIPT.match(script)
+        if match:
+            return json.loads(match.group(1))
+        raise FakeError(ERRORS['javascript error'],
+                        'The fake browser has no handler for the script: %s' % script)
+
+    # Elements
+
+    def _context(self, params):
+        if 'id' in params:
+            return self.element(params)
+        return self.document
+
+    def find_element(self, params):
+        elements = find_elements(self._context(params), params['using'],
+                                 params['value'])
+        if not elements:
+            raise FakeError(ERRORS['no such element'],
+                            'Unable to locate element: %s' % params['value'])
+        return elements[0]
+
+    def find_elements(self, params):
+        return find_elements(self._context(params), params['using'],
+                             params['value'])
+
+    def click(self, params):
+        element = self.element(params)
+        if not element.is_displayed():
+            raise FakeError(ERRORS['element not visible'],
+                            'Element is not currently visible')
+        for listener in element.listeners:
+            listener(element)
+        element_type = element.attributes.get('type', '').lower()
+        if element.tag == 'option':
+            select = element.select
+            if select is not None and 'multiple' not in select.attributes:
+                for option in select.options:
+                    option.selected = False
+                element.selected = True
+            else:
+                element.selected = not element.selected
+        elif element.tag == 'input' and element_type == 'checkbox':
+            element.selected = not element.selected
+        elif element.tag == 'input' and element_type == 'radio':
+            name = element.attributes.get('name')
+            for other in find_elements(self.document, 'name', name):
+                other.selected = False
+            element.selected = True
+        elif element.tag == 'a' and 'href' in element.attributes:
+            href = element.attributes['href']
+            if not href.startswith(('#', 'javascript:')):
+                self.load(urljoin(self.current_url, href))
+        elif (element.tag == 'button' and element_type in ('', 'submit')) or \
+                (element.tag == 'input' and element_type in ('submit', 'image')):
+            if element.form is not None:
+                self.submit(element.form, element)
+
+    def clear(self, params):
+        element = self.element(params)
+        element.value = ''
+
+    def send_keys(self, params):
+        element = self.element(params)
+        text = ''.join(params['value'])
+        if Keys.ENTER in text or Keys.RETURN in text:
+            # Enter or Return submits the form
+            element.value += text.replace(Keys.ENTER, '').replace(Keys.RETURN, '')
+            if element.form is not None:
+                self.submit(element.form)
+        else:
+            element.value += text
+
+    def submit_element(self, params):
+        element = self.element(params)
+        form = element if element.tag == 'form' else element.form
+        if form is not None:
+            self.submit(form)
+
+    def submit(self, form, submitter=None):
+        """Submit a form, loading the response as the new document"""
+        fields = []
+        for element in form.descendants():
+            name = element.attributes.get('name')
+            if not name or not element.is_enabled():
+                continue
+            element_type = element.attributes.get('type', '').lower()
+            if element.tag == 'select':
+                fields.extend((name, option.get_attribute('value'))
+                              for option in element.options if option.selected)
+            elif element.tag == 'textarea':
+                fields.append((name, element.value))
+            elif element.tag == 'input':
+                if element_type in ('checkbox', 'radio'):
+                    if element.selected:
+                        fields.append((name, element.attributes.get('value', 'on')))
+                elif element_type not in ('submit', 'button', 'image', 'reset'):
+                    fields.append((name, element.value))
+        if submitter is not None and submitter.attributes.get('name'):
+            fields.append((submitter.attributes['name'], submitter.value))
+        encoded = urlencode([(name, value.encode('utf-8'))
+                             for name, value in fields])
+        action = urljoin(self.current_url, form.attributes.get('action', ''))
+        if form.attributes.get('method', 'get').lower() == 'post':
+            self.load(action, encoded.encode('ascii'))
+        else:
+            self.load('%s?%s' % (action.split('?')[0], encoded))
+
+
+class FakeWebDriver(RemoteWebDriver):
+    """
+    Selenium WebDriver for a FakeBrowser.  The browser's scripting methods
+    are available directly on the driver for convenience.
+    """
+
+    def __init__(self, proxy=None, user_data_dir=None):
+        self.browser = FakeBrowser(proxy, user_data_dir)
+        RemoteWebDriver.__init__(self, command_executor=self.browser,
+                                 desired_capabilities={'browserName': 'fake'})
+        self._is_remote = False
+
+    @property
+    def document(self):
+        """The root FakeElement of the current page"""
+        return self.browser.document
+
+    @property
+    def pages(self):
+        """HTML content to serve for particular URLs instead of fetching them"""
+        return self.browser.pages
+
+    @property
+    def command_delays(self):
+        """Number of seconds to wait before executing each type of command"""
+        return self.browser.command_delays
+
+    def fail_next(self, *args, **kwargs):
+        self.browser.fail_next(*args, **kwargs)
+    fail_next.__doc__ = FakeBrowser.fail_next.__doc__
+
+    def later(self, delay, callback):
+        self.browser.later(delay, callback)
+    later.__doc__ = FakeBrowser.later.__doc__
+
+    def register_script(self, script, handler):
+        self.browser.register_script(script, handler)
+    register_script.__doc__ = FakeBrowser.register_script.__doc__
+
+    def log_console(self, level, message):
+        self.browser.log_console(level, message)
+    log_console.__doc__ = FakeBrowser.log_console.__doc__
+
+    def query(self, selector):
+        """Get the first element in the current page matching the CSS
+        selector, for modifying it directly"""
+        elements = find_elements(self.document, 'css selector', selector)
+        return elements[0] if elements else None
@@ -0,0 +1,225 @@
+"""
+Load generation: replaying SeleniumTestCase tests as user scenarios, with
+several browsers running them over and over at the same time against a
+target site (instead of the live test server), for a fixed length of time.
+The latency of each helper step (``get()``, ``click()``, ``wait_for_*()``,
+and so forth) and of each whole scenario is collected in histograms, and
+reported as percentiles along with the throughput.
+
+Scenarios are run without the live server or the test database, so they
+should only use pages of the target site (not ``login()`` or fixtures).
+Invoked by ``manage.py selenium --load N --duration T --target URL``.
+"""
+from __future__ import absolute_import
+
+from importlib import import_module
+import itertools
+import math
+import os
+import threading
+import time
+import unittest
+
+from sbo_selenium import steps
+
+# Each histogram bucket is 2% wider than the one before it, starting at 0.1 ms
+BUCKET_BASE = 0.0001
+BUCKET_GROWTH = 1.02
+PERCENTILES = (50, 95, 99)
+
+
+def target():
+    """ The URL of the site being load tested, if any """
+    return os.getenv('SELENIUM_LOAD_TARGET', '')
+
+
+class Histogram(object):
+    """
+    Latencies in logarithmic buckets, so percentiles can be estimated (to
+    within 2%) from any number of samples in a small, fixed amount of memory.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= BUCKET_BASE:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(seconds / BUCKET_BASE) /
+                                  math.log(BUCKET_GROWTH)))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """ The latency (in seconds) which the given percentage of the
+        samples didn't exceed """
+        if not self.count:
+            return None
+        rank = int(math.ceil(self.count * percent / 100.0))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(BUCKET_BASE * BUCKET_GROWTH ** index, self.max)
+        return self.max
+
+    def describe(self):
+        parts = ['p%d %.0f ms' % (percent, self.percentile(percent) * 1000)
+                 for percent in PERCENTILES]
+        parts.append('max %.0f ms' % (self.max * 1000))
+        return ', '.join(parts)
+
+
+class LoadResults(object):
+    """
+    The latencies of the scenarios and steps run during a load test.
+    """
+
+    def __init__(self, workers, duration, url):
+        self.workers = workers
+        self.duration = duration
+        self.url = url
+        self.elapsed = 0.0
+        self.scenarios = {}
+        self.steps = {}
+        self.failures = {}
+        self.first_errors = {}
+        self._lock = threading.Lock()
+
+    def _add(self, histograms, name, seconds):
+        with self._lock:
+            if name not in histograms:
+                histograms[name] = Histogram()
+            histograms[name].add(seconds)
+
+    def add_scenario(self, name, seconds, error=None):
+        """ Record a run of a scenario, and the last line of its traceback
+        if it failed """
+        self._add(self.scenarios, name, seconds)
+        if error is not None:
+            with self._lock:
+                self.failures[name] = self.failures.get(name, 0) + 1
+                self.first_errors.setdefault(name, error)
+
+    def add_step(self, test, name, seconds):
+        self._add(self.steps, name, seconds)
+
+    def report(self):
+        """ Describe the results, one line at a time """
+        elapsed = self.elapsed or 1
+        completed = sum(histogram.count for histogram in self.scenarios.values())
+        lines = [
+            '%d workers for %.0f seconds against %s' % (self.workers,
+                                                        self.elapsed, self.url),
+            'Scenarios: %d completed (%d failed), %.1f per second' % (
+                completed, sum(self.failures.values()), completed / elapsed),
+        ]
+        for name in sorted(self.scenarios):
+            histogram = self.scenarios[name]
+            lines.append('%s: %d runs (%d failed), %s' % (
+                name, histogram.count, self.failures.get(name, 0),
+                histogram.describe()))
+            if name in self.first_errors:
+                lines.append('  first failure: %s' % self.first_errors[name])
+        lines.append('Steps:')
+        for name in sorted(self.steps, key=lambda name: -self.steps[name].total):
+            histogram = self.steps[name]
+            lines.append('%s: %d calls, %.1f per second, %s' % (
+                name, histogram.count, histogram.count / elapsed,
+                histogram.describe()))
+        return lines
+
+
+def scenarios(labels):
+    """ Load the tests with the given labels (in either ``package.module.Class``
+    or nose's ``package.module:Class.test_method`` form) """
+    loader = unittest.TestLoader()
+    tests = []
+
+    def flatten(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                flatten(test)
+            else:
+                tests.append(test)
+
+    for label in labels:
+        # Import the module explicitly rather than leaving it to the loader,
+        # which looks submodules up as attributes of their packages
+        parts = label.replace(':', '.').split('.')
+        for index in range(len(parts), 0, -1):
+            try:
+                module = import_module('.'.join(parts[:index]))
+            except ImportError:
+                if index == 1:
+                    raise
+                continue
+            if index == len(parts):
+                flatten(loader.loadTestsFromModule(module))
+            else:
+                flatten(loader.loadTestsFromName('.'.join(parts[index:]),
+                                                 module))
+            break
+    return tests
+
+
+def run(labels, workers, duration, url):
+    """ Run the tests with the given labels as scenarios, in the given
+    number of concurrent workers for the given number of seconds, against
+    the site at the given URL.  Returns the LoadResults. """
+    tests = scenarios(labels)
+    if not tests:
+        raise ValueError('No tests found for %s' % ', '.join(labels))
+    results = LoadResults(workers, duration, url)
+    previous_target = os.environ.get('SELENIUM_LOAD_TARGET')
+    os.environ['SELENIUM_LOAD_TARGET'] = url
+    classes = []
+    for test in tests:
+        if type(test) not in classes:
+            classes.append(type(test))
+    steps.add_listener(results.add_step)
+    try:
+        for test_class in classes:
+            test_class.setUpClass()
+        start = time.time()
+        deadline = start + duration
+
+        def work(offset):
+            order = itertools.islice(itertools.cycle(tests), offset, None)
+            for test in order:
+                if time.time() >= deadline:
+                    return
+                scenario = type(test)(test._testMethodName)
+                result = unittest.TestResult()
+                scenario_start = time.time()
+                scenario(result)
+                seconds = time.time() - scenario_start
+                problems = result.errors + result.failures
+                error = problems[0][1].strip().splitlines()[-1] if problems else None
+                results.add_scenario(test.id(), seconds, error)
+
+        threads = [threading.Thread(target=work, args=(i % len(tests),),
+                                    name='load-%d' % i)
+                   for i in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)
+        results.elapsed = time.time() - start
+    finally:
+        steps.remove_listener(results.add_step)
+        for test_class in classes:
+            test_class.tearDownClass()
+        if previous_target is None:
+            del os.environ['SELENIUM_LOAD_TARGET']
+        else:
+            os.environ['SELENIUM_LOAD_TARGET'] = previous_target
+    return results
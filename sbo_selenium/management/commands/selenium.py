@@ -1,15 +1,19 @@
 from optparse import make_option
 import os
+import socket
 from shutil import rmtree
 from subprocess import Popen, PIPE
+import uuid
 
 from django.core.management import call_command
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from django_nose.management.commands.test import Command as TestCommand
 
+from sbo_selenium import baselines, load, memory, metrics, pool, processes, \
+    results, retries
 from sbo_selenium.conf import settings
-from sbo_selenium.testcase import sauce_sessions
+from sbo_selenium.sauce import sauce_sessions
 from sbo_selenium.utils import OutputMonitor
 
 
@@ -25,8 +29,8 @@ class Command(BaseCommand):
             '-b',
             '--browser',
             dest='browser_name',
-            default='chrome',
-            help='Name of the browser to run the tests in (default is chrome)'
+            help='Name of the browser to run the tests in (default is the '
+                 'SELENIUM_DEFAULT_BROWSER setting)'
         ),
         make_option(
             '-n',
@@ -35,17 +39,93 @@ class Command(BaseCommand):
             default=1,
             help='Number of times to run each test'
         ),
+        make_option(
+            '--load',
+            type='int',
+            dest='load',
+            help='Run the tests as a load test: this many browsers repeatedly '
+                 'running them at once against the --target site, reporting '
+                 'latency percentiles for each helper step'
+        ),
+        make_option(
+            '--duration',
+            type='float',
+            dest='duration',
+            default=60,
+            help='Number of seconds to run a load test for (default 60)'
+        ),
+        make_option(
+            '--target',
+            dest='target',
+            help='URL of the site to load test instead of the live server'
+        ),
         make_option(
             '-p',
             '--platform',
             dest='platform',
             help='OS and version thereof for the Sauce OnDemand VM to use'
         ),
+        make_option(
+            '--baseline',
+            dest='baseline',
+            help='File in which to keep per-test performance baselines '
+                 '(default is the SELENIUM_BASELINE_FILE setting)'
+        ),
+        make_option(
+            '--compare-baseline',
+            action='store_true',
+            dest='compare_baseline',
+            default=False,
+            help='Report tests which got slower (or polled more) than their '
+                 'baseline'
+        ),
+        make_option(
+            '--strict',
+            action='store_true',
+            dest='strict',
+            default=False,
+            help='With --compare-baseline, fail if there are any regressions '
+                 '(and leave the baseline unchanged)'
+        ),
         make_option(
             '--browser-version',
             dest='browser_version',
             help='Browser version for the Sauce OnDemand VM to use'
         ),
+        make_option(
+            '--profile',
+            dest='browser_profile',
+            help='Name of the SELENIUM_BROWSER_PROFILES entry to launch '
+                 'browsers with (for example, "ci" for a fast headless '
+                 'configuration)'
+        ),
+        make_option(
+            '--results-json',
+            dest='results_json',
+            help='File to append each test result to as a line of JSON '
+                 '(default is the SELENIUM_RESULTS_JSON setting)'
+        ),
+        make_option(
+            '--junit-xml',
+            dest='junit_xml',
+            help='File in which to keep a JUnit XML report of the results '
+                 'of this run (default is the SELENIUM_JUNIT_XML setting)'
+        ),
+        make_option(
+            '--retries',
+            type='int',
+            dest='retries',
+            help='Number of times to immediately re-run each test which fails '
+                 '(default is the SELENIUM_RETRIES setting)'
+        ),
+        make_option(
+            '--track-memory',
+            action='store_true',
+            dest='track_memory',
+            default=False,
+            help='Track memory usage and report the largest growth at the end '
+                 '(default is the SELENIUM_TRACK_MEMORY setting)'
+        ),
         make_option(
             '--tunnel-identifier',
             dest='tunnel_id',
@@ -67,16 +147,32 @@ class Command(BaseCommand):
         the specified browser.
         """
         browser_name = options['browser_name']
+        if not browser_name:
+            browser_name = options['browser_name'] = settings.SELENIUM_DEFAULT_BROWSER
         count = options['count']
         if len(args) > 0:
             tests = list(args)
         else:
             tests = settings.SELENIUM_DEFAULT_TESTS
 
-        # Kill any orphaned chromedriver processes
-        process = Popen(['killall', 'chromedriver'],
-                        stderr=open(os.devnull, 'w'))
-        process.wait()
+        if options.get('load') and not options.get('target'):
+            self.stdout.write('A load test needs a --target site URL')
+            return
+        if options.get('compare_baseline') and not (
+                options.get('baseline') or settings.SELENIUM_BASELINE_FILE):
+            self.stdout.write('Comparing to a baseline needs a --baseline file')
+            return
+
+        browser_profile = options['browser_profile']
+        profiles = settings.SELENIUM_BROWSER_PROFILES
+        if browser_profile and browser_profile not in profiles:
+            msg = 'Unknown browser profile "%s"; the options are %s'
+            self.stdout.write(msg % (browser_profile, ', '.join(sorted(profiles))))
+            return
+
+        # Stop any browser drivers and helpers left running by earlier test
+        # runs which crashed (but not those of other runs still in progress)
+        processes.cleanup_orphans()
 
         # Clear any old log and screenshots
         self.clean()
@@ -101,27 +197,145 @@ class Command(BaseCommand):
 
         # Configure and run the tests
         self.update_environment(options)
-        self.run_tests(tests, browser_name, count)
+        try:
+            if options.get('load'):
+                self.run_load_test(tests, options)
+            else:
+                self.run_and_report(tests, browser_name, count, options)
+        finally:
+            # Stop Sauce Connect, the Selenium standalone server, and any
+            # browser drivers which are still running
+            pool.close_pools()
+            processes.cleanup()
 
-        # Kill Sauce Connect, if running
-        if sc_process:
-            sc_process.kill()
+    @staticmethod
+    def live_server_address():
+        """ The address(es) at which to run the live test server: the
+        DJANGO_LIVE_TEST_SERVER_ADDRESS setting, or that host with a set of
+        currently unused ports if SELENIUM_LIVE_SERVER_PORTS is set (each test
+        process uses the first of these which is still available) """
+        address = settings.DJANGO_LIVE_TEST_SERVER_ADDRESS
+        count = settings.SELENIUM_LIVE_SERVER_PORTS
+        if not count:
+            return address
+        host = address.split(':')[0]
+        sockets = []
+        try:
+            for _i in range(count):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.bind((host, 0))
+                sockets.append(sock)
+            ports = [str(sock.getsockname()[1]) for sock in sockets]
+        finally:
+            for sock in sockets:
+                sock.close()
+        return '%s:%s' % (host, ','.join(ports))
 
-        # Kill the Selenium standalone server, if running
-        if selenium_process:
-            selenium_process.kill()
+    def run_and_report(self, tests, browser_name, count, options):
+        """Run the tests, then write the JUnit report and update the
+        performance baseline"""
+        if baselines.enabled():
+            baselines.start()
+        results_offset = results.size()
+        # The test command exits if any tests failed, but the baseline should
+        # still be updated and compared
+        failed = None
+        try:
+            self.run_tests(tests, browser_name, count)
+        except SystemExit as e:
+            failed = e
+        finally:
+            results.write_report(results_offset)
+        if baselines.enabled():
+            self.update_baseline(options)
+        if failed is not None:
+            raise failed
 
     def run_tests(self, tests, browser_name, count):
         """Configure and run the tests"""
         test_args = ['test'] + tests
-        for i in range(count):
-            msg = 'Test run %d using %s' % (i + 1, browser_name)
-            self.stdout.write(msg)
-            call_command(*test_args)
-            for session in sauce_sessions:
-                self.stdout.write(session)
-            self.stdout.flush()
-            del sauce_sessions[:]
+        if memory.enabled():
+            memory.start()
+        # The test command exits if any tests failed, but the reports are
+        # most useful then
+        try:
+            for i in range(count):
+                msg = 'Test run %d using %s' % (i + 1, browser_name)
+                self.stdout.write(msg)
+                try:
+                    call_command(*test_args)
+                finally:
+                    for session in sauce_sessions:
+                        self.stdout.write(session)
+                    self.stdout.flush()
+                    del sauce_sessions[:]
+        finally:
+            self.write_reports()
+
+    def write_reports(self):
+        """Describe the page load metrics, remote command latencies, flaky
+        tests, and memory usage of the test run"""
+        page_metrics = metrics.report()
+        if page_metrics:
+            self.stdout.write('Page load metrics:')
+            for line in page_metrics:
+                self.stdout.write(line)
+        # Imported here because it loads Selenium, which the tests have done
+        # by now anyway
+        from sbo_selenium import transport
+        remote_commands = transport.report()
+        if remote_commands:
+            self.stdout.write('Remote WebDriver commands:')
+            for line in remote_commands:
+                self.stdout.write(line)
+        flaky = retries.report()
+        if flaky:
+            self.stdout.write('Tests which failed at least once:')
+            for line in flaky:
+                self.stdout.write(line)
+        memory_usage = memory.report()
+        if memory_usage:
+            self.stdout.write('Memory usage:')
+            for line in memory_usage:
+                self.stdout.write(line)
+        memory.stop()
+        self.stdout.flush()
+
+    def update_baseline(self, options):
+        """Compare the run's measurements to the performance baseline if
+        requested, then add them to it"""
+        path = baselines.path()
+        regressions = []
+        if options.get('compare_baseline'):
+            regressions = baselines.compare(path)
+            if regressions:
+                self.stdout.write('Performance regressions:')
+                for line in regressions:
+                    self.stdout.write(line)
+            else:
+                self.stdout.write('No performance regressions')
+        strict = options.get('strict') and regressions
+        if not strict:
+            baselines.save(path)
+        baselines.stop()
+        if strict:
+            raise CommandError('%d performance regressions' % len(regressions))
+
+    def run_load_test(self, tests, options):
+        """Run the tests as load test scenarios and report the results"""
+        from django.test.utils import setup_test_environment, \
+            teardown_test_environment
+        self.stdout.write('Load testing %s with %d %s browsers' % (
+            options['target'], options['load'], options['browser_name']))
+        setup_test_environment()
+        try:
+            load_results = load.run(tests, options['load'],
+                                    options['duration'], options['target'])
+        finally:
+            teardown_test_environment()
+        for line in load_results.report():
+            self.stdout.write(line)
+        self.stdout.flush()
 
     @staticmethod
     def update_environment(options):
@@ -133,10 +347,28 @@ class Command(BaseCommand):
         """
         env = os.environ
         # https://docs.djangoproject.com/en/1.6/topics/testing/tools/#liveservertestcase
-        env['DJANGO_LIVE_TEST_SERVER_ADDRESS'] = settings.DJANGO_LIVE_TEST_SERVER_ADDRESS
+        env['DJANGO_LIVE_TEST_SERVER_ADDRESS'] = Command.live_server_address()
+        # Lets test worker processes record the processes they start as
+        # belonging to this test run
+        env['SELENIUM_RUN_PID'] = str(os.getpid())
+        # Identifies this run's results in the accumulated results file
+        env['SELENIUM_RUN_ID'] = uuid.uuid4().hex
+        if options.get('results_json'):
+            env['SELENIUM_RESULTS_JSON'] = os.path.abspath(options['results_json'])
+        if options.get('junit_xml'):
+            env['SELENIUM_JUNIT_XML'] = os.path.abspath(options['junit_xml'])
+        if options.get('retries') is not None:
+            env['SELENIUM_RETRIES'] = str(options['retries'])
+        if options.get('baseline'):
+            env['SELENIUM_BASELINE_FILE'] = os.path.abspath(options['baseline'])
+        if options.get('track_memory'):
+            env['SELENIUM_TRACK_MEMORY'] = '1'
         tunnel_id = options['tunnel_id']
         if tunnel_id:
             env['SAUCE_TUNNEL_ID'] = tunnel_id
+        browser_profile = options['browser_profile']
+        if browser_profile:
+            env['SELENIUM_BROWSER_PROFILE'] = browser_profile
         if 'SAUCE_API_KEY' in env:
             # Jenkins plugin has already configured the environment for us
             return
@@ -201,7 +433,9 @@ class Command(BaseCommand):
             command.extend(['-i', tunnel_id])
         sc_process = Popen(command,
                            stdout=output.stream.input,
-                           stderr=open(os.devnull, 'w'))
+                           stderr=open(os.devnull, 'w'),
+                           preexec_fn=os.setsid)
+        processes.register(sc_process.pid, 'Sauce Connect', group=True)
         ready_log_line = 'Connection established.'
         if not output.wait_for(ready_log_line, 60):
             self.stdout.write('Timeout starting Sauce Connect:\n')
@@ -236,7 +470,9 @@ class Command(BaseCommand):
         output = OutputMonitor()
         selenium_process = Popen(['java', '-jar', selenium_jar],
                                  stdout=output.stream.input,
-                                 stderr=open(os.devnull, 'w'))
+                                 stderr=open(os.devnull, 'w'),
+                                 preexec_fn=os.setsid)
+        processes.register(selenium_process.pid, 'Selenium server', group=True)
         ready_log_line = 'Started org.openqa.jetty.jetty.Server'
         if not output.wait_for(ready_log_line, 10):
             self.stdout.write('Timeout starting the Selenium server:\n')
@@ -0,0 +1,206 @@
+"""
+Memory tracking for long test runs, enabled by the ``SELENIUM_TRACK_MEMORY``
+setting (or the ``--track-memory`` option of the ``selenium`` command).  The
+resident memory of the test process (which includes the live server) is
+sampled before and after each test and each live server request, along with
+that of each browser driver's process tree at the end of each test.  At the
+end of the run, the tests and URLs after which the process had grown the most
+are reported, along with the biggest browsers and the sites of the largest
+growth in Python allocations: source lines if ``tracemalloc`` is available
+(Python 3.4 and later), otherwise types of object.
+"""
+from __future__ import absolute_import
+
+from collections import Counter
+import gc
+import os
+import subprocess
+import threading
+
+from sbo_selenium.conf import settings
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Number of entries in each part of the report
+TOP = 10
+# Stack depth recorded by tracemalloc for each allocation
+TRACEMALLOC_FRAMES = 1
+
+_lock = threading.Lock()
+_state = {}
+
+
+def enabled():
+    return bool(os.getenv('SELENIUM_TRACK_MEMORY') or
+                settings.SELENIUM_TRACK_MEMORY)
+
+
+def rss(pid=None):
+    """ The resident memory of a process (this one by default) in bytes, or
+    None if it can't be determined """
+    try:
+        with open('/proc/%s/statm' % (pid or 'self')) as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        output = subprocess.check_output(['ps', '-o', 'rss=', '-p',
+                                          str(pid or os.getpid())])
+        return int(output.strip()) * 1024
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def tree_rss(pid):
+    """ The total resident memory of a process and all its descendants in
+    bytes (such as a browser driver and the browser it started), or None
+    if it can't be determined """
+    try:
+        output = subprocess.check_output(['ps', '-A', '-o', 'pid=,ppid=,rss='])
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    children = {}
+    sizes = {}
+    for line in output.decode('ascii').splitlines():
+        child, parent, size = [int(value) for value in line.split()]
+        children.setdefault(parent, []).append(child)
+        sizes[child] = size
+    if pid not in sizes:
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += sizes.get(current, 0)
+        pending.extend(children.get(current, []))
+    return total * 1024
+
+
+def _object_counts():
+    gc.collect()
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def start():
+    """ Start tracking (again), taking the baseline measurements """
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    with _lock:
+        _state.clear()
+        _state.update({
+            'rss': rss(),
+            'snapshot': tracemalloc.take_snapshot() if tracemalloc else None,
+            'objects': None if tracemalloc else _object_counts(),
+            'tests': Counter(),
+            'requests': {},
+            'drivers': {},
+        })
+
+
+def started():
+    with _lock:
+        return bool(_state)
+
+
+def record_test(test_id, before, after, driver_sizes):
+    """ Record the process's resident memory before and after a test, and
+    that of each of its browsers' process trees (by name) at the end """
+    with _lock:
+        if not _state:
+            return
+        if before is not None and after is not None:
+            _state['tests'][test_id] += after - before
+        sizes = _state['drivers']
+        for name, size in driver_sizes.items():
+            if size is not None:
+                sizes['%s (%s)' % (test_id, name)] = size
+        if len(sizes) > 2 * TOP:
+            # Only the largest are reported, so don't keep the rest
+            for key in sorted(sizes, key=sizes.get)[:-TOP]:
+                del sizes[key]
+
+
+def record_request(path, before, after):
+    """ Record the process's resident memory before and after the live
+    server handled a request """
+    with _lock:
+        if not _state or before is None or after is None:
+            return
+        path = path.split('?')[0]
+        count, growth = _state['requests'].get(path, (0, 0))
+        _state['requests'][path] = (count + 1, growth + after - before)
+
+
+def _size(size):
+    return '%+.1f MiB' % (size / 1048576.0)
+
+
+def growth_sites():
+    """ Describe the sites of the largest growth in Python allocations since
+    tracking started """
+    with _lock:
+        snapshot = _state.get('snapshot')
+        objects = _state.get('objects')
+    if snapshot is not None:
+        differences = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+        return ['%s: %s (%+d blocks)' % (difference.traceback,
+                                         _size(difference.size_diff),
+                                         difference.count_diff)
+                for difference in differences[:TOP]
+                if difference.size_diff > 0]
+    if objects is None:
+        return []
+    counts = _object_counts()
+    counts.subtract(objects)
+    return ['%s: %+d objects' % (name, count)
+            for name, count in counts.most_common(TOP) if count > 0]
+
+
+def report():
+    """ Describe the memory growth since tracking started, one item per line
+    (nothing if it wasn't started) """
+    with _lock:
+        if not _state:
+            return []
+        baseline = _state['rss']
+        tests = _state['tests'].most_common(TOP)
+        requests = sorted(_state['requests'].items(),
+                          key=lambda item: -item[1][1])[:TOP]
+        drivers = sorted(_state['drivers'].items(),
+                         key=lambda item: -item[1])[:TOP]
+    tests = [(test_id, growth) for test_id, growth in tests if growth > 0]
+    requests = [item for item in requests if item[1][1] > 0]
+    current = rss()
+    lines = []
+    if baseline is not None and current is not None:
+        lines.append('Test process: %.1f MiB at the start, %.1f MiB now (%s)' % (
+            baseline / 1048576.0, current / 1048576.0,
+            _size(current - baseline)))
+    if tests:
+        lines.append('Largest growth during a test:')
+        lines.extend('  %s: %s' % (test_id, _size(growth))
+                     for test_id, growth in tests)
+    if requests:
+        lines.append('Largest growth while serving a URL:')
+        lines.extend('  %s: %s over %d requests' % (path, _size(growth), count)
+                     for path, (count, growth) in requests)
+    if drivers:
+        lines.append('Largest browser process trees:')
+        lines.extend('  %s: %.1f MiB' % (key, size / 1048576.0)
+                     for key, size in drivers)
+    sites = growth_sites()
+    if sites:
+        lines.append('Largest growth in Python allocations:')
+        lines.extend('  %s' % site for site in sites)
+    return lines
+
+
+def stop():
+    with _lock:
+        _state.clear()
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
@@ -0,0 +1,164 @@
+"""
+Page load performance metrics, gathered from the browser's Navigation Timing
+and Resource Timing APIs after each page load, and aggregated per URL over
+the whole test run.
+"""
+from __future__ import absolute_import
+
+import threading
+
+# Gets the navigation timing and resource entries for the current page in
+# a single round trip; returns null if the browser doesn't support them
+PAGE_METRICS_SCRIPT = """
+var performance = window.performance;
+if (!performance || !performance.timing) {
+    return null;
+}
+var timing = {};
+for (var key in performance.timing) {
+    if (typeof performance.timing[key] === 'number') {
+        timing[key] = performance.timing[key];
+    }
+}
+var navigation = null;
+var resources = [];
+if (performance.getEntriesByType) {
+    navigation = performance.getEntriesByType('navigation')[0] || null;
+    var entries = performance.getEntriesByType('resource');
+    for (var i = 0; i < entries.length; i++) {
+        resources.push({
+            name: entries[i].name,
+            initiatorType: entries[i].initiatorType,
+            duration: entries[i].duration,
+            transferSize: entries[i].transferSize || 0
+        });
+    }
+}
+return {
+    url: window.location.href,
+    timing: timing,
+    documentTransferSize: navigation ? navigation.transferSize || 0 : 0,
+    resources: resources
+};
+"""
+
+
+class PageMetrics(object):
+    """
+    Performance metrics for one page load, as returned by
+    PAGE_METRICS_SCRIPT.  Times are in milliseconds and sizes in bytes.
+    """
+
+    def __init__(self, data):
+        self.url = data['url']
+        self.timing = data['timing']
+        self.document_transfer_size = data.get('documentTransferSize', 0)
+        self.resources = data.get('resources', [])
+
+    def _since_start(self, *events):
+        start = self.timing.get('navigationStart', 0)
+        for event in events:
+            value = self.timing.get(event)
+            if value:
+                return value - start
+        return None
+
+    @property
+    def time_to_first_byte(self):
+        return self._since_start('responseStart')
+
+    @property
+    def dom_content_loaded(self):
+        return self._since_start('domContentLoadedEventEnd')
+
+    @property
+    def load_time(self):
+        """Time until the load event finished (or the DOM was complete, if it
+        hasn't finished yet)"""
+        return self._since_start('loadEventEnd', 'domComplete')
+
+    @property
+    def resource_count(self):
+        return len(self.resources)
+
+    def transfer_size(self, initiator_type=None):
+        """Bytes transferred for the page and its resources, or just for the
+        resources of one type ("script", "img", "css", etc.) if specified"""
+        resources = self.resources
+        if initiator_type is not None:
+            resources = [resource for resource in resources
+                         if resource['initiatorType'] == initiator_type]
+        total = sum(resource['transferSize'] for resource in resources)
+        if initiator_type is None:
+            total += self.document_transfer_size
+        return total
+
+
+class UrlMetrics(object):
+    """Metrics for all the loads of one URL during the test run"""
+
+    def __init__(self, url):
+        self.url = url
+        self.load_times = []
+        self.resource_counts = []
+        self.transfer_sizes = []
+
+    def add(self, metrics):
+        if metrics.load_time is not None:
+            self.load_times.append(metrics.load_time)
+        self.resource_counts.append(metrics.resource_count)
+        self.transfer_sizes.append(metrics.transfer_size())
+
+    @property
+    def count(self):
+        return len(self.resource_counts)
+
+    def median_load_time(self):
+        if not self.load_times:
+            return None
+        times = sorted(self.load_times)
+        middle = len(times) // 2
+        if len(times) % 2:
+            return times[middle]
+        return (times[middle - 1] + times[middle]) / 2.0
+
+
+_run_metrics = {}
+_run_metrics_lock = threading.Lock()
+
+
+def record(url, metrics):
+    """Add the metrics for a page load to the totals for the test run"""
+    with _run_metrics_lock:
+        url_metrics = _run_metrics.get(url)
+        if url_metrics is None:
+            url_metrics = _run_metrics[url] = UrlMetrics(url)
+        url_metrics.add(metrics)
+
+
+def run_metrics():
+    """Get the UrlMetrics for each URL loaded so far, ordered by URL"""
+    with _run_metrics_lock:
+        return [_run_metrics[url] for url in sorted(_run_metrics)]
+
+
+def clear():
+    with _run_metrics_lock:
+        _run_metrics.clear()
+
+
+def report():
+    """Describe the page load metrics gathered so far, one URL per line"""
+    lines = []
+    for url_metrics in run_metrics():
+        median = url_metrics.median_load_time()
+        if url_metrics.load_times:
+            load = 'load median %.0f ms, max %.0f ms' % (
+                median, max(url_metrics.load_times))
+        else:
+            load = 'load time unknown'
+        lines.append('%s: %d loads, %s, max %d resources, max %d bytes' % (
+            url_metrics.url, url_metrics.count, load,
+            max(url_metrics.resource_counts),
+            max(url_metrics.transfer_sizes)))
+    return lines
@@ -0,0 +1,114 @@
+"""
+Pools of pre-launched browsers.  Each pool keeps a few brand new drivers
+starting up in background threads, so a test can take one that's already
+running instead of waiting for a browser to launch, and hands used drivers
+back to be shut down in the background instead of waiting for that too.  Each
+test still gets a fresh browser of its own.
+"""
+from __future__ import absolute_import
+
+import atexit
+import logging
+import sys
+import threading
+
+from django.utils import six
+from django.utils.six.moves import queue
+
+# Imported first so its exit handler, which kills any browser processes
+# still running, is called after close_pools() has shut them down cleanly
+from sbo_selenium import processes  # noqa
+
+logger = logging.getLogger('sbo_selenium')
+
+
+class DriverPool(object):
+    """
+    A set of browsers of the same kind which are being launched in the
+    background.  ``factory`` is a callable that creates and returns a new
+    driver; ``size`` of them are kept starting up or ready at any given time.
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self._ready = queue.Queue()
+        self._closed = False
+        for _i in range(size):
+            self._start_thread(self._launch)
+
+    @staticmethod
+    def _start_thread(target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def _launch(self):
+        """Create a new driver and add it to the ready queue (along with the
+        exception info if it couldn't be created)"""
+        try:
+            driver = self.factory()
+        except Exception:
+            self._ready.put((None, sys.exc_info()))
+            return
+        if self._closed:
+            self._quit(driver)
+        else:
+            self._ready.put((driver, None))
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            logger.exception('Error shutting down a pooled browser')
+
+    def acquire(self):
+        """Get a driver, waiting for the next one to finish launching if none
+        are ready yet, and start launching a replacement for it"""
+        driver, exc_info = self._ready.get()
+        if not self._closed:
+            self._start_thread(self._launch)
+        if exc_info:
+            six.reraise(*exc_info)
+        return driver
+
+    def release(self, driver):
+        """Shut down a driver which is no longer needed in the background"""
+        self._start_thread(self._quit, driver)
+
+    def close(self):
+        """Stop launching new drivers and shut down any which are ready"""
+        self._closed = True
+        while True:
+            try:
+                driver, _exc_info = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                self._quit(driver)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory, size):
+    """ Get the driver pool for the given key (which should identify the
+    browser and anything else that affects how it's launched), creating it
+    with the given factory and size if it doesn't exist yet """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = DriverPool(factory, size)
+        return pool
+
+
+@atexit.register
+def close_pools():
+    """Shut down all the idle pooled browsers"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
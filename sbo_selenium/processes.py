@@ -0,0 +1,214 @@
+"""
+Tracking of the browser drivers and helper programs started during a test
+run, so that exactly those processes (and anything they started in turn) can
+be shut down afterwards without affecting other test runs on the same
+machine.  Each process is recorded in a PID file in ``SELENIUM_PID_DIR``
+along with the test run it belongs to, so processes left behind by a run
+which crashed can be found and cleaned up by the next one.
+"""
+from __future__ import absolute_import
+
+import atexit
+import errno
+import json
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import time
+
+from sbo_selenium.conf import settings
+
+logger = logging.getLogger('sbo_selenium')
+
+
+def pid_dir():
+    directory = settings.SELENIUM_PID_DIR or os.path.join(
+        tempfile.gettempdir(), 'sbo-selenium')
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    return directory
+
+
+def run_id():
+    """ The ID of the current test run: the process ID of the selenium
+    command (shared with any test worker processes via the environment), or
+    of this process if the tests weren't started by that command """
+    return int(os.environ.get('SELENIUM_RUN_PID', os.getpid()))
+
+
+def start_time(pid):
+    """ An identifier for when a process started (so a PID which has been
+    reused for a different process can be recognized), or None if there is
+    no such process """
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            # The command name in parentheses may contain spaces
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        if os.path.isdir('/proc/self'):
+            return None
+    # No /proc filesystem (OS X, etc.)
+    try:
+        output = subprocess.check_output(['ps', '-o', 'lstart=', '-p', str(pid)])
+    except subprocess.CalledProcessError:
+        return None
+    return output.decode('ascii', 'replace').strip() or None
+
+
+def running(pid):
+    """Determine if a process is running (and not just a zombie waiting for
+    its parent to collect its exit status)"""
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        if os.path.isdir('/proc/self'):
+            return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def descendants(pid):
+    """Get the IDs of all the processes started by the given one, directly
+    or indirectly"""
+    try:
+        output = subprocess.check_output(['ps', '-A', '-o', 'pid=,ppid='])
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    children = {}
+    for line in output.decode('ascii').splitlines():
+        child, parent = [int(value) for value in line.split()]
+        children.setdefault(parent, []).append(child)
+    result = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            result.append(child)
+            pending.append(child)
+    return result
+
+
+def kill_tree(pid, group=False, timeout=5):
+    """ Terminate a process and all of its descendants (or its whole process
+    group, if it was started as the leader of a new one), forcibly killing
+    any which are still running after the given number of seconds """
+    pids = [pid] + descendants(pid)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for target in pids:
+            try:
+                if group and target == pid:
+                    os.killpg(pid, sig)
+                else:
+                    os.kill(target, sig)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            pids = [target for target in pids
+                    if not _reap(target) and running(target)]
+            if not pids:
+                return
+            time.sleep(0.05)
+
+
+def _reap(pid):
+    """Collect the exit status of a process if it's a child of this one,
+    returning True if it has exited"""
+    try:
+        return os.waitpid(pid, os.WNOHANG)[0] == pid
+    except OSError:
+        return False
+
+
+def pid_file(pid):
+    return os.path.join(pid_dir(), '%d.json' % pid)
+
+
+def register(pid, name, group=False):
+    """ Record a process started during the current test run.  ``group``
+    should be True if it was started as the leader of a new process group. """
+    data = {'pid': pid, 'name': name, 'group': group, 'run': run_id(),
+            'run_started': start_time(run_id()), 'owner': os.getpid(),
+            'started': start_time(pid)}
+    path = pid_file(pid)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.rename(path + '.tmp', path)
+
+
+def unregister(pid):
+    try:
+        os.remove(pid_file(pid))
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def registered():
+    """Get the details of all the recorded processes"""
+    directory = pid_dir()
+    result = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                result.append(json.load(f))
+        except (IOError, ValueError):
+            # Being written or removed by another run
+            continue
+    return result
+
+
+def _stop(data):
+    """Shut down a recorded process if it's still the same one, and forget
+    about it"""
+    pid = data['pid']
+    if data['started'] is not None and start_time(pid) == data['started']:
+        logger.info('Stopping %s (process %d)', data['name'], pid)
+        kill_tree(pid, data.get('group', False))
+    unregister(pid)
+
+
+@atexit.register
+def cleanup_own():
+    """ Shut down the recorded processes which were started by this process
+    (rather than by another worker process in the same test run) """
+    for data in registered():
+        if data.get('owner') == os.getpid():
+            _stop(data)
+
+
+def cleanup(run=None):
+    """ Shut down the recorded processes belonging to the given test run
+    (the current one by default) """
+    if run is None:
+        run = run_id()
+    for data in registered():
+        if data['run'] == run:
+            _stop(data)
+
+
+def cleanup_orphans():
+    """ Shut down the recorded processes belonging to test runs which are no
+    longer running (because they crashed or were killed) """
+    for data in registered():
+        run = data['run']
+        if run == run_id():
+            continue
+        if start_time(run) is None or start_time(run) != data['run_started']:
+            _stop(data)
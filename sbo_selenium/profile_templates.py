@@ -0,0 +1,189 @@
+"""
+Browser profile templates with a warm HTTP cache.  When
+``SELENIUM_PROFILE_TEMPLATE_URLS`` is set, the first driver launched for each
+browser and launch profile is preceded by a warm-up browser which visits those
+URLs on the live server and is then shut down, leaving its profile (including
+the disk cache of the site's scripts, stylesheets, and images) as a template.
+Every driver after that gets its own copy of the template, so tests stay
+isolated from each other but don't all start with an empty cache.
+
+Copies are made copy-on-write where the filesystem supports it
+(``cp --reflink``), and are plain copies otherwise; hard links aren't used
+because browsers update their cache index and cookie databases in place,
+which would change the template as well.
+
+Browsers only finish writing their profile (the cache index in particular)
+as they exit.  Chrome is given the template directory itself, and
+ChromeDriver's quit() waits for the browser process to end.  Firefox instead
+runs with a temporary copy of its profile directory, which the Selenium
+driver's quit() deletes as soon as it has killed the browser; so the warm-up
+Firefox is shut down here instead, waiting for it to exit before its copy is
+saved as the template.
+"""
+from __future__ import absolute_import
+
+import atexit
+import copy
+import errno
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from django.utils.six.moves import http_client
+from selenium.webdriver.remote.command import Command
+
+from sbo_selenium.conf import settings
+
+logger = logging.getLogger('sbo_selenium')
+
+# Browsers which can be launched with a profile directory
+SUPPORTED_BROWSERS = frozenset(['chrome', 'fake', 'firefox'])
+
+# Seconds to wait for the warm-up Firefox to exit before killing it
+FIREFOX_EXIT_TIMEOUT = 10
+
+# Templates built so far in this process, by browser and launch profile name
+_templates = {}
+# Events set when the templates being built finish, by the same keys
+_building = {}
+_templates_lock = threading.Lock()
+
+
+def enabled(browser):
+    return bool(settings.SELENIUM_PROFILE_TEMPLATE_URLS) and \
+        browser in SUPPORTED_BROWSERS
+
+
+def make_dir(prefix):
+    parent = settings.SELENIUM_PROFILE_TEMPLATE_DIR or None
+    if parent and not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    return tempfile.mkdtemp(prefix=prefix, dir=parent)
+
+
+def remove(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def clone(template):
+    """ Make a new copy of a profile template, returning its path """
+    path = make_dir('sbo-profile-')
+    try:
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(['cp', '-a', '--reflink=auto',
+                                   os.path.join(template, '.'), path],
+                                  stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        # No GNU cp
+        remove(path)
+        shutil.copytree(template, path, symlinks=True)
+    return path
+
+
+def quit_firefox(driver):
+    """ Shut down a Firefox driver like its quit() does, but wait for the
+    browser to exit on its own and leave its profile directory in place """
+    try:
+        driver.execute(Command.QUIT)
+    except (http_client.BadStatusLine, socket.error):
+        # Firefox can exit before the response has been read
+        pass
+    process = driver.binary.process
+    deadline = time.time() + FIREFOX_EXIT_TIMEOUT
+    while process is not None and process.poll() is None and \
+            time.time() < deadline:
+        time.sleep(0.1)
+    driver.binary.kill()
+
+
+def build(browser, test, profile, factory, proxy=None):
+    """ Create a profile template by visiting the warm-up URLs with a new
+    browser, returning its path """
+    path = make_dir('sbo-profile-template-')
+    atexit.register(remove, path)
+    warm_profile = copy.copy(profile)
+    warm_profile.user_data_dir = path
+    driver = factory(test, warm_profile, proxy)
+    firefox_profile = getattr(driver, 'firefox_profile', None)
+    try:
+        for url in settings.SELENIUM_PROFILE_TEMPLATE_URLS:
+            driver.get('%s%s' % (test.live_server_url, url))
+    finally:
+        if firefox_profile is None:
+            driver.quit()
+        else:
+            quit_firefox(driver)
+    if firefox_profile is not None:
+        # Firefox was run with a temporary copy of the (empty) template
+        try:
+            remove(path)
+            shutil.copytree(firefox_profile.path, path, symlinks=True,
+                            ignore=shutil.ignore_patterns('*.lock', 'lock'))
+        finally:
+            remove(firefox_profile.path)
+            if firefox_profile.tempfolder is not None:
+                remove(firefox_profile.tempfolder)
+    logger.info('Built the %s profile template in %s', browser, path)
+    return path
+
+
+def get_template(browser, test, profile, factory, proxy=None):
+    """ Get the path of the profile template for the given browser and
+    launch profile, building it first if necessary.  Templates for other
+    browsers and launch profiles can be built at the same time, but only
+    one thread builds each of them; any others wait for it. """
+    key = (browser, profile.name)
+    while True:
+        with _templates_lock:
+            if key in _templates:
+                return _templates[key]
+            building = _building.get(key)
+            if building is None:
+                building = _building[key] = threading.Event()
+                break
+        # If that build fails, try again in this thread
+        building.wait()
+    try:
+        path = build(browser, test, profile, factory, proxy)
+        with _templates_lock:
+            _templates[key] = path
+        return path
+    finally:
+        with _templates_lock:
+            del _building[key]
+        building.set()
+
+
+def prepare(browser, test, profile, factory, proxy=None):
+    """ Get a copy of the given launch profile which uses a new copy of the
+    profile template, and the path of that copy (None if the browser makes
+    its own copy, as Firefox does) """
+    template = get_template(browser, test, profile, factory, proxy)
+    profile = copy.copy(profile)
+    if browser == 'firefox':
+        profile.user_data_dir = template
+        return profile, None
+    profile.user_data_dir = clone(template)
+    return profile, profile.user_data_dir
+
+
+def remove_after_quit(driver, path):
+    """ Delete a profile copy when the driver using it is shut down """
+    quit = driver.quit
+
+    def quit_and_remove():
+        try:
+            quit()
+        finally:
+            remove(path)
+
+    driver.quit = quit_and_remove
@@ -0,0 +1,354 @@
+"""
+A local HTTP proxy for the browsers under test, so pages don't depend on
+(slow, flaky, or unreachable) third-party hosts.  Requests for resources on
+the hosts in ``SELENIUM_PROXY_CACHE_HOSTS`` are answered from files in
+``SELENIUM_PROXY_CACHE_DIR`` (laid out as ``<host>/<path>``), which are
+fetched and saved on first use if ``SELENIUM_PROXY_FETCH`` is True.  Requests
+to the live test server pass straight through, and everything else gets a
+canned empty response of a suitable type.
+
+HTTPS requests can't be inspected without intercepting TLS, so CONNECT
+requests are refused (and the browser gives up on them immediately), unless
+the host is in ``SELENIUM_PROXY_TUNNEL_HOSTS``; requests to those are passed
+through to the real host unchanged.
+"""
+from __future__ import absolute_import
+
+import atexit
+from collections import Counter
+import hashlib
+import logging
+import mimetypes
+import os
+import select
+import shutil
+import socket
+import tempfile
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.six.moves import BaseHTTPServer, http_client, socketserver
+from django.utils.six.moves.urllib.parse import urlsplit
+
+from sbo_selenium.conf import settings
+
+logger = logging.getLogger('sbo_selenium')
+
+# A transparent 1x1 GIF, for stubbed image requests
+BLANK_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00!'
+             b'\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+             b'\x00\x02\x02D\x01\x00;')
+
+# Content type and body of the canned responses for stubbed requests, by
+# file extension; anything else gets a "204 No Content" response
+STUB_RESPONSES = {
+    '.css': ('text/css', b''),
+    '.gif': ('image/gif', BLANK_GIF),
+    '.html': ('text/html', b'<html><body></body></html>'),
+    '.ico': ('image/gif', BLANK_GIF),
+    '.jpeg': ('image/gif', BLANK_GIF),
+    '.jpg': ('image/gif', BLANK_GIF),
+    '.js': ('application/javascript', b''),
+    '.json': ('application/json', b'{}'),
+    '.png': ('image/gif', BLANK_GIF),
+    '.svg': ('image/gif', BLANK_GIF),
+}
+
+# Headers which only apply to a single connection, and so aren't forwarded
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'proxy-connection', 'te', 'trailers', 'transfer-encoding', 'upgrade'])
+
+LOOPBACK_HOSTS = frozenset(['localhost', '127.0.0.1', '::1'])
+
+
+def host_matches(host, patterns):
+    """ Determine if a host name matches any of the given patterns (either a
+    host name, or a domain name starting with "." which also matches all of
+    its subdomains) """
+    for pattern in patterns:
+        if host == pattern:
+            return True
+        if pattern.startswith('.') and (host.endswith(pattern) or
+                                        host == pattern[1:]):
+            return True
+    return False
+
+
+def tunnel(client, upstream, timeout):
+    """ Relay data in both directions between two sockets until either one
+    closes its connection, or neither sends anything for ``timeout``
+    seconds """
+    sockets = [client, upstream]
+    while True:
+        readable, _, errored = select.select(sockets, [], sockets, timeout)
+        if errored or not readable:
+            return
+        for source in readable:
+            destination = upstream if source is client else client
+            try:
+                data = source.recv(65536)
+                if not data:
+                    return
+                destination.sendall(data)
+            except socket.error:
+                return
+
+
+def cache_path(cache_dir, host, path, query):
+    """ The file in which to cache the resource at the given URL """
+    parts = [part for part in path.split('/') if part not in ('', '.', '..')]
+    if not parts or path.endswith('/'):
+        parts.append('index.html')
+    if query:
+        digest = hashlib.md5(query.encode('utf-8')).hexdigest()[:10]
+        root, ext = os.path.splitext(parts[-1])
+        parts[-1] = '%s_%s%s' % (root, digest, ext)
+    return os.path.join(cache_dir, host, *parts)
+
+
+class ProxyRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles a single request from a browser to the proxy.
+    """
+
+    def do_CONNECT(self):
+        host, _, port = self.path.rpartition(':')
+        host = host.strip('[]')
+        if not host_matches(host, self.server.proxy.tunnel_hosts):
+            self.server.count('refused')
+            self.send_error(403, 'HTTPS requests are not supported')
+            return
+        timeout = self.server.proxy.timeout
+        try:
+            upstream = socket.create_connection((host, int(port)),
+                                                timeout=timeout)
+        except (socket.error, ValueError) as e:
+            self.send_error(502, str(e))
+            return
+        self.server.count('tunneled')
+        try:
+            self.send_response(200, 'Connection established')
+            self.end_headers()
+            tunnel(self.connection, upstream, timeout)
+        finally:
+            upstream.close()
+        self.close_connection = 1
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        host = url.hostname or ''
+        proxy = self.server.proxy
+        if self.command in ('GET', 'HEAD') and \
+                host_matches(host, proxy.cache_hosts):
+            self.from_cache(url)
+        elif host in LOOPBACK_HOSTS or host in proxy.direct_hosts:
+            self.server.count('direct')
+            self.forward(url)
+        else:
+            self.stub(url)
+
+    do_DELETE = do_GET
+    do_HEAD = do_GET
+    do_OPTIONS = do_GET
+    do_POST = do_GET
+    do_PUT = do_GET
+
+    def fetch(self, url, method=None, body=None):
+        """ Get the response to a request for the given URL from its host,
+        as a (status, headers, body) tuple """
+        connection = http_client.HTTPConnection(url.hostname, url.port or 80,
+                                                timeout=self.server.proxy.timeout)
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        headers = dict((name, value) for name, value in self.headers.items()
+                       if name.lower() not in HOP_BY_HOP_HEADERS)
+        try:
+            connection.request(method or self.command, path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+            return response.status, response.getheaders(), content
+        finally:
+            connection.close()
+
+    def forward(self, url):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        try:
+            status, headers, content = self.fetch(url, body=body)
+        except (socket.error, http_client.HTTPException) as e:
+            self.send_error(502, str(e))
+            return
+        self.respond(status, headers, content)
+
+    def from_cache(self, url):
+        proxy = self.server.proxy
+        path = cache_path(proxy.cache_dir, url.hostname, url.path, url.query)
+        if not os.path.isfile(path):
+            if not proxy.fetch_missing or not self.save(url, path):
+                self.server.count('missed')
+                self.stub(url)
+                return
+        self.server.count('cached')
+        with open(path, 'rb') as f:
+            content = f.read()
+        content_type = mimetypes.guess_type(url.path)[0] or \
+            'application/octet-stream'
+        self.respond(200, [('Content-Type', content_type)], content)
+
+    def save(self, url, path):
+        """ Fetch a resource and store it in the cache, returning True if
+        successful """
+        try:
+            status, _headers, content = self.fetch(url, method='GET')
+        except (socket.error, http_client.HTTPException) as e:
+            logger.warning('Could not fetch %s for the proxy cache: %s',
+                           url.geturl(), e)
+            return False
+        if status != 200:
+            logger.warning('Could not fetch %s for the proxy cache: got a '
+                           '%d response', url.geturl(), status)
+            return False
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created by another thread in the meantime
+                pass
+        # Write to a temporary file first so other threads never read a
+        # partial one
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        shutil.move(temp_path, path)
+        self.server.count('fetched')
+        return True
+
+    def stub(self, url):
+        self.server.count('stubbed')
+        ext = os.path.splitext(url.path)[1].lower()
+        if ext in STUB_RESPONSES:
+            content_type, content = STUB_RESPONSES[ext]
+            self.respond(200, [('Content-Type', content_type)], content)
+        else:
+            self.respond(204, [], b'')
+
+    def respond(self, status, headers, content):
+        self.send_response(status)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS and \
+                    name.lower() != 'content-length':
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger.debug('Proxy: %s', format % args)
+
+
+class ProxyServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    def count(self, kind):
+        with self.stats_lock:
+            self.stats[kind] += 1
+
+
+class CachingProxy(object):
+    """
+    A proxy server running in a background thread.  ``cache_hosts`` are the
+    host name patterns (see ``host_matches()``) to serve from files in
+    ``cache_dir``; if ``fetch_missing`` is True, files not in the cache yet
+    are fetched from the original host and saved there.  Requests to
+    ``direct_hosts`` or the local machine are passed through unchanged, as
+    are HTTPS requests to ``tunnel_hosts`` (more host name patterns).
+    """
+
+    def __init__(self, cache_dir, cache_hosts, fetch_missing=True,
+                 direct_hosts=(), host='127.0.0.1', timeout=10,
+                 tunnel_hosts=()):
+        self.cache_dir = cache_dir
+        self.cache_hosts = list(cache_hosts)
+        self.tunnel_hosts = list(tunnel_hosts)
+        self.fetch_missing = fetch_missing
+        self.direct_hosts = frozenset(direct_hosts)
+        self.timeout = timeout
+        self.server = ProxyServer((host, 0), ProxyRequestHandler)
+        self.server.proxy = self
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def address(self):
+        """The proxy's "host:port" address"""
+        host, port = self.server.server_address[:2]
+        return '%s:%d' % (host, port)
+
+    @property
+    def stats(self):
+        """Counts of the requests which were answered from the cache
+        ("cached"), fetched for it ("fetched"), not found in it ("missed"),
+        stubbed, passed through ("direct"), tunnelled to HTTPS hosts
+        ("tunneled"), or refused"""
+        return self.server.stats
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def live_server_host():
+    address = os.environ.get('DJANGO_LIVE_TEST_SERVER_ADDRESS',
+                             settings.DJANGO_LIVE_TEST_SERVER_ADDRESS)
+    return address.split(':')[0]
+
+
+def get_proxy_address():
+    """ Get the address of the proxy for browsers to use, starting it if
+    necessary, or None if the SELENIUM_PROXY setting is False """
+    global _proxy
+    if not settings.SELENIUM_PROXY:
+        return None
+    with _proxy_lock:
+        if _proxy is None:
+            if settings.SELENIUM_PROXY_CACHE_HOSTS and \
+                    not settings.SELENIUM_PROXY_CACHE_DIR:
+                msg = 'SELENIUM_PROXY_CACHE_DIR must be set to cache the ' \
+                      'resources of SELENIUM_PROXY_CACHE_HOSTS'
+                raise ImproperlyConfigured(msg)
+            host = live_server_host()
+            _proxy = CachingProxy(settings.SELENIUM_PROXY_CACHE_DIR,
+                                  settings.SELENIUM_PROXY_CACHE_HOSTS,
+                                  settings.SELENIUM_PROXY_FETCH,
+                                  direct_hosts=[host], host=host,
+                                  tunnel_hosts=settings.SELENIUM_PROXY_TUNNEL_HOSTS)
+        return _proxy.address
+
+
+@atexit.register
+def stop_proxy():
+    """Shut down the proxy, if it's running"""
+    global _proxy
+    with _proxy_lock:
+        proxy, _proxy = _proxy, None
+    if proxy is not None:
+        logger.info('Proxy requests: %s', ', '.join(
+            '%d %s' % (count, kind) for kind, count in sorted(proxy.stats.items())))
+        proxy.stop()
@@ -0,0 +1,197 @@
+"""
+Streaming output of Selenium test results, written as soon as each test
+finishes so CI dashboards can show progress while the run continues.  Each
+result is appended as one line of JSON to the ``SELENIUM_RESULTS_JSON`` file
+(which accumulates the results of every run, for timing history).  Writes are
+locked and appends are single system calls, so any number of test worker
+processes can share the same file.  The ``SELENIUM_JUNIT_XML`` report of the
+current run is written from it once the run is over.
+"""
+from __future__ import absolute_import
+
+import atexit
+import fcntl
+import json
+import os
+import socket
+import time
+import traceback
+import uuid
+from xml.etree import ElementTree
+
+from sbo_selenium.conf import settings
+
+# Identifies the results of this process's test run if it wasn't started by
+# the selenium command (which shares one with its workers via SELENIUM_RUN_ID)
+_run_id = uuid.uuid4().hex
+
+# Whether this process will write the JUnit report when it exits
+_report_at_exit = []
+
+
+def json_path():
+    """ The file to append results to (defaulting to one next to the JUnit
+    XML report if only that was requested), or '' if results aren't being
+    recorded """
+    path = os.getenv('SELENIUM_RESULTS_JSON', settings.SELENIUM_RESULTS_JSON)
+    if not path and junit_path():
+        path = junit_path() + '.jsonl'
+    return path
+
+
+def junit_path():
+    return os.getenv('SELENIUM_JUNIT_XML', settings.SELENIUM_JUNIT_XML)
+
+
+def enabled():
+    return bool(json_path())
+
+
+def run_id():
+    """ A unique ID for the current test run, so its results can be told
+    apart from those of earlier runs (process IDs are often the same on every
+    run in a container) """
+    return os.environ.get('SELENIUM_RUN_ID', _run_id)
+
+
+def test_record(test, attempt_result, duration, attempt=1, final=True):
+    """ Describe the outcome of one attempt at running a SeleniumTestCase
+    test, given the AttemptResult it was run with """
+    test_id = test.id()
+    record = {
+        'id': test_id,
+        'classname': test_id.rsplit('.', 1)[0],
+        'name': test._testMethodName,
+        'outcome': attempt_result.outcome,
+        'duration': round(duration, 3),
+        'browser': getattr(test, 'browser', None) or os.getenv(
+            'SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER),
+        'sauce_session_id': None,
+        'screenshots': list(getattr(test, 'screenshots', [])),
+        'console': list(getattr(test, 'console_log', [])),
+        'attempt': attempt,
+        'final': final,
+        'run': run_id(),
+        'pid': os.getpid(),
+        'host': socket.gethostname(),
+        'finished': time.time(),
+    }
+    if hasattr(test, 'sauce_user_name') and hasattr(test, 'sel'):
+        record['sauce_session_id'] = test.sel.session_id
+    exc_info = attempt_result.exc_info
+    if attempt_result.outcome == 'skip':
+        record['message'] = attempt_result.reason
+    elif exc_info is not None:
+        record['error_type'] = exc_info[0].__name__
+        record['message'] = '%s' % exc_info[1]
+        record['traceback'] = ''.join(traceback.format_exception(*exc_info))
+    return record
+
+
+def write(record):
+    """ Append a test result to the results file """
+    path = json_path()
+    line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            os.write(fd, line)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+    if junit_path() and 'SELENIUM_RUN_ID' not in os.environ and \
+            not _report_at_exit:
+        # Not run by the selenium command, which writes the report itself
+        _report_at_exit.append(True)
+        atexit.register(write_report)
+
+
+def size():
+    """ The current size of the results file, so the results of a run which
+    is about to start can be read without the ones before it """
+    path = json_path()
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return 0
+
+
+def read(path, offset=0):
+    """ Get all the test results recorded in a results file (after the
+    given byte offset, if any) """
+    records = []
+    with open(path) as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Truncated by a worker which was killed mid-write
+                continue
+    return records
+
+
+def write_report(offset=0):
+    """ Write the JUnit XML report of the current run's results (those in
+    the results file after the given offset), if one was requested """
+    path = junit_path()
+    if not path or not os.path.exists(json_path()):
+        return
+    write_junit(read(json_path(), offset), path, run_id())
+
+
+def junit_xml(records):
+    """ Generate a JUnit XML report of the given test results, leaving out
+    attempts which were superseded by a retry """
+    records = [record for record in records if record.get('final', True)]
+    suite = ElementTree.Element('testsuite', name='selenium')
+    counts = {'failures': 0, 'errors': 0, 'skipped': 0}
+    for record in records:
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': record['classname'],
+            'name': record['name'],
+            'time': '%.3f' % record['duration'],
+        })
+        outcome = record['outcome']
+        if outcome in ('failure', 'error'):
+            counts['%ss' % outcome] += 1
+            element = ElementTree.SubElement(case, outcome, {
+                'type': record.get('error_type', ''),
+                'message': record.get('message', ''),
+            })
+            element.text = record.get('traceback', '')
+        elif outcome == 'unexpected success':
+            counts['failures'] += 1
+            ElementTree.SubElement(case, 'failure',
+                                   message='Unexpected success')
+        elif outcome == 'skip':
+            counts['skipped'] += 1
+            ElementTree.SubElement(case, 'skipped',
+                                   message=record.get('message') or '')
+        output = ['Browser: %s' % record['browser']]
+        if record.get('sauce_session_id'):
+            output.append('SauceOnDemandSessionID=%s job-name=%s' % (
+                record['sauce_session_id'], record['id']))
+        output.extend('Console: %s %s' % (entry.get('level', ''),
+                                          entry.get('message', ''))
+                      for entry in record.get('console', []))
+        output.extend('[[ATTACHMENT|%s]]' % path
+                      for path in record.get('screenshots', []))
+        ElementTree.SubElement(case, 'system-out').text = '\n'.join(output)
+    suite.set('tests', str(len(records)))
+    for name, count in counts.items():
+        suite.set(name, str(count))
+    suite.set('time', '%.3f' % sum(record['duration'] for record in records))
+    return ElementTree.tostring(suite, encoding='utf-8')
+
+
+def write_junit(records, path, run):
+    """ Atomically replace the JUnit XML report with one for the given test
+    run's results """
+    content = junit_xml([record for record in records
+                         if record.get('run') == run])
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.rename(temp_path, path)
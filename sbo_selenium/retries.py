@@ -0,0 +1,125 @@
+"""
+Support for immediately re-running Selenium tests which fail, and statistics
+on how often each test failed before passing (or didn't pass at all).
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+import traceback
+import unittest
+
+logger = logging.getLogger('sbo_selenium')
+
+
+class AttemptResult(unittest.TestResult):
+    """
+    Records the outcome of an attempt to run a test which may be retried, so
+    it can be passed on to the real test result later if it's the one that
+    counts.  If a ``result`` is given, everything is also passed on to it
+    immediately (for the last attempt, which counts regardless).
+    """
+
+    def __init__(self, result=None):
+        super(AttemptResult, self).__init__()
+        self.result = result
+        self.outcome = 'pass'
+        self.exc_info = None
+        self.reason = None
+
+    def _forward(self, name, *args):
+        if self.result is not None:
+            getattr(self.result, name)(*args)
+
+    def startTest(self, test):
+        super(AttemptResult, self).startTest(test)
+        self._forward('startTest', test)
+
+    def stopTest(self, test):
+        super(AttemptResult, self).stopTest(test)
+        self._forward('stopTest', test)
+
+    def addSuccess(self, test):
+        super(AttemptResult, self).addSuccess(test)
+        self._forward('addSuccess', test)
+
+    def addError(self, test, err):
+        super(AttemptResult, self).addError(test, err)
+        self.outcome, self.exc_info = 'error', err
+        self._forward('addError', test, err)
+
+    def addFailure(self, test, err):
+        super(AttemptResult, self).addFailure(test, err)
+        self.outcome, self.exc_info = 'failure', err
+        self._forward('addFailure', test, err)
+
+    def addSkip(self, test, reason):
+        super(AttemptResult, self).addSkip(test, reason)
+        self.outcome, self.reason = 'skip', reason
+        self._forward('addSkip', test, reason)
+
+    def addExpectedFailure(self, test, err):
+        super(AttemptResult, self).addExpectedFailure(test, err)
+        self.outcome, self.exc_info = 'expected failure', err
+        self._forward('addExpectedFailure', test, err)
+
+    def addUnexpectedSuccess(self, test):
+        super(AttemptResult, self).addUnexpectedSuccess(test)
+        self.outcome = 'unexpected success'
+        self._forward('addUnexpectedSuccess', test)
+
+    @property
+    def failed(self):
+        return self.outcome in ('error', 'failure', 'unexpected success')
+
+    def replay(self, test, result):
+        """Report this attempt's outcome to the given test result"""
+        result.startTest(test)
+        if self.outcome == 'skip':
+            result.addSkip(test, self.reason)
+        elif self.outcome == 'expected failure':
+            result.addExpectedFailure(test, self.exc_info)
+        else:
+            result.addSuccess(test)
+        result.stopTest(test)
+
+
+# Outcomes of every attempt at each test which has been retried, by test ID
+_attempts = {}
+_attempts_lock = threading.Lock()
+
+
+def record(test_id, attempt, outcome, exc_info=None):
+    """Note the outcome of an attempt at running a test"""
+    with _attempts_lock:
+        _attempts.setdefault(test_id, []).append(outcome)
+    if exc_info is not None:
+        logger.warning('Attempt %d of %s failed, retrying:\n%s', attempt,
+                       test_id, ''.join(traceback.format_exception(*exc_info)))
+
+
+def attempts():
+    """Get the outcomes of the attempts at each retried test so far"""
+    with _attempts_lock:
+        return dict((test_id, list(outcomes))
+                    for test_id, outcomes in _attempts.items())
+
+
+def clear():
+    with _attempts_lock:
+        _attempts.clear()
+
+
+def report():
+    """Describe the failure rate of each test which failed at least once,
+    one per line"""
+    lines = []
+    for test_id, outcomes in sorted(attempts().items()):
+        failures = len([outcome for outcome in outcomes if outcome != 'pass'])
+        if not failures:
+            continue
+        verdict = 'flaky' if outcomes[-1] == 'pass' else 'failed'
+        lines.append('%s: %d of %d attempts failed (%.0f%%), %s' % (
+            test_id, failures, len(outcomes),
+            100.0 * failures / len(outcomes), verdict))
+    return lines
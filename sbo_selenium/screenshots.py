@@ -0,0 +1,220 @@
+"""
+Compact screenshot encoding and element-scoped captures.
+
+Full-window PNGs quickly dominate the size of a test run's artifacts.  If
+Pillow is installed, screenshots can instead be downscaled
+(``SELENIUM_SCREENSHOT_SCALE``), converted to grayscale
+(``SELENIUM_SCREENSHOT_GRAYSCALE``), saved as JPEG or WebP
+(``SELENIUM_SCREENSHOT_FORMAT`` and ``SELENIUM_SCREENSHOT_QUALITY``), and
+cropped to a single element.  The test thread only fetches the browser's PNG;
+decoding and re-encoding it happens in a background thread, which is flushed
+at the end of each test class and when the process exits.
+
+Without Pillow (install ``sbo-selenium[screenshots]`` to get it), every
+screenshot is saved as the browser's full-window PNG.
+"""
+from __future__ import absolute_import
+
+import atexit
+import io
+import logging
+import threading
+
+from django.utils.six.moves import queue
+from selenium.common.exceptions import WebDriverException
+
+from sbo_selenium.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger('sbo_selenium')
+
+# File extension and Pillow format name for each SELENIUM_SCREENSHOT_FORMAT
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+PIL_FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+# CSS pixels of surrounding context to include in element screenshots
+ELEMENT_MARGIN = 10
+
+# Maximum number of screenshots waiting to be encoded before the test thread
+# waits for the encoder to catch up
+QUEUE_SIZE = 20
+
+ELEMENT_BOX_SCRIPT = """
+var rect = arguments[0].getBoundingClientRect();
+return [rect.left, rect.top, rect.width, rect.height,
+        window.pageXOffset, window.pageYOffset,
+        window.innerWidth, window.innerHeight, window.devicePixelRatio || 1];
+"""
+
+_warned = []
+
+
+def encoding():
+    """ The (format, quality, scale, grayscale) screenshots are saved with """
+    config = settings.snapshot
+    return (config.SELENIUM_SCREENSHOT_FORMAT,
+            config.SELENIUM_SCREENSHOT_QUALITY,
+            config.SELENIUM_SCREENSHOT_SCALE,
+            config.SELENIUM_SCREENSHOT_GRAYSCALE)
+
+
+def is_plain(options):
+    image_format, _quality, scale, grayscale = options
+    return image_format == 'png' and scale == 1 and not grayscale
+
+
+def extension():
+    """ The file extension of screenshots taken with the current settings """
+    if Image is None:
+        return 'png'
+    return EXTENSIONS[settings.SELENIUM_SCREENSHOT_FORMAT]
+
+
+def element_box(driver, element):
+    """ Get the element's bounding box and the window's scroll position,
+    viewport size, and device pixel ratio, in one command """
+    try:
+        return driver.execute_script(ELEMENT_BOX_SCRIPT, element)
+    except WebDriverException:
+        return None
+
+
+def crop_box(image_size, box):
+    """ The region of a screenshot of the given (width, height) in device
+    pixels that shows the element described by ``box`` (see element_box())
+    and a small margin around it, or None if the element isn't in it """
+    left, top, width, height, scroll_x, scroll_y, _view_width, view_height, \
+        ratio = box
+    if width <= 0 or height <= 0:
+        return None
+    # Some browsers screenshot the whole page rather than just the viewport
+    if image_size[1] > (view_height + 1) * ratio:
+        left += scroll_x
+        top += scroll_y
+    region = (max(0, int((left - ELEMENT_MARGIN) * ratio)),
+              max(0, int((top - ELEMENT_MARGIN) * ratio)),
+              min(image_size[0], int((left + width + ELEMENT_MARGIN) * ratio + 0.5)),
+              min(image_size[1], int((top + height + ELEMENT_MARGIN) * ratio + 0.5)))
+    if region[0] >= region[2] or region[1] >= region[3]:
+        return None
+    return region
+
+
+def encode(png, path, options, box=None):
+    """ Save a PNG screenshot to the given path with the given encoding
+    options (see encoding()), cropped to the element ``box`` if given """
+    image_format, quality, scale, grayscale = options
+    image = Image.open(io.BytesIO(png))
+    region = crop_box(image.size, box) if box else None
+    if region:
+        image = image.crop(region)
+    if scale != 1:
+        size = (max(1, int(image.size[0] * scale)),
+                max(1, int(image.size[1] * scale)))
+        image = image.resize(size, Image.BILINEAR)
+    if grayscale:
+        image = image.convert('L')
+    elif image_format == 'jpeg' or image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGB')
+    kwargs = {}
+    if image_format == 'png':
+        kwargs['optimize'] = True
+    else:
+        kwargs['quality'] = quality
+    image.save(path, PIL_FORMATS[image_format], **kwargs)
+
+
+class Encoder(object):
+    """
+    Background thread which encodes and saves the screenshots queued by the
+    tests.
+    """
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def put(self, png, path, options, box=None):
+        self.queue.put((png, path, options, box))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                encode(*item)
+            except Exception:
+                logger.warning('Unable to save screenshot %s', item[1],
+                               exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until all the queued screenshots have been saved"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def stop(self):
+        """Save any remaining screenshots and stop the background thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+
+encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """ The background encoder, started on first use; tests running
+    concurrently in several threads share a single one """
+    global encoder
+    with _encoder_lock:
+        if encoder is None:
+            encoder = Encoder(QUEUE_SIZE)
+            encoder.start()
+            atexit.register(encoder.stop)
+        return encoder
+
+
+def save(driver, path, element=None):
+    """ Save a screenshot from the driver to the given path, encoded as
+    configured and cropped to the element if one is given.  Unless it's a
+    plain full-window PNG, the file is written by a background thread; call
+    flush() to wait for it. """
+    options = encoding()
+    if Image is None:
+        if not (is_plain(options) and element is None) and not _warned:
+            _warned.append(True)
+            logger.warning('Pillow is not installed, so screenshots are saved '
+                           'as full-window PNGs')
+        driver.get_screenshot_as_file(path)
+        return
+    box = element_box(driver, element) if element is not None else None
+    if is_plain(options) and box is None:
+        driver.get_screenshot_as_file(path)
+        return
+    get_encoder().put(driver.get_screenshot_as_png(), path, options, box)
+
+
+def flush():
+    """ Wait until all the screenshots taken so far have been saved """
+    if encoder is not None:
+        encoder.flush()
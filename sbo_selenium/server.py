@@ -0,0 +1,410 @@
+"""
+Adjustments to the live test server used by Django's LiveServerTestCase, so
+that its request log and errors end up in the configured logging rather than
+cluttering the test output.
+
+Logging happens off the request path: the server thread just adds a record to
+a bounded queue, and a background thread passes the records on to the
+"django.request" logger.  Each request's record includes the method, path,
+status, response size, duration, and ID of the test being run at the time.
+
+The most recent requests made during each test are also kept in memory, so
+the test can report a waterfall of what the browser asked for and how long
+the server took to answer.  Optionally, the database queries made while
+handling each request are counted and timed, and slow requests are profiled.
+"""
+from __future__ import absolute_import
+
+import atexit
+from collections import deque
+import cProfile
+import io
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.utils.six.moves import queue
+
+from sbo_selenium import memory
+from sbo_selenium.conf import settings
+
+logger = logging.getLogger('django.request')
+
+# ID of the test currently being run, for association with server requests
+current_test_id = None
+
+# Requests made since the current test started, and when it started
+timeline = deque()
+timeline_start = time.time()
+_timeline_lock = threading.Lock()
+
+# Number of requests currently being handled
+active_requests = 0
+
+
+def set_current_test(test_id):
+    """Record the ID of the test now being run (or None between tests), and
+    start a new request timeline if a test is starting"""
+    global current_test_id, timeline, timeline_start
+    current_test_id = test_id
+    if test_id is not None:
+        with _timeline_lock:
+            timeline = deque(maxlen=settings.SELENIUM_REQUEST_TIMELINE_SIZE)
+            timeline_start = time.time()
+
+
+def get_timeline():
+    """Get the start time of the current request timeline and a list of the
+    requests in it"""
+    with _timeline_lock:
+        return timeline_start, list(timeline)
+
+
+def waterfall(records, start, count=10, width=40):
+    """ Describe the slowest of the given requests, one per line, with a bar
+    showing when each was being handled relative to the others """
+    if not records:
+        return 'No requests were made to the live server'
+    end = max(record.start + record.duration for record in records)
+    scale = width / max(end - start, 0.001)
+    slowest = sorted(records, key=lambda record: record.duration,
+                     reverse=True)[:count]
+    lines = ['Slowest %d of %d requests to the live server:' % (
+        len(slowest), len(records))]
+    for record in slowest:
+        offset = int(round((record.start - start) * scale))
+        length = max(int(round(record.duration * scale)), 1)
+        bar = (' ' * offset + '#' * length)[:width].ljust(width)
+        lines.append('%8.1f ms |%s| %8.1f ms %s %8s B x%d %s %s' % (
+            (record.start - start) * 1000, bar, record.duration * 1000,
+            record.status, record.size, record.concurrent, record.method,
+            record.path))
+    return '\n'.join(lines)
+
+
+class RequestRecord(object):
+    """Details of a request handled by the live server"""
+    __slots__ = ('method', 'path', 'status', 'size', 'start', 'duration',
+                 'concurrent', 'test_id', 'queries', 'query_time', 'profile')
+
+    def __init__(self, method, path, status, size, start, duration,
+                 concurrent, test_id, queries=None, query_time=None,
+                 profile=None):
+        self.method = method
+        self.path = path
+        self.status = status
+        self.size = size
+        self.start = start
+        self.duration = duration
+        self.concurrent = concurrent
+        self.test_id = test_id
+        self.queries = queries
+        self.query_time = query_time
+        self.profile = profile
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class LogQueue(object):
+    """
+    Bounded queue of log messages, written to the "django.request" logger by
+    a background thread.  If the queue is full, new messages are dropped (and
+    counted) rather than blocking the server.
+    """
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def put(self, level, msg, args=(), exc_info=None, extra=None):
+        try:
+            self.queue.put_nowait((level, msg, args, exc_info, extra))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                level, msg, args, exc_info, extra = item
+                logger.log(level, msg, *args, exc_info=exc_info, extra=extra)
+            except Exception:
+                pass
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until all the queued messages have been logged"""
+        if self._thread is not None:
+            self.queue.join()
+        if self.dropped:
+            logger.warning('%d live server log messages were dropped',
+                           self.dropped)
+            self.dropped = 0
+
+    def stop(self):
+        """Log any remaining messages and stop the background thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+        self.flush()
+
+
+log_queue = None
+
+
+def get_log_queue():
+    global log_queue
+    if log_queue is None:
+        log_queue = LogQueue(settings.SELENIUM_LOG_QUEUE_SIZE)
+        log_queue.start()
+        atexit.register(log_queue.stop)
+    return log_queue
+
+
+class LoggingStream(io.TextIOBase):
+    """
+    A stream that writes to the "django.request" logger (sending a new message
+    when each newline is encountered).
+    """
+    def __init__(self, *args, **kwargs):
+        self.pending = []
+        super(LoggingStream, self).__init__(*args, **kwargs)
+
+    def write(self, s):
+        lines = s.split('\n')
+        if len(lines) > 1:
+            log = get_log_queue()
+            self.pending.append(lines[0])
+            log.put(logging.ERROR, ''.join(self.pending))
+            for line in lines[1:-1]:
+                log.put(logging.ERROR, line)
+            self.pending = []
+        if lines[-1]:
+            self.pending.append(lines[-1])
+        return len(s)
+
+
+def replacement_get_stderr(self):
+    """ Replacement for QuietWSGIRequestHandler.get_stderr() to log errors to
+    file rather than cluttering the test output """
+    return LoggingStream()
+
+
+def replacement_handle(self):
+    """ Replacement for QuietWSGIRequestHandler.handle() which records the
+    request's details once it has been handled """
+    global active_requests
+    with _timeline_lock:
+        active_requests += 1
+        concurrent = active_requests
+    self.response_status = None
+    counter = QueryCounter() if settings.SELENIUM_COUNT_QUERIES else None
+    threshold = settings.SELENIUM_PROFILE_THRESHOLD
+    profiler = cProfile.Profile() if threshold else None
+    memory_before = memory.rss() if memory.started() else None
+    start = time.time()
+    try:
+        if counter:
+            counter.start()
+        if profiler:
+            profiler.enable()
+        try:
+            original_handle(self)
+        finally:
+            if profiler:
+                profiler.disable()
+            if counter:
+                counter.stop()
+    finally:
+        with _timeline_lock:
+            active_requests -= 1
+    if self.response_status is None:
+        # The request couldn't be parsed
+        return
+    duration = time.time() - start
+    if memory_before is not None:
+        memory.record_request(self.path, memory_before, memory.rss())
+    record = RequestRecord(self.command, self.path, self.response_status,
+                           self.response_size, start, duration, concurrent,
+                           current_test_id)
+    if counter:
+        record.queries = counter.count
+        record.query_time = counter.time
+    if profiler and duration >= threshold:
+        record.profile = save_profile(profiler, record)
+    with _timeline_lock:
+        timeline.append(record)
+    message = '%s %s %s %s bytes %.1f ms [%s]'
+    args = (record.method, record.path, record.status, record.size,
+            record.duration * 1000, record.test_id)
+    if counter:
+        message = '%s %s %s %s bytes %.1f ms, %d queries %.1f ms [%s]'
+        args = args[:-1] + (record.queries, record.query_time * 1000,
+                            record.test_id)
+    get_log_queue().put(logging.INFO, message, args, extra=record.as_dict())
+
+
+def replacement_log_request(self, code='-', size='-'):
+    """ Replacement for QuietWSGIRequestHandler.log_request() which notes the
+    response status and size for the request's record """
+    self.response_status = code
+    self.response_size = size
+
+
+class QueryCounter(object):
+    """
+    Counts and times the database queries made by the current thread between
+    calls to start() and stop().  Under LiveServerTestCase the server thread
+    may share its database connection with the test, so the cursors opened by
+    the counting thread are wrapped rather than changing the connection.
+    """
+
+    def start(self):
+        self.count = 0
+        self.time = 0.0
+        _install_cursor_hook()
+        _counting.counter = self
+
+    def stop(self):
+        _counting.counter = None
+
+    def add(self, seconds):
+        self.count += 1
+        self.time += seconds
+
+
+# The QueryCounter (if any) of each thread
+_counting = threading.local()
+_cursor_hook = []
+_cursor_hook_lock = threading.Lock()
+
+
+def _install_cursor_hook():
+    """ Make new database cursors count their queries if their thread has
+    a QueryCounter running """
+    with _cursor_hook_lock:
+        if _cursor_hook:
+            return
+        from django.db.backends import BaseDatabaseWrapper
+        original = BaseDatabaseWrapper.cursor
+
+        def cursor(self, *args, **kwargs):
+            result = original(self, *args, **kwargs)
+            counter = getattr(_counting, 'counter', None)
+            if counter is None:
+                return result
+            return CountingCursor(result, counter)
+
+        BaseDatabaseWrapper.cursor = cursor
+        _cursor_hook.append(original)
+
+
+class CountingCursor(object):
+    """
+    Wraps a database cursor to add the time taken by each query to a
+    QueryCounter.
+    """
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _timed(self, method, args, kwargs):
+        start = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.counter.add(time.time() - start)
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self.cursor.execute, args, kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self.cursor.executemany, args, kwargs)
+
+
+_profile_numbers = itertools.count(1)
+
+
+def save_profile(profiler, record):
+    """ Save the profiler statistics for a request to a .pstats file in the
+    screenshot directory, returning its path (or None if there's no
+    screenshot directory) """
+    directory = settings.SELENIUM_SCREENSHOT_DIR
+    if not directory:
+        return None
+    name = record.test_id.rsplit('.', 1)[-1] if record.test_id else 'request'
+    path = os.path.join(directory, '%s_request_%d.pstats' % (
+        name, next(_profile_numbers)))
+    profiler.dump_stats(path)
+    return path
+
+
+def replacement_log_message(self, format, *args):
+    """ Replacement for QuitWSGIRequestHandler.log_message() to log messages
+    rather than ignore them """
+    get_log_queue().put(logging.INFO, "[%s] %s",
+                        (self.log_date_time_string(), format % args))
+
+
+def replacement_handle_error(self, request, client_address):
+    """ Errors from the WSGI server itself tend to be harmless ones like
+    "[Errno 32] Broken pipe" (which happens when a browser cancels a request
+    before it finishes because it realizes it already has the asset).  By
+    default these get dumped to stderr where they get confused with the test
+    results, but aren't actually treated as test errors.  We'll just log them
+    instead.
+    """
+    msg = "Exception happened during processing of request from %s"
+    get_log_queue().put(logging.ERROR, msg, (client_address,),
+                        exc_info=sys.exc_info())
+
+
+original_handle = None
+
+
+def patch_live_server():
+    """ Install the replacement methods above in the live server classes.
+    Safe to call more than once. """
+    global original_handle
+    from django.test.testcases import QuietWSGIRequestHandler, \
+        StoppableWSGIServer
+    if original_handle is None:
+        original_handle = QuietWSGIRequestHandler.handle
+    QuietWSGIRequestHandler.handle = replacement_handle
+    QuietWSGIRequestHandler.get_stderr = replacement_get_stderr
+    QuietWSGIRequestHandler.log_request = replacement_log_request
+    QuietWSGIRequestHandler.log_message = replacement_log_message
+    StoppableWSGIServer.handle_error = replacement_handle_error
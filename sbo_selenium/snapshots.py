@@ -0,0 +1,213 @@
+"""
+Snapshots of the test database contents, so it can be reset between tests by
+copying the saved rows back rather than flushing every table and reloading
+the fixtures.  Supported for SQLite (the snapshots are tables in an attached
+temporary database) and PostgreSQL (the snapshots are tables in a separate
+schema of the test database; a template database would be faster to clone,
+but cloning one requires that nothing else is connected to it, which isn't
+the case while the live server is running).
+
+Snapshots are kept for the rest of the run, so test classes with the same
+fixtures can share them, and deleted just before the test database is
+destroyed.
+"""
+from __future__ import absolute_import
+
+import atexit
+import itertools
+import logging
+import os
+import tempfile
+
+from django.db import connections, transaction
+
+logger = logging.getLogger('sbo_selenium')
+
+_numbers = itertools.count(1)
+
+
+def quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+class Snapshot(object):
+    """
+    The contents of the Django tables in one database at a particular moment.
+    There's a subclass for each supported database vendor (see
+    SNAPSHOT_CLASSES), implementing ``save(connection)``, ``restore()``, and
+    ``delete()`` (which frees the space used by the snapshot).
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.number = next(_numbers)
+        connection = connections[alias]
+        self.tables = sorted(connection.introspection.django_table_names(
+            only_existing=True))
+        self.empty = set()
+        self.save(connection)
+
+
+class SQLiteSnapshot(Snapshot):
+    """
+    A snapshot stored as copies of the tables in a temporary database file
+    attached to the connection (re-attached when the connection is reopened).
+    """
+    schema = 'sbo_snapshots'
+    path = None
+
+    @classmethod
+    def attach(cls, cursor):
+        if cls.path is None:
+            fd, cls.path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            atexit.register(os.remove, cls.path)
+        cursor.execute('PRAGMA database_list')
+        if cls.schema not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ATTACH DATABASE %s AS %s' % (
+                "'%s'" % cls.path.replace("'", "''"), cls.schema))
+
+    def copy_name(self, connection, table):
+        return '%s.%s' % (self.schema, quote(connection, 's%d_%s' % (
+            self.number, table)))
+
+    def save(self, connection):
+        cursor = connection.cursor()
+        self.attach(cursor)
+        for table in self.tables:
+            cursor.execute('CREATE TABLE %s AS SELECT * FROM main.%s' % (
+                self.copy_name(connection, table), quote(connection, table)))
+            cursor.execute('SELECT COUNT(*) FROM main.%s' % quote(connection, table))
+            if cursor.fetchone()[0] == 0:
+                self.empty.add(table)
+
+    def restore(self):
+        connection = connections[self.alias]
+        # Can't attach a database in the middle of a transaction
+        self.attach(connection.cursor())
+        with transaction.atomic(using=self.alias):
+            cursor = connection.cursor()
+            for table in self.tables:
+                name = quote(connection, table)
+                cursor.execute('DELETE FROM main.%s' % name)
+                if table not in self.empty:
+                    cursor.execute('INSERT INTO main.%s SELECT * FROM %s' % (
+                        name, self.copy_name(connection, table)))
+
+    def delete(self):
+        connection = connections[self.alias]
+        cursor = connection.cursor()
+        self.attach(cursor)
+        for table in self.tables:
+            cursor.execute('DROP TABLE %s' % self.copy_name(connection, table))
+
+
+class PostgreSQLSnapshot(Snapshot):
+    """
+    A snapshot stored as copies of the tables (and the states of their
+    sequences) in a schema of the test database.
+    """
+
+    @property
+    def schema(self):
+        return 'sbo_snapshot_%d' % self.number
+
+    def save(self, connection):
+        cursor = connection.cursor()
+        cursor.execute('CREATE SCHEMA %s' % self.schema)
+        for table in self.tables:
+            name = quote(connection, table)
+            cursor.execute('CREATE TABLE %s.%s AS TABLE %s' % (
+                self.schema, name, name))
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM %s)' % name)
+            if not cursor.fetchone()[0]:
+                self.empty.add(table)
+        self.sequences = []
+        for sequence in connection.introspection.sequence_list():
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)',
+                           [sequence['table'], sequence['column'] or 'id'])
+            name = cursor.fetchone()[0]
+            if name:
+                cursor.execute('SELECT last_value, is_called FROM %s' % name)
+                self.sequences.append((name,) + tuple(cursor.fetchone()))
+
+    def restore(self):
+        connection = connections[self.alias]
+        with transaction.atomic(using=self.alias):
+            cursor = connection.cursor()
+            if self.tables:
+                cursor.execute('TRUNCATE %s' % ', '.join(
+                    quote(connection, table) for table in self.tables))
+            for table in self.tables:
+                if table not in self.empty:
+                    name = quote(connection, table)
+                    cursor.execute('INSERT INTO %s SELECT * FROM %s.%s' % (
+                        name, self.schema, name))
+            for name, last_value, is_called in self.sequences:
+                cursor.execute('SELECT setval(%s, %s, %s)',
+                               [name, last_value, is_called])
+
+    def delete(self):
+        cursor = connections[self.alias].cursor()
+        cursor.execute('DROP SCHEMA %s CASCADE' % self.schema)
+
+
+SNAPSHOT_CLASSES = {
+    'postgresql': PostgreSQLSnapshot,
+    'sqlite': SQLiteSnapshot,
+}
+
+
+def supported(alias):
+    """Determine if snapshots can be taken of the given database"""
+    return connections[alias].vendor in SNAPSHOT_CLASSES
+
+
+def take(alias):
+    """Take a snapshot of the current contents of the given database"""
+    return SNAPSHOT_CLASSES[connections[alias].vendor](alias)
+
+
+# Snapshots taken so far in this test run, by database alias and fixture list
+# (with None for the state of the database before loading any fixtures)
+_snapshots = {}
+
+
+def get(alias, fixtures):
+    return _snapshots.get((alias, fixtures))
+
+
+def save(alias, fixtures):
+    install_teardown_hook()
+    _snapshots[(alias, fixtures)] = snapshot = take(alias)
+    return snapshot
+
+
+def clear(alias=None):
+    """Delete all the snapshots taken so far (of just the given database, if
+    an alias is given)"""
+    keys = [key for key in _snapshots if alias is None or key[0] == alias]
+    snapshots = [_snapshots.pop(key) for key in keys]
+    for snapshot in snapshots:
+        snapshot.delete()
+
+
+def install_teardown_hook():
+    """ Make sure the snapshots of each database are deleted at the end of
+    the test run, before its test database is destroyed (and with it the
+    connection needed to delete them) """
+    from django.db.backends.creation import BaseDatabaseCreation
+    destroy = BaseDatabaseCreation.destroy_test_db
+    if getattr(destroy, 'deletes_snapshots', False):
+        return
+
+    def destroy_test_db(self, *args, **kwargs):
+        try:
+            clear(self.connection.alias)
+        except Exception:
+            logger.warning('Unable to delete the database snapshots',
+                           exc_info=True)
+        return destroy(self, *args, **kwargs)
+
+    destroy_test_db.deletes_snapshots = True
+    BaseDatabaseCreation.destroy_test_db = destroy_test_db
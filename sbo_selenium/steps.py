@@ -0,0 +1,50 @@
+"""
+Timing of the SeleniumTestCase helper methods (page loads, clicks, waits, and
+so forth).  Each call of a helper decorated with ``step`` which isn't nested
+inside a call of another one is reported to the functions registered with
+``add_listener()``, along with the test case and how long it took.
+"""
+from __future__ import absolute_import
+
+import functools
+import threading
+import time
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_local = threading.local()
+
+
+def add_listener(listener):
+    """ Call ``listener(test, step_name, seconds)`` after each step """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def step(method):
+    """ Decorator for SeleniumTestCase helper methods to be timed """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        if not _listeners or getattr(_local, 'active', False):
+            return method(self, *args, **kwargs)
+        _local.active = True
+        start = time.time()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            seconds = time.time() - start
+            _local.active = False
+            with _listeners_lock:
+                listeners = list(_listeners)
+            for listener in listeners:
+                listener(self, name, seconds)
+
+    return timed
@@ -1,34 +1,34 @@
 from __future__ import absolute_import
 
-import io
-import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from importlib import import_module
 import logging
 import os
 import re
 import socket
 import sys
+import threading
 import time
 
-from nose.tools import assert_raises
+from django.core.exceptions import ImproperlyConfigured
 from django.test import LiveServerTestCase
-from django.test.testcases import QuietWSGIRequestHandler, StoppableWSGIServer
 from django.utils import six
-import requests
-from selenium import webdriver
 from selenium.common.exceptions import NoSuchElementException, \
     StaleElementReferenceException, TimeoutException, WebDriverException
-from selenium.webdriver import Chrome, DesiredCapabilities, Firefox, PhantomJS
-from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
 from selenium.webdriver.support.color import Color
-from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support.select import Select
 from selenium.webdriver.support.wait import WebDriverWait
 
+from sbo_selenium import actions, baselines, console, drivers, load, \
+    memory, metrics, pool, results, retries, sauce, screenshots, snapshots, \
+    steps, watchdog
 from sbo_selenium.conf import settings
+from sbo_selenium.sauce import sauce_sessions  # noqa
+from sbo_selenium import server
+from sbo_selenium.server import patch_live_server
 
-logger = logging.getLogger('django.request')
-
-# Storage for Sauce Labs session IDs so they can be logged in bulk
-sauce_sessions = []
+logger = logging.getLogger('sbo_selenium')
 
 ADD_ACCESSIBILITY_SCRIPT = """
 var script = document.createElement('script');
@@ -98,53 +98,6 @@ SELECT_TEXT_SOURCE = """
 """
 
 
-class LoggingStream(io.TextIOBase):
-    """
-    A stream that writes to the "django.request" logger (sending a new message
-    when each newline is encountered).
-    """
-    def __init__(self, *args, **kwargs):
-        self.buffer = six.StringIO()
-        super(LoggingStream, self).__init__(*args, **kwargs)
-
-    def write(self, s):
-        parts = re.split("([^\n]+)", s)
-        for part in parts:
-            if part == "\n":
-                logger.error(self.buffer.getvalue())
-                self.buffer = six.StringIO()
-            elif part:
-                self.buffer.write(part)
-
-
-def replacement_get_stderr(self):
-    """ Replacement for QuietWSGIRequestHandler.get_stderr() to log errors to
-    file rather than cluttering the test output """
-    return LoggingStream()
-
-
-def replacement_log_message(self, format, *args):
-    """ Replacement for QuitWSGIRequestHandler.log_message() to log messages
-    rather than ignore them """
-    logger.info("[%s] %s", self.log_date_time_string(), format % args)
-
-
-def replacement_handle_error(self, request, client_address):
-    """ Errors from the WSGI server itself tend to be harmless ones like
-    "[Errno 32] Broken pipe" (which happens when a browser cancels a request
-    before it finishes because it realizes it already has the asset).  By
-    default these get dumped to stderr where they get confused with the test
-    results, but aren't actually treated as test errors.  We'll just log them
-    instead.
-    """
-    msg = "Exception happened during processing of request from %s"
-    logger.error(msg, client_address, exc_info=sys.exc_info())
-
-QuietWSGIRequestHandler.get_stderr = replacement_get_stderr
-QuietWSGIRequestHandler.log_message = replacement_log_message
-StoppableWSGIServer.handle_error = replacement_handle_error
-
-
 def lambda_click(element):
     """Click function for use in Wait lambdas to verify that the click succeeded"""
     if not element.is_displayed():
@@ -159,8 +112,9 @@ class Wait(WebDriverWait):
 
     def __init__(self, driver):
         """ Constructor """
-        super(Wait, self).__init__(driver, settings.SELENIUM_TIMEOUT,
-                                   settings.SELENIUM_POLL_FREQUENCY)
+        config = settings.snapshot
+        super(Wait, self).__init__(driver, config.SELENIUM_TIMEOUT,
+                                   config.SELENIUM_POLL_FREQUENCY)
 
     def until(self, method, message=''):
         """Calls the method provided with the driver as an argument until the \
@@ -177,6 +131,7 @@ class Wait(WebDriverWait):
                 pass
             except WebDriverException:
                 pass
+            baselines.count_poll()
             time.sleep(self._poll)
             if time.time() > end_time:
                 break
@@ -197,17 +152,75 @@ class Wait(WebDriverWait):
                 pass
             except WebDriverException:
                 pass
+            baselines.count_poll()
             time.sleep(self._poll)
             if time.time() > end_time:
                 break
         raise TimeoutException(message)
 
 
+class PooledLaunch(object):
+    """
+    Stands in for a test when a browser is launched in the background for
+    the driver pool, providing what the browser backends need from the test
+    class (so the pool doesn't keep the test that created it alive, or launch
+    every browser on its behalf).  ``get_firefox_profile()`` is called
+    without a real test instance, so overrides should only use class-level
+    state.
+    """
+
+    def __init__(self, test_class, live_server_url):
+        self.test_class = test_class
+        self.live_server_url = live_server_url
+
+    def __getattr__(self, name):
+        return getattr(self.test_class, name)
+
+    def get_firefox_profile(self):
+        method = six.get_unbound_function(self.test_class.get_firefox_profile)
+        return method(self)
+
+
 class SeleniumTestCase(LiveServerTestCase):
     """
     Base class for Selenium tests.  Allows tests to be written independently
     of which browser they're going to be run in.
     """
+    # Cheap live server URL to load (if no page from it is loaded yet) so
+    # that login() can set the session cookie
+    cookie_url = '/favicon.ico'
+    # Name of the browser started for every test, in self.drivers
+    main_driver = 'main'
+
+    @property
+    def sel(self):
+        """ The WebDriver used by the helper methods: the one selected by
+        using() in the current thread, or else the test's main browser """
+        driver = getattr(getattr(self, '_using', None), 'driver', None)
+        if driver is not None:
+            return driver
+        try:
+            return self._sel
+        except AttributeError:
+            raise AttributeError('sel')
+
+    @sel.setter
+    def sel(self, driver):
+        self._sel = driver
+
+    @property
+    def last_page_metrics(self):
+        """ The metrics collected for the last page the current browser (see
+        sel) loaded, if any; each browser has its own """
+        return self._page_metrics.get(self._driver_name())
+
+    @last_page_metrics.setter
+    def last_page_metrics(self, page_metrics):
+        self._page_metrics[self._driver_name()] = page_metrics
+
+    def _driver_name(self):
+        """ The name of the browser the helper methods use in this thread """
+        return getattr(self._using, 'name', None) or self.main_driver
 
     def get_firefox_profile(self):
         return None
@@ -234,65 +247,320 @@ class SeleniumTestCase(LiveServerTestCase):
 
     @classmethod
     def setUpClass(cls):
+        patch_live_server()
         # Create the screenshots directory if it doesn't exist yet
         screenshot_dir = settings.SELENIUM_SCREENSHOT_DIR
         if screenshot_dir and not os.path.exists(screenshot_dir):
             os.makedirs(screenshot_dir)
+        if load.target():
+            # Load testing another site, so there's no live server to start
+            super(LiveServerTestCase, cls).setUpClass()
+            return
         super(SeleniumTestCase, cls).setUpClass()
 
     @classmethod
     def tearDownClass(cls):
+        if load.target():
+            super(LiveServerTestCase, cls).tearDownClass()
+            return
         super(SeleniumTestCase, cls).tearDownClass()
+        server.get_log_queue().flush()
+        screenshots.flush()
+
+    @property
+    def live_server_url(self):
+        """ The URL of the live server, or of the target site if this is
+        being run as a load test scenario """
+        url = load.target()
+        if url:
+            return url.rstrip('/')
+        return super(SeleniumTestCase, self).live_server_url
+
+    def __call__(self, result=None):
+        """ Run the test, immediately re-running it with a new browser (and
+        a reset database) up to SELENIUM_RETRIES times if it fails.  Only the
+        last attempt's failure is reported to the test result, but the
+        outcome of every attempt is recorded in the retry statistics and the
+        streaming results file (if there is one).  The measurements of a
+        passing attempt are recorded for the performance baseline if that's
+        enabled.  Load test scenarios are just run once, without recording
+        any of this. """
+        if result is None or load.target():
+            return super(SeleniumTestCase, self).__call__(result)
+        count = int(os.getenv('SELENIUM_RETRIES', settings.SELENIUM_RETRIES))
+        record_results = results.enabled()
+        record_baseline = baselines.recording()
+        if not (count or record_results or record_baseline):
+            return super(SeleniumTestCase, self).__call__(result)
+        test_id = self.id()
+        for attempt in range(1, count + 2):
+            final = attempt > count
+            attempt_result = retries.AttemptResult(result if final else None)
+            baselines.start_test()
+            start = time.time()
+            super(SeleniumTestCase, self).__call__(attempt_result)
+            duration = time.time() - start
+            failed = attempt_result.failed
+            if record_baseline and attempt_result.outcome == 'pass':
+                baselines.record_test(test_id, duration)
+            if record_results:
+                results.write(results.test_record(
+                    self, attempt_result, duration, attempt,
+                    final or not failed))
+            if count:
+                retries.record(test_id, attempt,
+                               attempt_result.outcome if failed else 'pass',
+                               None if final or not failed
+                               else attempt_result.exc_info)
+            if final:
+                return
+            if not failed:
+                attempt_result.replay(self, result)
+                return
+
+    def _fixture_setup(self):
+        """ If database snapshots are enabled, load the fixtures by restoring
+        a snapshot of the database taken when they were first loaded """
+        if load.target():
+            # Load test scenarios don't use the test database
+            return
+        aliases = self._databases_names(include_mirrors=False)
+        self._use_snapshots = (settings.SELENIUM_DATABASE_SNAPSHOTS and
+                               not self.reset_sequences and
+                               all(snapshots.supported(alias) for alias in aliases))
+        if not self._use_snapshots:
+            return super(SeleniumTestCase, self)._fixture_setup()
+        for alias in aliases:
+            if snapshots.get(alias, None) is None:
+                # The state of the database without any fixtures loaded
+                snapshots.save(alias, None)
+        fixtures = tuple(getattr(self, 'fixtures', None) or ())
+        if not fixtures:
+            return
+        saved = [snapshots.get(alias, fixtures) for alias in aliases]
+        if all(saved):
+            for snapshot in saved:
+                snapshot.restore()
+        else:
+            super(SeleniumTestCase, self)._fixture_setup()
+            for alias in aliases:
+                snapshots.save(alias, fixtures)
+
+    def _fixture_teardown(self):
+        """ If database snapshots are enabled, reset the database by
+        restoring the snapshot taken before any fixtures were loaded """
+        if load.target():
+            return
+        if not getattr(self, '_use_snapshots', False):
+            return super(SeleniumTestCase, self)._fixture_teardown()
+        for alias in self._databases_names(include_mirrors=False):
+            snapshots.get(alias, None).restore()
 
     def setUp(self):
-        """ Start a new browser instance for each test """
+        """ Start a new browser instance for each test (or take one which was
+        already started in the background, if the pool is enabled) """
         self._screenshot_number = 1
+        self._screenshot_lock = threading.Lock()
+        self.screenshots = []
+        self.console_log = []
+        self._using = threading.local()
+        self.drivers = OrderedDict()
+        self._driver_pool = None
+        self._page_metrics = {}
+        self._page_loads = []
+        server.set_current_test(self.id())
+        if memory.enabled() and not memory.started():
+            memory.start()
+        self._memory_before = memory.rss() if memory.started() else None
+        self._watchdog = None
+        if (settings.SELENIUM_TEST_TIMEOUT or
+                settings.SELENIUM_COMMAND_TIMEOUT) and watchdog.available():
+            self._watchdog = watchdog.Watchdog(
+                self, settings.SELENIUM_TEST_TIMEOUT,
+                settings.SELENIUM_COMMAND_TIMEOUT)
+            self._watchdog.start()
+            # Runs even if setUp fails
+            self.addCleanup(self._watchdog.stop)
         self.browser = os.getenv('SELENIUM_BROWSER',
                                  settings.SELENIUM_DEFAULT_BROWSER)
+        if settings.SELENIUM_DRIVER_POOL_SIZE and not os.getenv('SELENIUM_HOST'):
+            self._driver_pool = self.get_driver_pool()
+        self.sel = self.open_driver(self.main_driver)
+
+    def open_driver(self, name):
+        """ Start another browser for the test (for features which involve
+        several users at once), available as ``self.drivers[name]`` and to
+        the helper methods inside ``using(name)``.  Every browser is shut
+        down at the end of the test. """
+        if name in self.drivers:
+            raise ValueError('There is already a browser named %r' % name)
         if os.getenv('SELENIUM_HOST'):
-            self.sel = self.sauce_labs_driver()
-        elif self.browser == 'firefox':
-            self.sel = Firefox(self.get_firefox_profile())
-        elif self.browser == 'htmlunit':
-            self.sel = RemoteWebDriver(desired_capabilities=DesiredCapabilities.HTMLUNITWITHJS)
-        elif self.browser in ['ios', 'ipad', 'ipod', 'iphone']:
-            capabilities = {
-                'app': 'safari',
-                'browserName': '',
-                'device': 'iPhone Simulator',
-                'os': 'iOS 6.1'
-            }
-            self.sel = RemoteWebDriver(command_executor=self.appium_command_executor(),
-                                       desired_capabilities=capabilities)
-        elif self.browser == 'opera':
-            self.sel = RemoteWebDriver(desired_capabilities=DesiredCapabilities.OPERA)
-        elif self.browser == 'iexplore':
-            self.sel = RemoteWebDriver(desired_capabilities=DesiredCapabilities.INTERNETEXPLORER)
-        elif self.browser == 'phantomjs':
-            self.sel = PhantomJS(service_args=['--debug=true',
-                                               '--webdriver-loglevel=DEBUG'])
-        elif self.browser == 'safari':
-            # requires a Safari extension to be built from source and installed
-            self.sel = RemoteWebDriver(desired_capabilities=DesiredCapabilities.SAFARI)
+            driver = self.sauce_labs_driver()
+            drivers.settle()
+        elif self._driver_pool:
+            driver = self._driver_pool.acquire()
         else:
-            self.sel = Chrome()
-        self.sel.set_page_load_timeout(settings.SELENIUM_PAGE_LOAD_TIMEOUT)
-        # Give the browser a little time; Firefox throws random errors if you
-        # hit it too soon
-        time.sleep(1)
+            driver = drivers.create_driver(self.browser, self)
+        self.drivers[name] = driver
+        if self._watchdog:
+            self._watchdog.watch(driver)
+        driver.set_page_load_timeout(settings.SELENIUM_PAGE_LOAD_TIMEOUT)
+        return driver
+
+    @contextmanager
+    def using(self, name):
+        """ Make the helper methods use the named browser (see
+        open_driver()) within this block, in the current thread """
+        previous = getattr(self._using, 'name', None)
+        self._using.name = name
+        self._using.driver = self.drivers[name]
+        try:
+            yield self._using.driver
+        finally:
+            self._using.name = previous
+            self._using.driver = self.drivers[previous] if previous else None
+
+    def run_concurrently(self, steps):
+        """ Run several sequences of helper calls at the same time, each in
+        its own thread and browser.  ``steps`` maps browser names (see
+        open_driver()) to functions taking no arguments; once they've all
+        finished, the first exception raised by any of them (if any) is
+        re-raised. """
+        errors = []
+        counts = baselines.current_counts()
+
+        def run(name, function):
+            if counts is not None:
+                baselines.share_counts(counts)
+            try:
+                with self.using(name):
+                    function()
+            except Exception:
+                errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=run, args=item,
+                                    name='%s-%s' % (self._testMethodName, item[0]))
+                   for item in steps.items()]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            # Join with a timeout so the watchdog's alarm can interrupt it
+            while thread.is_alive():
+                thread.join(0.1)
+        if errors:
+            six.reraise(*errors[0])
 
     def tearDown(self):
         # Check to see if an exception was raised during the test
         info = sys.exc_info()
         passed = info[0] is None
-        if not passed:
+        if self._watchdog:
+            self._watchdog.end_test()
+        # If the watchdog fired, it already killed the driver (or ended its
+        # session, for remote ones)
+        hung = self._watchdog is not None and self._watchdog.fired
+        if not passed and not hung:
             # Want to see what went wrong
-            self.screenshot()
+            for name in self.drivers:
+                with self.using(name):
+                    self.screenshot()
+        if settings.SELENIUM_CAPTURE_CONSOLE and not hung:
+            for name in self.drivers:
+                with self.using(name):
+                    self.console_messages()
+            if self.console_log:
+                level = logging.DEBUG if passed else logging.INFO
+                logger.log(level, '%s\nBrowser console:\n%s', self.id(),
+                           '\n'.join(console.describe(entry)
+                                     for entry in self.console_log))
         self.report_status(passed)
-        if hasattr(self, 'sel'):
-            self.sel.quit()
+        server.set_current_test(None)
+        # Keep the requests made during the test, and describe the slowest
+        # ones (nose shows the log output for failed tests)
+        self._timeline_start, self.request_timeline = server.get_timeline()
+        if self.request_timeline:
+            level = logging.DEBUG if passed else logging.INFO
+            summary = self.request_waterfall()
+            if settings.SELENIUM_COUNT_QUERIES and self._page_loads:
+                summary += '\nDatabase queries by page load:'
+                for url, requests, queries, query_time in self.page_queries():
+                    summary += '\n%s: %d requests, %d queries (%.1f ms)' % (
+                        url, requests, queries, query_time * 1000)
+            logger.log(level, '%s\n%s', self.id(), summary)
+        driver_sizes = {}
+        if self._memory_before is not None and not hung:
+            for name, driver in self.drivers.items():
+                pid = drivers.driver_pid(driver)
+                if pid:
+                    driver_sizes[name] = memory.tree_rss(pid)
+        # Shut the browser down last, in case it hangs and the watchdog fails
+        # the test
+        if not hung:
+            for driver in self.drivers.values():
+                if self._driver_pool:
+                    self._driver_pool.release(driver)
+                else:
+                    driver.quit()
+        if self._memory_before is not None:
+            memory.record_test(self.id(), self._memory_before, memory.rss(),
+                               driver_sizes)
         super(SeleniumTestCase, self).tearDown()
 
+    def _requests(self):
+        if hasattr(self, 'request_timeline'):
+            return self._timeline_start, self.request_timeline
+        return server.get_timeline()
+
+    def request_waterfall(self, count=10):
+        """ Describe the slowest of the requests made to the live server
+        during this test (so far, if it's still running) """
+        start, records = self._requests()
+        return server.waterfall(records, start, count)
+
+    def page_queries(self):
+        """ Get a (relative URL, request count, query count, query seconds)
+        tuple for each get() in this test so far, covering all the live server
+        requests made from its start until the next get().  Queries are only
+        counted if the SELENIUM_COUNT_QUERIES setting is True. """
+        _start, records = self._requests()
+        loads = self._page_loads
+        results = []
+        for i, (url, start) in enumerate(loads):
+            end = loads[i + 1][1] if i + 1 < len(loads) else float('inf')
+            requests = [record for record in records
+                        if start <= record.start < end]
+            queries = sum(record.queries or 0 for record in requests)
+            query_time = sum(record.query_time or 0 for record in requests)
+            results.append((url, len(requests), queries, query_time))
+        return results
+
+    def assert_page_queries_under(self, count):
+        """ Assert that the requests made since the last get() (for the page
+        and any resources or AJAX calls it made) made fewer than the given
+        number of database queries in total """
+        if not settings.SELENIUM_COUNT_QUERIES:
+            msg = 'SELENIUM_COUNT_QUERIES must be True to check query counts'
+            raise ImproperlyConfigured(msg)
+        url, _requests, queries, _time = self.page_queries()[-1]
+        msg = 'Loading %s made %d database queries, the budget is fewer ' \
+              'than %d' % (url, queries, count)
+        assert queries < count, msg
+
+    def get_driver_pool(self):
+        """ Get the pool of browsers being launched in the background for
+        this test's browser and launch options """
+        browser = self.browser
+        profile = drivers.get_profile()
+        firefox_profile = six.get_unbound_function(type(self).get_firefox_profile)
+        key = (browser, profile.name, firefox_profile)
+        launch = PooledLaunch(type(self), self.live_server_url)
+
+        def factory():
+            return drivers.create_driver(browser, launch, profile)
+
+        return pool.get_pool(key, factory, settings.SELENIUM_DRIVER_POOL_SIZE)
+
     # ~~~~~~~~~~~~~~~~~~~~~~~~~ Selenium operations ~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def assert_hidden(self, selector):
@@ -300,9 +568,17 @@ class SeleniumTestCase(LiveServerTestCase):
         msg = "'%s' should not be visible" % selector
         assert not element.is_displayed(), msg
 
+    def assert_no_js_errors(self):
+        """ Verify that no JavaScript errors have been logged to the browser
+        console (see console_messages()) """
+        errors = console.errors(self.console_messages())
+        msg = 'The browser logged JavaScript errors:\n%s' % '\n'.join(
+            console.describe(entry) for entry in errors)
+        assert not errors, msg
+
     def assert_not_present(self, selector):
-        assert_raises(NoSuchElementException,
-                      self.sel.find_element_by_css_selector, selector)
+        self.assertRaises(NoSuchElementException,
+                          self.sel.find_element_by_css_selector, selector)
 
     def assert_not_visible(self, selector):
         """ Ok if it's either missing or hidden """
@@ -341,6 +617,7 @@ class SeleniumTestCase(LiveServerTestCase):
             report = self.sel.execute_script('return axs.Audit.createReport(axs_audit_results);')
             raise self.failureException(report)
 
+    @steps.step
     def click(self, selector):
         """ Click the element matching the selector (and retry if it isn't
         visible or clickable yet) """
@@ -350,6 +627,7 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until(element_was_clicked, msg)
         return element
 
+    @steps.step
     def click_link_with_text(self, text):
         link_is_present = lambda driver: driver.find_element_by_link_text(text)
         msg = "A link with text '%s' should be present" % text
@@ -357,6 +635,7 @@ class SeleniumTestCase(LiveServerTestCase):
         link.click()
         return link
 
+    @steps.step
     def click_link_with_xpath(self, xpath):
         link_is_present = lambda driver: driver.find_element_by_xpath(xpath)
         msg = "A link with xpath '%s' should be present" % xpath
@@ -364,47 +643,205 @@ class SeleniumTestCase(LiveServerTestCase):
         link.click()
         return link
 
+    def console_messages(self):
+        """ Collect the console messages and JavaScript errors logged by the
+        browser since this was last called, add them to ``self.console_log``
+        (which is included in the test results), and return all of them so
+        far.  Pages only buffer their messages if the SELENIUM_CAPTURE_CONSOLE
+        setting is True (browsers with a "browser" driver log, like Chrome,
+        also provide them from that). """
+        self.console_log.extend(console.harvest(self.sel))
+        return self.console_log
+
+    @steps.step
     def enter_text(self, selector, value):
         field = self.wait_for_element(selector)
         field.send_keys(value)
-        self.screenshot()
+        self.element_screenshot(field)
         return field
 
+    @steps.step
     def enter_text_via_xpath(self, xpath, value):
         field = self.wait_for_xpath(xpath)
         field.send_keys(value)
-        self.screenshot()
+        self.element_screenshot(field)
         return field
 
+    @steps.step
+    def fill_form(self, fields):
+        """ Fill in the fields matching the selectors in the given dictionary
+        with the corresponding values, all in one go: text fields get the
+        value (replacing what they had), select boxes get the option with
+        that value or text selected, and checkboxes and radio buttons get
+        checked if the value is true.  A plain dictionary's fields are filled
+        in an arbitrary order; pass an OrderedDict or a sequence of
+        ``(selector, value)`` pairs when the order matters.  See perform() for
+        details. """
+        items = fields.items() if hasattr(fields, 'items') else fields
+        self.perform([('set', selector, value) for selector, value in items])
+
+    @steps.step
     def get(self, relative_url):
+        self._page_loads.append((relative_url, time.time()))
         self.sel.get('%s%s' % (self.live_server_url, relative_url))
+        if settings.SELENIUM_CAPTURE_CONSOLE:
+            console.install(self.sel)
+        self.last_page_metrics = None
+        if settings.SELENIUM_PAGE_METRICS and not load.target():
+            self.page_metrics(relative_url)
         self.screenshot()
 
-    def screenshot(self):
+    @steps.step
+    def login(self, user, backend=None):
+        """ Log the browser in as the given user without going through the
+        login page, by creating a session for it in the database and setting
+        the session cookie.  Browsers only accept cookies for the current
+        page's domain, so a page from the live server (``cookie_url``) is
+        loaded first if necessary. """
+        from django.conf import settings as django_settings
+        from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY
+        engine = import_module(django_settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user.pk
+        session[BACKEND_SESSION_KEY] = backend or getattr(
+            user, 'backend', django_settings.AUTHENTICATION_BACKENDS[0])
+        if hasattr(user, 'get_session_auth_hash'):
+            # Django 1.7 and later invalidate sessions without this
+            from django.contrib.auth import HASH_SESSION_KEY
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        if not self.sel.current_url.startswith(self.live_server_url + '/'):
+            self.sel.get('%s%s' % (self.live_server_url, self.cookie_url))
+        cookie = {
+            'name': django_settings.SESSION_COOKIE_NAME,
+            'value': session.session_key,
+            'path': django_settings.SESSION_COOKIE_PATH,
+        }
+        if django_settings.SESSION_COOKIE_DOMAIN:
+            cookie['domain'] = django_settings.SESSION_COOKIE_DOMAIN
+        self.sel.add_cookie(cookie)
+        return session
+
+    def page_metrics(self, relative_url=None):
+        """ Get the performance metrics for the current page load (as a
+        PageMetrics object, or None if the browser doesn't support the
+        Navigation Timing API).  If a URL is given, they're also added to the
+        totals for that URL over the test run. """
+        if self.last_page_metrics is None:
+            data = self.sel.execute_script(metrics.PAGE_METRICS_SCRIPT)
+            if data is None:
+                return None
+            self.last_page_metrics = metrics.PageMetrics(data)
+            if relative_url is not None:
+                metrics.record(relative_url, self.last_page_metrics)
+        return self.last_page_metrics
+
+    def _required_page_metrics(self):
+        page_metrics = self.page_metrics()
+        if page_metrics is None:
+            self.skipTest('The browser does not provide page load timing '
+                          'information')
+        return page_metrics
+
+    def assert_page_load_under(self, ms):
+        """ Assert that the current page finished loading within the given
+        number of milliseconds """
+        load_time = self._required_page_metrics().load_time
+        msg = 'Page load took %s ms, the budget is %s ms' % (load_time, ms)
+        assert load_time is not None and load_time < ms, msg
+
+    def assert_resource_count_under(self, count):
+        """ Assert that the current page loaded fewer than the given number
+        of resources (scripts, stylesheets, images, etc.) """
+        actual = self._required_page_metrics().resource_count
+        msg = 'Page loaded %d resources, the budget is fewer than %d' % (
+            actual, count)
+        assert actual < count, msg
+
+    def assert_transfer_size_under(self, size, initiator_type=None):
+        """ Assert that fewer than the given number of bytes were
+        transferred to load the current page, or its resources of the given
+        type ("script", "img", "css", etc.) """
+        actual = self._required_page_metrics().transfer_size(initiator_type)
+        description = '%s resources' % initiator_type if initiator_type else 'the page'
+        msg = 'Loading %s transferred %d bytes, the budget is under %d' % (
+            description, actual, size)
+        assert actual < size, msg
+
+    @steps.step
+    def perform(self, action_list):
+        """ Perform a sequence of actions (see sbo_selenium.actions), such as
+        ``[('set', '#name', 'Joe'), ('click', 'button[type="submit"]')]``.
+        Waits until all the elements are present and visible (and select
+        boxes have the options to select), then performs all the actions in
+        a single WebDriver command and takes one screenshot.  Elements are
+        found before any action is performed, so only the last action should
+        load a new page. """
+        action_list = actions.normalize(action_list)
+        waiting = []
+
+        def performed(driver):
+            waiting[:] = driver.execute_script(actions.PERFORM_SCRIPT,
+                                               action_list)
+            return not waiting
+
+        try:
+            Wait(self.sel).until(performed)
+        except TimeoutException:
+            msg = 'These elements should be present and visible: %s' % \
+                ', '.join(waiting)
+            raise TimeoutException(msg)
+        self.screenshot()
+
+    def screenshot(self, element=None):
+        """ Save a screenshot of the browser window (or of just the given
+        element and its immediate surroundings) in SELENIUM_SCREENSHOT_DIR,
+        returning its path.  Unless it's a plain full-window PNG, the file is
+        written in the background by the end of the test class. """
         if hasattr(self, 'sauce_user_name'):
             # Sauce Labs is taking screenshots for us
             return
+        if load.target():
+            # Would just slow down the load test scenarios
+            return
         if not hasattr(self, 'browser') or self.browser == 'htmlunit':
             # Can't take screenshots
             return
         screenshot_dir = settings.SELENIUM_SCREENSHOT_DIR
         if not screenshot_dir:
             return
-        name = "%s_%d.png" % (self._testMethodName, self._screenshot_number)
+        driver_name = getattr(self._using, 'name', None)
+        prefix = self._testMethodName
+        if driver_name not in (None, self.main_driver):
+            prefix = '%s_%s' % (prefix, driver_name)
+        with self._screenshot_lock:
+            name = "%s_%d.%s" % (prefix, self._screenshot_number,
+                                 screenshots.extension())
+            self._screenshot_number += 1
+            self.screenshots.append(os.path.join(screenshot_dir, name))
         path = os.path.join(screenshot_dir, name)
-        self.sel.get_screenshot_as_file(path)
-        self._screenshot_number += 1
+        screenshots.save(self.sel, path, element)
+        return path
+
+    def element_screenshot(self, element):
+        """ Take a helper's screenshot after it found an element, of just
+        that element if SELENIUM_SCREENSHOT_ELEMENTS is True """
+        if settings.SELENIUM_SCREENSHOT_ELEMENTS:
+            return self.screenshot(element)
+        return self.screenshot()
 
+    @steps.step
     def select_by_text(self, selector, text):
         select = Select(self.wait_for_element(selector))
         select.select_by_visible_text(text)
-        self.screenshot()
+        self.element_screenshot(select._el)
         return select
 
+    @steps.step
     def select_by_value(self, selector, value):
         select = Select(self.wait_for_element(selector))
         select.select_by_value(value)
-        self.screenshot()
+        self.element_screenshot(select._el)
         return select
 
     def select_text(self, selector, start=0, end=-1):
@@ -421,6 +858,7 @@ class SeleniumTestCase(LiveServerTestCase):
         self.sel.execute_script(script)
         self.screenshot()
 
+    @steps.step
     def wait_for_background_color(self, selector, color_string):
         color = Color.from_string(color_string)
         correct_color = lambda driver: Color.from_string(driver.find_element_by_css_selector(selector).value_of_css_property("background-color")) == color
@@ -428,6 +866,7 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until(correct_color, msg)
         self.screenshot()
 
+    @steps.step
     def wait_for_condition(self, return_statement, msg=None):
         """Wait until the provided JavaScript expression returns true.
         Note: for this to work, the expression must include the "return"
@@ -437,26 +876,30 @@ class SeleniumTestCase(LiveServerTestCase):
             msg = '"{}" never became true'.format(return_statement)
         Wait(self.sel).until(condition_is_true, msg)
 
+    @steps.step
     def wait_for_element(self, selector):
         element_is_present = lambda driver: driver.find_element_by_css_selector(selector)
         msg = "An element matching '%s' should be on the page" % selector
         element = Wait(self.sel).until(element_is_present, msg)
-        self.screenshot()
+        self.element_screenshot(element)
         return element
 
+    @steps.step
     def wait_for_text(self, text):
         text_is_present = lambda driver: text in driver.page_source
         msg = "The text '%s' should be present on the page" % text
         Wait(self.sel).until(text_is_present, msg)
         self.screenshot()
 
+    @steps.step
     def wait_for_xpath(self, xpath):
         element_is_present = lambda driver: driver.find_element_by_xpath(xpath)
         msg = "An element matching '%s' should be on the page" % xpath
         element = Wait(self.sel).until(element_is_present, msg)
-        self.screenshot()
+        self.element_screenshot(element)
         return element
 
+    @steps.step
     def wait_until_element_contains(self, selector, text):
         """ Wait until the specified element contains certain text """
         text_contained = lambda driver: text in driver.find_element_by_css_selector(selector).text
@@ -464,6 +907,7 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until(text_contained, msg)
         self.screenshot()
 
+    @steps.step
     def wait_until_hidden(self, selector):
         """ Wait until the element matching the selector is hidden """
         element = self.wait_for_element(selector)
@@ -473,6 +917,7 @@ class SeleniumTestCase(LiveServerTestCase):
         self.screenshot()
         return element
 
+    @steps.step
     def wait_until_not_present(self, selector):
         """ Wait until the element matching the selector is gone from page """
         element_is_present = lambda driver: driver.find_element_by_css_selector(selector)
@@ -480,6 +925,7 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until_not(element_is_present, msg)
         self.screenshot()
 
+    @steps.step
     def wait_until_not_visible(self, selector):
         """ Wait until the element matching the selector is either hidden or
         removed from the page """
@@ -488,10 +934,13 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until_not(element_is_visible, msg)
         self.screenshot()
 
+    @steps.step
     def wait_until_option_added(self, selector, option_text):
         """ Wait until the specified select option appears; the entire
         select widget may be replaced in the process """
-        end_time = time.time() + settings.SELENIUM_TIMEOUT
+        config = settings.snapshot
+        poll = config.SELENIUM_POLL_FREQUENCY
+        end_time = time.time() + config.SELENIUM_TIMEOUT
         while True:
             try:
                 select = Select(self.sel.find_element_by_css_selector(selector))
@@ -500,15 +949,19 @@ class SeleniumTestCase(LiveServerTestCase):
                         return option
             except (NoSuchElementException, StaleElementReferenceException):
                 pass
-            time.sleep(settings.SELENIUM_POLL_FREQUENCY)
+            baselines.count_poll()
+            time.sleep(poll)
             if time.time() > end_time:
                 break
         raise TimeoutException("Select option should have been added")
 
+    @steps.step
     def wait_until_option_disabled(self, selector, option_text):
         """ Wait until the specified select option is disabled; the entire
         select widget may be replaced in the process """
-        end_time = time.time() + settings.SELENIUM_TIMEOUT
+        config = settings.snapshot
+        poll = config.SELENIUM_POLL_FREQUENCY
+        end_time = time.time() + config.SELENIUM_TIMEOUT
         while True:
             try:
                 select = Select(self.sel.find_element_by_css_selector(selector))
@@ -517,11 +970,13 @@ class SeleniumTestCase(LiveServerTestCase):
                         return option
             except (NoSuchElementException, StaleElementReferenceException):
                 pass
-            time.sleep(settings.SELENIUM_POLL_FREQUENCY)
+            baselines.count_poll()
+            time.sleep(poll)
             if time.time() > end_time:
                 break
         raise TimeoutException("Select option should have been disabled")
 
+    @steps.step
     def wait_until_property_equals(self, selector, name, value):
         """ Wait until the specified CSS property of the element matching the
         provided selector matches the expected value """
@@ -531,10 +986,13 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until(value_is_correct, msg)
         self.screenshot()
 
+    @steps.step
     def wait_until_offscreen(self, selector):
         """ Wait until the element matching the provided selector has been
         moved offscreen (deliberately, not just scrolled out of view) """
-        end_time = time.time() + settings.SELENIUM_TIMEOUT
+        config = settings.snapshot
+        poll = config.SELENIUM_POLL_FREQUENCY
+        end_time = time.time() + config.SELENIUM_TIMEOUT
         while True:
             try:
                 element = self.sel.find_element_by_css_selector(selector)
@@ -548,15 +1006,19 @@ class SeleniumTestCase(LiveServerTestCase):
                     return True
             except (NoSuchElementException, StaleElementReferenceException):
                 pass
-            time.sleep(settings.SELENIUM_POLL_FREQUENCY)
+            baselines.count_poll()
+            time.sleep(poll)
             if time.time() > end_time:
                 break
         raise TimeoutException("'%s' should be offscreen" % selector)
 
+    @steps.step
     def wait_until_onscreen(self, selector):
         """ Wait until the element matching the provided selector has been
         moved into the viewable page """
-        end_time = time.time() + settings.SELENIUM_TIMEOUT
+        config = settings.snapshot
+        poll = config.SELENIUM_POLL_FREQUENCY
+        end_time = time.time() + config.SELENIUM_TIMEOUT
         while True:
             try:
                 element = self.sel.find_element_by_css_selector(selector)
@@ -566,11 +1028,13 @@ class SeleniumTestCase(LiveServerTestCase):
                     return True
             except (NoSuchElementException, StaleElementReferenceException):
                 pass
-            time.sleep(settings.SELENIUM_POLL_FREQUENCY)
+            baselines.count_poll()
+            time.sleep(poll)
             if time.time() > end_time:
                 break
         raise TimeoutException("'%s' should be offscreen" % selector)
 
+    @steps.step
     def wait_until_property_less_than(self, selector, name, value):
         """ Wait until the specified CSS property of the element matching the
         provided selector is less than a certain value.  Ignores any
@@ -580,6 +1044,7 @@ class SeleniumTestCase(LiveServerTestCase):
         Wait(self.sel).until(value_is_correct, msg)
         self.screenshot()
 
+    @steps.step
     def wait_until_visible(self, selector):
         """ Wait until the element matching the selector is visible """
         element = self.wait_for_element(selector)
@@ -592,39 +1057,8 @@ class SeleniumTestCase(LiveServerTestCase):
 
     def sauce_labs_driver(self):
         """ Configure the Selenium driver to use Sauce Labs """
-        host = os.getenv("SELENIUM_HOST", "ondemand.saucelabs.com")
-        port = os.getenv("SELENIUM_PORT", "80")
-        executor = "".join(["http://", host, ":", port, '/wd/hub'])
-        platform = os.getenv("SELENIUM_PLATFORM", "Windows 7")
-        version = os.getenv("SELENIUM_VERSION", "")
-        self.sauce_user_name = os.getenv("SAUCE_USER_NAME")
-        self.sauce_api_key = os.getenv("SAUCE_API_KEY")
-        tunnel_id = os.getenv("SAUCE_TUNNEL_ID", "")
-        build_number = os.getenv('BUILD_NUMBER')
-        job_name = os.getenv('JOB_NAME')
-        # http://code.google.com/p/selenium/wiki/DesiredCapabilities
-        # https://saucelabs.com/docs/additional-config#desired-capabilities
-        caps = {
-            'accessKey': self.sauce_api_key,
-            'capture-html': True,
-            'browserName': self.browser,
-            'javascriptEnabled': True,
-            'name': self.id(),
-            'platform': platform,
-            'username': self.sauce_user_name,
-            'version': version,
-        }
-        if build_number and job_name:
-            caps['build'] = '{} #{}'.format(job_name, build_number)
-        if tunnel_id:
-            caps['tunnel-identifier'] = tunnel_id
-        if settings.SELENIUM_SAUCE_VERSION:
-            caps['selenium-version'] = settings.SELENIUM_SAUCE_VERSION
-        remote = webdriver.Remote(command_executor=executor,
-                                  desired_capabilities=caps)
-        # Store the Sauce session ID to output later for Jenkins integration
-        # See https://saucelabs.com/jenkins/5 for details
-        sauce_sessions.append('SauceOnDemandSessionID={} job-name={}'.format(remote.session_id, self.id()))
+        remote, self.sauce_user_name, self.sauce_api_key = \
+            sauce.sauce_labs_driver(self.browser, self.id())
         return remote
 
     def report_status(self, passed):
@@ -633,14 +1067,5 @@ class SeleniumTestCase(LiveServerTestCase):
         if not hasattr(self, 'sauce_user_name'):
             # Not using Sauce Labs for this test
             return
-        url_pattern = 'http://{}:{}@saucelabs.com/rest/v1/{}/jobs/{}'
-        url = url_pattern.format(self.sauce_user_name,
-                                 self.sauce_api_key,
-                                 self.sauce_user_name,
-                                 self.sel.session_id)
-        body_content = json.dumps({"passed": passed})
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        response = requests.put(url, body_content, headers=headers)
-        return response.status_code == 200
+        return sauce.report_status(self.sauce_user_name, self.sauce_api_key,
+                                   self.sel.session_id, passed)
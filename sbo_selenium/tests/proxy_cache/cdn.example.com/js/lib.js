@@ -0,0 +1 @@
+window.cachedLibrary = true;
@@ -1,6 +1,10 @@
+import os
+from unittest import SkipTest
+
 from django.core.urlresolvers import reverse
 
 from sbo_selenium import SeleniumTestCase
+from sbo_selenium.conf import settings
 
 
 class TestAccessibility(SeleniumTestCase):
@@ -9,6 +13,11 @@ class TestAccessibility(SeleniumTestCase):
     Developer Tools extension.
     """
 
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) == 'fake':
+            raise SkipTest('The audit requires a browser that runs JavaScript')
+        super(TestAccessibility, self).setUp()
+
     def test_good_accessibility(self):
         """ A page without accessibility problems should pass the audit"""
         self.get(reverse('good_accessibility'))
@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import SeleniumTestCase, baselines
+from sbo_selenium.conf import settings
+from sbo_selenium.fake import FakeElement
+
+
+@override_settings(SELENIUM_POLL_FREQUENCY=0.01)
+class MeasuredTest(SeleniumTestCase):
+    """ A test whose measurements are recorded for the baseline """
+    __test__ = False  # Only run by TestBaselines
+
+    def test_wait(self):
+        def add_element(document):
+            self.sel.query('body').append(FakeElement('p', {'id': 'late'}))
+        self.sel.later(0.05, add_element)
+        self.wait_for_element('#late')
+
+    def test_concurrent_waits(self):
+        self.open_driver('bob')
+
+        def wait():
+            self.sel.later(0.05, lambda document: self.sel.query('body').append(
+                FakeElement('p', {'id': 'late'})))
+            self.wait_for_element('#late')
+
+        self.run_concurrently({'main': wait, 'bob': wait})
+
+
+class TestBaselines(SimpleTestCase):
+    """
+    Test cases for the per-test performance baselines.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'baseline.json')
+
+    def tearDown(self):
+        baselines.stop()
+        shutil.rmtree(self.directory)
+
+    def save_runs(self, durations, polls=3):
+        for duration in durations:
+            baselines.save(self.path, {'a.B.test_c': {
+                'duration': [duration], 'polls': [polls],
+                'step:get': [duration / 2]}})
+
+    def test_save(self):
+        """ Only the most recent runs should be kept, one value per run """
+        with override_settings(SELENIUM_BASELINE_RUNS=3):
+            self.save_runs([1.0, 2.0, 3.0])
+            baselines.save(self.path, {'a.B.test_c': {'duration': [5.0, 4.0, 9.0]}})
+        with open(self.path) as f:
+            data = json.load(f)
+        assert data['tests']['a.B.test_c']['duration'] == [2.0, 3.0, 5.0]
+        assert data['tests']['a.B.test_c']['step:get'] == [0.5, 1.0, 1.5]
+
+    def test_compare(self):
+        """ Measurements well beyond the usual spread should be regressions """
+        current = {'a.B.test_c': {'duration': [2.0], 'polls': [4],
+                                  'step:get': [1.6]}}
+        self.save_runs([2.0, 2.1])
+        assert baselines.compare(self.path, current) == []
+        self.save_runs([1.9, 2.0, 2.05])
+        regressions = baselines.compare(self.path, current)
+        assert len(regressions) == 1
+        assert regressions[0].startswith('a.B.test_c get: 1.60 s, was median 1.00 s (MAD 0.0')
+        current['a.B.test_c'].update(duration=[2.3], polls=[8])
+        regressions = baselines.compare(self.path, current)
+        assert len(regressions) == 3
+        assert [line for line in regressions
+                if line.startswith('a.B.test_c duration: 2.30 s, was median 2.00 s')]
+        assert 'a.B.test_c polls: 8 polls, was median 3 polls (MAD 0 polls)' in regressions
+        with override_settings(SELENIUM_BASELINE_THRESHOLD=100):
+            regressions = baselines.compare(self.path, current)
+        assert [line.split(':')[0] for line in regressions] == ['a.B.test_c polls']
+
+    def test_recording(self):
+        """ Passing tests should have their duration, helper times, and wait
+        polls recorded """
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('This test uses the fake browser')
+        baselines.start()
+        test = MeasuredTest('test_wait')
+        result = unittest.TestResult()
+        test(result)
+        assert result.wasSuccessful(), result.errors
+        measured = baselines.measurements()[test.id()]
+        assert measured['duration'][0] >= measured['step:wait_for_element'][0] >= 0.05
+        assert measured['polls'][0] >= 3
+        baselines.save(self.path)
+        assert list(baselines.load(self.path)) == [test.id()]
+
+    def test_concurrent_measurements(self):
+        """ Polls and helper times in the threads started by
+        run_concurrently() should count towards the test's measurements """
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('This test uses the fake browser')
+        baselines.start()
+        test = MeasuredTest('test_concurrent_waits')
+        result = unittest.TestResult()
+        test(result)
+        assert result.wasSuccessful(), result.errors
+        measured = baselines.measurements()[test.id()]
+        assert measured['polls'][0] >= 6
+        assert measured['step:wait_for_element'][0] >= 0.1
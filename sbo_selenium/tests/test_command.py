@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import OutputWrapper
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils import six
+from nose.tools import assert_raises
+
+from sbo_selenium import baselines, memory, retries
+from sbo_selenium.management.commands import selenium
+
+
+class TestCommand(SimpleTestCase):
+    """
+    Test cases for the selenium management command.
+    """
+
+    def setUp(self):
+        self.call_command = selenium.call_command
+        self.output = six.StringIO()
+        self.command = selenium.Command()
+        self.command.stdout = OutputWrapper(self.output)
+        self.runs = []
+
+    def tearDown(self):
+        selenium.call_command = self.call_command
+        retries.clear()
+        memory.stop()
+        baselines.stop()
+
+    def failing_run(self, *args):
+        """ Stands in for the test command, which exits if any test failed """
+        self.runs.append(args)
+        retries.record('a.B.test_c', 1, 'fail')
+        retries.record('a.B.test_c', 2, 'fail')
+        memory.record_test('a.B.test_c', 0, 1048576, {})
+        baselines.record_test('a.B.test_d', 1.0)
+        raise SystemExit(True)
+
+    def test_reports_after_failure(self):
+        """ The run's reports should still be written if a test failed """
+        selenium.call_command = self.failing_run
+        with override_settings(SELENIUM_TRACK_MEMORY=True):
+            assert_raises(SystemExit, self.command.run_tests, ['a.B'], 'fake', 3)
+        assert self.runs == [('test', 'a.B')]
+        lines = self.output.getvalue().splitlines()
+        assert 'Tests which failed at least once:' in lines
+        assert 'a.B.test_c: 2 of 2 attempts failed (100%), failed' in lines
+        assert 'Memory usage:' in lines
+        assert '  a.B.test_c: +1.0 MiB' in lines
+        assert not memory.started()
+
+    def test_baseline_after_failure(self):
+        """ The baseline should still be compared and updated if a test
+        failed """
+        selenium.call_command = self.failing_run
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'baseline.json')
+        try:
+            with override_settings(SELENIUM_BASELINE_FILE=path):
+                assert_raises(SystemExit, self.command.run_and_report, ['a.B'],
+                              'fake', 1, {'compare_baseline': True})
+            assert list(baselines.load(path)) == ['a.B.test_d']
+        finally:
+            shutil.rmtree(directory)
+        assert 'No performance regressions' in self.output.getvalue().splitlines()
+        assert not baselines.recording()
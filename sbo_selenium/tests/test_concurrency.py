@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import SkipTest
+
+from django.test.utils import override_settings
+
+from nose.tools import assert_raises_regexp
+
+from sbo_selenium import SeleniumTestCase, metrics
+from sbo_selenium.conf import settings
+from sbo_selenium.fake import FakeElement
+
+PAGE = '<div id="content"><p id="who">%s</p></div>'
+
+
+@override_settings(SELENIUM_TIMEOUT=2, SELENIUM_POLL_FREQUENCY=0.01)
+class TestConcurrentBrowsers(SeleniumTestCase):
+    """
+    Test cases for running several browsers at once in one test, using the
+    fake browser.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests script the fake browser')
+        super(TestConcurrentBrowsers, self).setUp()
+        self.open_driver('bob')
+        for name, driver in self.drivers.items():
+            driver.pages[self.live_server_url + '/chat/'] = PAGE % name
+
+    def add_reply(self, delay):
+        """ Have a reply appear on the current browser's page after a delay """
+        driver = self.sel
+
+        def reply(document):
+            driver.query('#content').append(FakeElement('p', {'id': 'reply'}))
+        driver.later(delay, reply)
+
+    def test_using(self):
+        """ Helper methods should use the browser selected in this thread """
+        assert list(self.drivers) == ['main', 'bob']
+        self.get('/chat/')
+        with self.using('bob'):
+            assert self.sel is self.drivers['bob']
+            assert self.sel.current_url == 'about:blank'
+            self.get('/chat/')
+            self.wait_until_element_contains('#who', 'bob')
+        assert self.sel is self.drivers['main']
+        self.wait_until_element_contains('#who', 'main')
+        assert_raises_regexp(ValueError, "already a browser named 'bob'",
+                             self.open_driver, 'bob')
+
+    def test_run_concurrently(self):
+        """ Waits in different browsers should overlap """
+        def chat():
+            self.get('/chat/')
+            self.add_reply(0.5)
+            self.wait_for_element('#reply')
+
+        start = time.time()
+        self.run_concurrently({'main': chat, 'bob': chat})
+        assert time.time() - start < 0.9
+        for driver in self.drivers.values():
+            assert driver.query('#reply') is not None
+
+    def test_errors(self):
+        """ A failure in any of the threads should be raised afterwards,
+        once the others have finished """
+        finished = []
+
+        def check_who():
+            self.get('/chat/')
+            self.assert_text_not_in_element('#who', 'main')
+
+        def wait_for_reply():
+            self.get('/chat/')
+            self.add_reply(0.3)
+            self.wait_for_element('#reply')
+            finished.append(True)
+
+        assert_raises_regexp(AssertionError, 'main', self.run_concurrently,
+                             {'main': check_who, 'bob': wait_for_reply})
+        assert finished == [True]
+
+    def test_page_metrics(self):
+        """ Each browser should keep the metrics of its own last page load """
+        def load(url):
+            def get():
+                self.get(url)
+                time.sleep(0.1)
+                assert self.last_page_metrics.url == self.live_server_url + url
+            return get
+
+        self.drivers['bob'].pages[self.live_server_url + '/other/'] = PAGE % 'bob'
+        try:
+            with override_settings(SELENIUM_PAGE_METRICS=True):
+                self.run_concurrently({'main': load('/chat/'),
+                                       'bob': load('/other/')})
+        finally:
+            metrics.clear()
+        assert self.last_page_metrics.url == self.live_server_url + '/chat/'
+        with self.using('bob'):
+            assert self.last_page_metrics.url == self.live_server_url + '/other/'
+
+    def test_screenshots(self):
+        """ Screenshots of other browsers should be named after them """
+        screenshot_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(SELENIUM_SCREENSHOT_DIR=screenshot_dir):
+                self.run_concurrently({'main': self.screenshot,
+                                       'bob': self.screenshot})
+            names = sorted(os.listdir(screenshot_dir))
+            assert len(names) == 2
+            assert names[0].startswith('test_screenshots_')
+            assert names[1].startswith('test_screenshots_bob_')
+        finally:
+            shutil.rmtree(screenshot_dir)
@@ -0,0 +1,44 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from nose.tools import assert_raises
+
+from sbo_selenium.conf import settings
+
+
+class TestSettings(SimpleTestCase):
+    """
+    Test cases for loading and caching of the sbo-selenium settings.
+    """
+
+    def test_cached(self):
+        """ Settings should be served from the same snapshot until changed """
+        assert settings.snapshot is settings.snapshot
+
+    def test_override(self):
+        """ Overridden settings should take effect immediately """
+        original = settings.SELENIUM_TIMEOUT
+        with override_settings(SELENIUM_TIMEOUT=original + 1):
+            assert settings.SELENIUM_TIMEOUT == original + 1
+        assert settings.SELENIUM_TIMEOUT == original
+
+    def test_read_only(self):
+        """ The settings snapshot should not be modifiable """
+        assert_raises(AttributeError, setattr, settings.snapshot,
+                      'SELENIUM_TIMEOUT', 5)
+
+    def test_invalid(self):
+        """ Invalid setting values should be reported clearly """
+        with override_settings(SELENIUM_POLL_FREQUENCY='fast'):
+            assert_raises(ImproperlyConfigured, getattr, settings,
+                          'SELENIUM_POLL_FREQUENCY')
+
+    def test_default_browser_list(self):
+        """ A one-element list of browser names (the old default) should still
+        be accepted as the default browser """
+        with override_settings(SELENIUM_DEFAULT_BROWSER=['chrome']):
+            assert settings.SELENIUM_DEFAULT_BROWSER == 'chrome'
+        with override_settings(SELENIUM_DEFAULT_BROWSER=['chrome', 'firefox']):
+            assert_raises(ImproperlyConfigured, getattr, settings,
+                          'SELENIUM_DEFAULT_BROWSER')
@@ -0,0 +1,95 @@
+import os
+import shutil
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from nose.tools import assert_raises, assert_raises_regexp
+
+from sbo_selenium import drivers
+
+
+class ProfileTest(object):
+    """ Stands in for the test case a browser is being launched for """
+
+    def get_firefox_profile(self):
+        return None
+
+
+class TestDrivers(SimpleTestCase):
+    """
+    Test cases for the browser launch profiles and the options each driver
+    is started with.
+    """
+
+    def setUp(self):
+        self.environ_profile = os.environ.pop('SELENIUM_BROWSER_PROFILE', None)
+
+    def tearDown(self):
+        os.environ.pop('SELENIUM_BROWSER_PROFILE', None)
+        if self.environ_profile is not None:
+            os.environ['SELENIUM_BROWSER_PROFILE'] = self.environ_profile
+
+    def test_no_profile(self):
+        """ Without a profile, browsers should be launched as before """
+        with override_settings(SELENIUM_BROWSER_PROFILE=''):
+            profile = drivers.get_profile()
+        assert not profile.name
+        assert not profile.headless
+        firefox_profile, options = drivers.firefox_options(ProfileTest(), profile)
+        assert (firefox_profile, options) == (None, [])
+
+    def test_unknown_profile(self):
+        """ Unknown profile names should be reported as a configuration error """
+        msg = 'Unknown browser profile "turbo"'
+        assert_raises_regexp(ImproperlyConfigured, msg, drivers.get_profile, 'turbo')
+        with override_settings(SELENIUM_BROWSER_PROFILE='turbo'):
+            assert_raises(ImproperlyConfigured, drivers.get_profile)
+
+    def test_environment_profile(self):
+        """ The profile chosen by the selenium command should be passed to
+        the test process in the environment """
+        os.environ['SELENIUM_BROWSER_PROFILE'] = 'ci'
+        with override_settings(SELENIUM_BROWSER_PROFILE=''):
+            profile = drivers.get_profile()
+        assert profile.name == 'ci'
+        assert profile.headless
+
+    def test_chrome_options(self):
+        """ Profile options should be mapped to Chrome switches """
+        profile = drivers.get_profile('ci')
+        arguments = drivers.chrome_options(profile, 'localhost:8001').arguments
+        assert '--headless' in arguments
+        assert '--disable-gpu' in arguments
+        assert '--disable-extensions' in arguments
+        assert '--blink-settings=imagesEnabled=false' in arguments
+        assert '--proxy-server=http://localhost:8001' in arguments
+        assert '--window-size=%d,%d' % profile.window_size in arguments
+        arguments = drivers.chrome_options(drivers.get_profile('')).arguments
+        assert arguments == []
+
+    def test_firefox_preferences(self):
+        """ Profile options should be mapped to Firefox preferences """
+        profile = drivers.get_profile('ci')
+        firefox_profile, options = drivers.firefox_options(ProfileTest(), profile,
+                                                           'localhost:8001')
+        try:
+            assert options == ['-headless']
+            preferences = firefox_profile.default_preferences
+            assert preferences['layers.acceleration.disabled'] is True
+            assert preferences['extensions.update.enabled'] is False
+            assert preferences['services.sync.enabled'] is False
+            assert preferences['permissions.default.image'] == 2
+            assert preferences['network.proxy.http'] == 'localhost'
+            assert preferences['network.proxy.http_port'] == 8001
+        finally:
+            shutil.rmtree(firefox_profile.path, ignore_errors=True)
+
+    def test_phantomjs_args(self):
+        """ PhantomJS should keep its debug logging unless a profile is used """
+        assert drivers.phantomjs_args(drivers.get_profile('')) == [
+            '--webdriver-loglevel=DEBUG', '--debug=true']
+        args = drivers.phantomjs_args(drivers.get_profile('ci'), 'localhost:8001')
+        assert '--load-images=false' in args
+        assert '--debug=true' not in args
+        assert '--proxy=localhost:8001' in args
@@ -0,0 +1,300 @@
+import os
+import pstats
+import shutil
+import tempfile
+from collections import OrderedDict
+from unittest import SkipTest
+
+from django.test.utils import override_settings
+
+from nose.tools import assert_raises, assert_raises_regexp
+from selenium.common.exceptions import StaleElementReferenceException, \
+    TimeoutException
+from selenium.webdriver.remote.command import Command
+
+from sbo_selenium import SeleniumTestCase, baselines, metrics, screenshots, server
+from sbo_selenium.conf import settings
+from sbo_selenium.fake import FakeElement
+
+PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+  <title>Fake page</title>
+  <link rel="stylesheet" href="/static/page.css">
+  <script src="/static/page.js"></script>
+</head>
+<body>
+  <div id="content" class="main">
+    <p class="message">Hello &amp; welcome</p>
+    <p class="hidden-message" style="display: none">Secret</p>
+    <a href="/other/">Other page</a>
+  </div>
+  <form action="/submit/" method="get">
+    <input type="text" name="name">
+    <select name="color">
+      <option value="r">Red</option>
+      <option value="g">Green</option>
+    </select>
+  </form>
+</body>
+</html>
+"""
+
+
+@override_settings(SELENIUM_TIMEOUT=0.2, SELENIUM_POLL_FREQUENCY=0.01)
+class TestFakeBrowser(SeleniumTestCase):
+    """
+    Test cases for the SeleniumTestCase helpers, using the scriptable fake
+    browser.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests script the fake browser')
+        super(TestFakeBrowser, self).setUp()
+        self.sel.pages[self.live_server_url + '/page/'] = PAGE
+        self.get('/page/')
+
+    def test_live_server_page(self):
+        """ Pages should be loaded from the live server """
+        self.get('/good_accessibility/')
+        assert self.sel.title == 'Example of good (or rather trivial) accessibility'
+
+    def test_request_timeline(self):
+        """ Requests to the live server should be recorded for the test """
+        self.get('/good_accessibility/')
+        start, records = server.get_timeline()
+        assert [record.path for record in records] == ['/good_accessibility/']
+        assert records[0].status == '200'
+        assert records[0].test_id == self.id()
+        assert self.request_waterfall().endswith('GET /good_accessibility/')
+
+    def test_query_counts(self):
+        """ Database queries should be counted for each page load """
+        with override_settings(SELENIUM_COUNT_QUERIES=True):
+            self.get('/queries/3/')
+            self.assert_page_queries_under(4)
+            msg = 'Loading /queries/3/ made 3 database queries'
+            assert_raises_regexp(AssertionError, msg, self.assert_page_queries_under, 3)
+        url, requests, queries, _time = self.page_queries()[-1]
+        assert (url, requests, queries) == ('/queries/3/', 1, 3)
+
+    def test_profile(self):
+        """ Slow requests should be profiled if enabled """
+        screenshot_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(SELENIUM_PROFILE_THRESHOLD=0.000001,
+                                   SELENIUM_SCREENSHOT_DIR=screenshot_dir):
+                self.get('/queries/1/')
+            _start, records = server.get_timeline()
+            path = records[-1].profile
+            assert path == os.path.join(screenshot_dir, os.path.basename(path))
+            assert os.path.basename(path).startswith('test_profile_request_')
+            assert pstats.Stats(path).total_calls > 0
+        finally:
+            shutil.rmtree(screenshot_dir)
+
+    def test_page_metrics(self):
+        """ Page load metrics should be collected if enabled """
+        assert self.last_page_metrics is None
+        self.addCleanup(metrics.clear)
+        with override_settings(SELENIUM_PAGE_METRICS=True):
+            self.get('/page/')
+        page_metrics = self.last_page_metrics
+        assert page_metrics.url == self.live_server_url + '/page/'
+        assert page_metrics.resource_count == 2
+        names = set(resource['name'] for resource in page_metrics.resources)
+        assert self.live_server_url + '/static/page.js' in names
+        assert page_metrics.transfer_size() == len(PAGE)
+        assert '/page/' in [url_metrics.url for url_metrics in metrics.run_metrics()]
+        self.assert_page_load_under(1000)
+        self.assert_resource_count_under(3)
+        self.assert_transfer_size_under(1, 'script')
+        msg = 'Page loaded 2 resources, the budget is fewer than 2'
+        assert_raises_regexp(AssertionError, msg, self.assert_resource_count_under, 2)
+        msg = 'Loading the page transferred %d bytes' % len(PAGE)
+        assert_raises_regexp(AssertionError, msg, self.assert_transfer_size_under, 100)
+
+    def test_element_text(self):
+        """ Element text should be available via the usual driver methods """
+        self.wait_until_element_contains('#content .message', 'Hello & welcome')
+        self.assert_text_not_in_element('#content', 'Secret')
+
+    def test_wait_for_element_timeout(self):
+        """ Waiting for a missing element should time out with a useful message """
+        msg = "An element matching '#missing' should be on the page"
+        assert_raises_regexp(TimeoutException, msg, self.wait_for_element, '#missing')
+
+    def test_wait_for_delayed_element(self):
+        """ Waiting for an element should succeed once it's been added """
+        def add_element(document):
+            self.sel.query('#content').append(FakeElement('span', {'id': 'late'}))
+        self.sel.later(0.05, add_element)
+        self.wait_for_element('#late')
+
+    def test_wait_until_not_present(self):
+        """ Waiting for an element to be removed should succeed once it is """
+        self.sel.later(0.05, lambda document: self.sel.query('.message').remove())
+        self.wait_until_not_present('.message')
+
+    def test_wait_until_hidden(self):
+        """ Waiting for an element to be hidden should succeed once it is """
+        self.sel.later(0.05, lambda document: self.sel.query('.message').set_style('display', 'none'))
+        self.wait_until_hidden('.message')
+        self.assert_hidden('.message')
+        self.assert_not_visible('.hidden-message')
+
+    def test_wait_until_visible_timeout(self):
+        """ Waiting for a hidden element to be shown should time out """
+        assert_raises(TimeoutException, self.wait_until_visible, '.hidden-message')
+
+    def test_stale_element(self):
+        """ Elements removed from the page should be reported as stale """
+        element = self.wait_for_element('.message')
+        self.sel.query('.message').remove()
+        assert_raises(StaleElementReferenceException, getattr, element, 'text')
+
+    def test_replaced_select(self):
+        """ Waiting for an option should survive the select being replaced """
+        def replace_select(document):
+            old = self.sel.query('select')
+            form = old.parent
+            old.remove()
+            select = form.append(FakeElement('select', {'name': 'color'}))
+            option = select.append(FakeElement('option', {'value': 'b'}))
+            option.append('Blue')
+        self.sel.later(0.05, replace_select)
+        baselines.start_test()
+        option = self.wait_until_option_added('select', 'Blue')
+        assert option.get_attribute('value') == 'b'
+        assert baselines.current_counts().polls >= 3
+
+    def test_transient_failures(self):
+        """ Waits should retry commands which fail intermittently """
+        self.sel.fail_next(Command.FIND_ELEMENT, 'unknown error', count=3)
+        self.wait_for_element('#content')
+
+    def test_form(self):
+        """ Form fields should be editable and submittable """
+        self.enter_text('input[name="name"]', 'Joe')
+        self.select_by_text('select', 'Green')
+        assert self.sel.query('select').get_attribute('value') == 'g'
+        self.sel.pages[self.live_server_url + '/submit/?name=Joe&color=g'] = PAGE
+        self.sel.find_element_by_css_selector('form').submit()
+        assert self.sel.current_url.endswith('/submit/?name=Joe&color=g')
+
+    def test_fill_form(self):
+        """ Filling in a form should take a single command once all the
+        fields are present """
+        self.sel.pages[self.live_server_url + '/submit/?name=Joe&color=g'] = PAGE
+        del self.sel.browser.history[:]
+        self.perform([('set', 'input[name="name"]', 'Joe'),
+                      ('set', 'select', 'Green'),
+                      ('click', 'input[name="name"]')])
+        commands = [command for command in self.sel.browser.history
+                    if command != Command.SCREENSHOT]
+        assert commands == [Command.EXECUTE_SCRIPT]
+        assert self.sel.query('input').value == 'Joe'
+        self.fill_form({'input[name="name"]': 'Ann'})
+        assert self.sel.query('input').value == 'Ann'
+        self.sel.find_element_by_css_selector('form').submit()
+        assert self.sel.current_url.endswith('/submit/?name=Ann&color=g')
+
+    def test_fill_form_values(self):
+        """ Non-string values should match select options by their string
+        form, and an OrderedDict's fields should be filled in order """
+        option = self.sel.query('select').append(FakeElement('option', {'value': '3'}))
+        option.append('Three')
+        self.fill_form(OrderedDict([('input[name="name"]', 'Joe'),
+                                    ('input[type="text"]', 42),
+                                    ('select', 3)]))
+        assert self.sel.query('input').value == '42'
+        assert self.sel.query('select').get_attribute('value') == '3'
+
+    def test_fill_form_timeout(self):
+        """ Nothing should be done unless all the fields can be found """
+        msg = 'should be present and visible: select, #missing'
+        assert_raises_regexp(TimeoutException, msg, self.fill_form,
+                             [('input[name="name"]', 'Joe'),
+                              ('select', 'Blue'), ('#missing', 'x')])
+        assert self.sel.query('input').value == ''
+
+    def test_console(self):
+        """ Console messages should be buffered by each page and collected
+        in one go """
+        self.sel.log_console('SEVERE', 'Not buffered')
+        with override_settings(SELENIUM_CAPTURE_CONSOLE=True):
+            self.get('/page/')
+        self.assert_no_js_errors()
+        self.sel.log_console('WARNING', 'Deprecated API')
+        self.sel.log_console('SEVERE', 'Uncaught TypeError: x is undefined')
+        del self.sel.browser.history[:]
+        msg = 'The browser logged JavaScript errors:\nSEVERE Uncaught TypeError'
+        assert_raises_regexp(AssertionError, msg, self.assert_no_js_errors)
+        assert self.sel.browser.history.count(Command.EXECUTE_SCRIPT) == 1
+        assert [entry['message'] for entry in self.console_log] == [
+            'Deprecated API', 'Uncaught TypeError: x is undefined']
+        assert self.sel.browser.console == []
+        assert len(self.console_messages()) == 2
+
+    def test_link(self):
+        """ Clicking a link should load the page it refers to """
+        self.sel.pages[self.live_server_url + '/other/'] = '<p id="other">Other</p>'
+        self.click_link_with_text('Other page')
+        self.wait_for_element('#other')
+
+    def test_xpath(self):
+        """ Common XPath expressions should be supported """
+        self.wait_for_xpath('//div[@id="content"]/p[contains(., "welcome")]')
+        self.click_link_with_xpath('//a[normalize-space(.) = "Other page"]')
+
+    def test_condition(self):
+        """ Scripts should be answered by registered handlers """
+        state = {'ready': False}
+        self.sel.register_script('return window.ready;', lambda browser: state['ready'])
+        self.sel.later(0.05, lambda document: state.update(ready=True))
+        self.wait_for_condition('return window.ready;')
+
+    def test_condition_timeout(self):
+        """ Scripts without handlers should fail like undefined variables """
+        msg = '"return no_such_variable" never became true'
+        assert_raises_regexp(TimeoutException, msg, self.wait_for_condition, 'return no_such_variable')
+
+    def test_screenshot(self):
+        """ Screenshots should be saved in the configured directory """
+        screenshot_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(SELENIUM_SCREENSHOT_DIR=screenshot_dir):
+                self.screenshot()
+            path = os.path.join(screenshot_dir, 'test_screenshot_1.png')
+            with open(path, 'rb') as f:
+                assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+        finally:
+            shutil.rmtree(screenshot_dir)
+
+    def test_element_screenshot(self):
+        """ Helpers should screenshot just the element they found if enabled,
+        as long as Pillow is available to crop it """
+        screenshot_dir = tempfile.mkdtemp()
+        message = self.sel.query('.message')
+        message.location = {'x': 100, 'y': 50}
+        message.size = {'width': 200, 'height': 30}
+        try:
+            with override_settings(SELENIUM_SCREENSHOT_DIR=screenshot_dir,
+                                   SELENIUM_SCREENSHOT_ELEMENTS=True,
+                                   SELENIUM_SCREENSHOT_FORMAT='webp'):
+                self.wait_for_element('.message')
+                self.wait_for_element('.hidden-message')
+            screenshots.flush()
+            if screenshots.Image is None:
+                assert [os.path.basename(path) for path in self.screenshots] == [
+                    'test_element_screenshot_1.png',
+                    'test_element_screenshot_2.png']
+                return
+            cropped, hidden = [screenshots.Image.open(path)
+                               for path in self.screenshots]
+            assert (cropped.format, cropped.size) == ('WEBP', (220, 50))
+            assert hidden.size == (1280, 1024)
+        finally:
+            shutil.rmtree(screenshot_dir)
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+from sbo_selenium import SeleniumTestCase, load, metrics
+from sbo_selenium.conf import settings
+
+PAGE = b'<div id="content"><a href="/next/">Next</a></div>'
+
+
+class SiteHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Stands in for the site being load tested """
+
+    def do_GET(self):
+        time.sleep(0.01)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+        self.server.paths.append(self.path)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SiteServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class BrowsingScenario(SeleniumTestCase):
+    """ A user journey replayed by the load tests """
+    __test__ = False  # Only run by TestLoad
+
+    def test_browse(self):
+        self.get('/')
+        self.click_link_with_text('Next')
+        self.wait_for_element('#content')
+
+
+class FailingScenario(SeleniumTestCase):
+    """ A user journey which always fails """
+    __test__ = False  # Only run by TestLoad
+
+    def test_missing(self):
+        self.get('/')
+        self.screenshot()
+        assert False, 'Not there'
+
+
+class TestLoad(SimpleTestCase):
+    """
+    Test cases for running tests as load test scenarios against another site.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests use the fake browser')
+        self.server = SiteServer(('127.0.0.1', 0), SiteHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_run(self):
+        """ Workers should replay the scenarios against the target until the
+        time is up, recording the latency of each step """
+        label = '%s:BrowsingScenario.test_browse' % BrowsingScenario.__module__
+        results = load.run([label], 3, 0.5, self.url)
+        assert 'SELENIUM_LOAD_TARGET' not in os.environ
+        assert results.elapsed >= 0.5
+        scenario = results.scenarios[BrowsingScenario('test_browse').id()]
+        assert scenario.count >= 3
+        assert not results.failures
+        assert set(results.steps) == set(['get', 'click_link_with_text',
+                                          'wait_for_element'])
+        get = results.steps['get']
+        assert get.count == scenario.count
+        assert 0.01 <= get.percentile(50) <= get.percentile(99) <= get.max
+        assert self.server.paths.count('/') == get.count
+        assert self.server.paths.count('/next/') == get.count
+        report = results.report()
+        assert report[0].startswith('3 workers for ')
+        assert [line for line in report if line.startswith('get: %d calls' % get.count)]
+
+    def test_no_test_extras(self):
+        """ Scenarios shouldn't be retried, screenshotted, or measured """
+        screenshot_dir = tempfile.mkdtemp()
+        label = '%s:FailingScenario.test_missing' % FailingScenario.__module__
+        try:
+            with override_settings(SELENIUM_RETRIES=2, SELENIUM_PAGE_METRICS=True,
+                                   SELENIUM_SCREENSHOT_DIR=screenshot_dir):
+                results = load.run([label], 1, 0.2, self.url)
+            assert os.listdir(screenshot_dir) == []
+        finally:
+            shutil.rmtree(screenshot_dir)
+        test_id = FailingScenario('test_missing').id()
+        scenario = results.scenarios[test_id]
+        assert results.failures[test_id] == scenario.count
+        assert results.first_errors[test_id] == 'AssertionError: Not there'
+        assert self.server.paths.count('/') == scenario.count
+        assert '/' not in [url_metrics.url for url_metrics in metrics.run_metrics()]
+
+    def test_histogram(self):
+        """ Percentiles should be estimated to within the bucket width """
+        histogram = load.Histogram()
+        for ms in range(1, 1001):
+            histogram.add(ms / 1000.0)
+        assert histogram.count == 1000
+        for percent in load.PERCENTILES:
+            estimate = histogram.percentile(percent)
+            assert percent / 100.0 <= estimate <= percent / 100.0 * load.BUCKET_GROWTH
+        assert histogram.percentile(100) == 1.0
@@ -0,0 +1,49 @@
+import os
+from unittest import SkipTest
+
+from django.contrib.auth.models import User
+from nose.tools import assert_raises
+from selenium.common.exceptions import WebDriverException
+
+from sbo_selenium import SeleniumTestCase
+from sbo_selenium.conf import settings
+
+
+class TestLogin(SeleniumTestCase):
+    """
+    Test cases for logging in by setting the session cookie.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests use the fake browser')
+        super(TestLogin, self).setUp()
+        self.user = User.objects.create_user('tester', 'tester@example.com', 'secret')
+
+    def test_login(self):
+        """ Pages should be loaded as the user after logging in, without
+        visiting a login page """
+        assert self.sel.current_url == 'about:blank'
+        self.login(self.user)
+        self.get('/whoami/')
+        assert self.sel.find_element_by_id('user').text == 'tester'
+        paths = [record.path for record in self._requests()[1]]
+        assert paths == ['/favicon.ico', '/whoami/']
+
+    def test_same_page(self):
+        """ No extra page should be loaded if one from the live server
+        already is """
+        self.get('/whoami/')
+        assert self.sel.find_element_by_id('user').text == ''
+        self.login(self.user)
+        self.sel.refresh()
+        assert self.sel.find_element_by_id('user').text == 'tester'
+        assert self.sel.get_cookie('sessionid') is not None
+        self.sel.delete_all_cookies()
+        assert self.sel.get_cookies() == []
+
+    def test_other_domain(self):
+        """ Cookies for other domains should be rejected """
+        self.get('/whoami/')
+        cookie = {'name': 'tracker', 'value': '1', 'domain': 'example.com'}
+        assert_raises(WebDriverException, self.sel.add_cookie, cookie)
@@ -0,0 +1,80 @@
+import os
+import unittest
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import SeleniumTestCase, memory
+from sbo_selenium.conf import settings
+
+
+class Leak(object):
+    """ Objects deliberately kept alive to show up as allocation growth """
+
+
+class TrackedTest(SeleniumTestCase):
+    """ A test whose memory usage is tracked """
+    __test__ = False  # Only run by TestMemory
+
+    def test_page(self):
+        self.get('/good_accessibility/')
+
+
+class TestMemory(SimpleTestCase):
+    """
+    Test cases for tracking memory usage across a test run.
+    """
+
+    def setUp(self):
+        memory.stop()
+
+    def tearDown(self):
+        memory.stop()
+
+    def test_rss(self):
+        """ The resident memory of this process should be measurable """
+        size = memory.rss()
+        assert size > 1024 * 1024
+        assert memory.rss(os.getpid()) > 0
+        assert memory.tree_rss(os.getpid()) >= size / 2
+        assert memory.tree_rss(999999999) is None
+
+    def test_report(self):
+        """ The largest growth should be reported, largest first """
+        assert memory.report() == []
+        memory.start()
+        leaks = [Leak() for _i in range(500)]
+        memory.record_test('a.B.test_c', 0, 5 * 1048576, {'main': 200 * 1048576})
+        memory.record_test('a.B.test_d', 0, 1048576, {'main': None})
+        memory.record_test('a.B.test_e', 1048576, 0, {})
+        memory.record_request('/page/?q=1', 0, 2 * 1048576)
+        memory.record_request('/page/?q=2', 0, 1048576)
+        lines = memory.report()
+        assert lines[0].startswith('Test process: ')
+        start = lines.index('Largest growth during a test:')
+        assert lines[start + 1:start + 3] == ['  a.B.test_c: +5.0 MiB',
+                                              '  a.B.test_d: +1.0 MiB']
+        assert '  /page/: +3.0 MiB over 2 requests' in lines
+        assert '  a.B.test_c (main): 200.0 MiB' in lines
+        assert 'Largest growth in Python allocations:' in lines
+        if memory.tracemalloc is None:
+            assert [line for line in lines if line.startswith('  Leak: +5')]
+        del leaks
+
+    def test_tests_and_requests(self):
+        """ Tests and live server requests should be tracked if enabled """
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('This test uses the fake browser')
+        TrackedTest.setUpClass()
+        try:
+            with override_settings(SELENIUM_TRACK_MEMORY=True):
+                test = TrackedTest('test_page')
+                result = unittest.TestResult()
+                test(result)
+        finally:
+            TrackedTest.tearDownClass()
+        assert result.wasSuccessful(), result.errors
+        assert memory.started()
+        assert test.id() in memory._state['tests']
+        assert memory._state['requests']['/good_accessibility/'][0] == 1
@@ -0,0 +1,90 @@
+import gc
+import os
+import threading
+from unittest import SkipTest
+import weakref
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from nose.tools import assert_raises
+
+from sbo_selenium import SeleniumTestCase, pool
+from sbo_selenium.conf import settings
+from sbo_selenium.pool import DriverPool
+from sbo_selenium.testcase import PooledLaunch
+
+
+class Driver(object):
+    """ Minimal stand-in for a WebDriver """
+
+    def __init__(self):
+        self.quit_called = threading.Event()
+
+    def quit(self):
+        self.quit_called.set()
+
+
+class PooledTest(SeleniumTestCase):
+    """ A test which gets its browsers from the pool """
+    __test__ = False  # Only run by TestDriverPool
+    firefox_profile_name = 'pooled'
+
+    def get_firefox_profile(self):
+        return self.firefox_profile_name
+
+    def test_page(self):
+        pass
+
+
+class TestDriverPool(SimpleTestCase):
+    """
+    Test cases for the pool of browsers launched in the background.
+    """
+
+    def test_fresh_drivers(self):
+        """ Each acquired driver should be a new one """
+        pool = DriverPool(Driver, 2)
+        drivers = [pool.acquire() for _i in range(5)]
+        assert len(set(drivers)) == 5
+        pool.close()
+
+    def test_release(self):
+        """ Released drivers should be shut down """
+        pool = DriverPool(Driver, 1)
+        driver = pool.acquire()
+        pool.release(driver)
+        assert driver.quit_called.wait(5)
+        pool.close()
+
+    def test_launch_error(self):
+        """ Errors launching a browser should be raised on acquisition """
+        def factory():
+            raise ValueError('No browser')
+        pool = DriverPool(factory, 1)
+        assert_raises(ValueError, pool.acquire)
+        pool.close()
+
+    def test_launch_from_class(self):
+        """ Pooled browsers should be launched from the test class, without
+        keeping the test which created the pool alive """
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('This test uses the fake browser')
+        PooledTest.setUpClass()
+        try:
+            test = PooledTest('test_page')
+            test.browser = 'fake'
+            with override_settings(SELENIUM_DRIVER_POOL_SIZE=1):
+                driver_pool = test.get_driver_pool()
+            reference = weakref.ref(test)
+            del test
+            gc.collect()
+            assert reference() is None
+            driver = driver_pool.acquire()
+            assert driver.title is not None
+            driver_pool.release(driver)
+            launch = PooledLaunch(PooledTest, 'http://localhost:8081')
+            assert launch.get_firefox_profile() == 'pooled'
+        finally:
+            pool.close_pools()
+            PooledTest.tearDownClass()
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import processes
+from sbo_selenium.management.commands.selenium import Command
+
+
+class TestProcesses(SimpleTestCase):
+    """
+    Test cases for tracking and cleaning up the processes started by a test
+    run.
+    """
+
+    def setUp(self):
+        self.pid_dir = tempfile.mkdtemp()
+        self.override = override_settings(SELENIUM_PID_DIR=self.pid_dir)
+        self.override.enable()
+        self.started = []
+
+    def tearDown(self):
+        for process in self.started:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        self.override.disable()
+        shutil.rmtree(self.pid_dir)
+
+    def start(self, command='sleep 30 & sleep 30'):
+        """ Start a shell which has a child process of its own """
+        process = subprocess.Popen(['sh', '-c', command])
+        self.started.append(process)
+        return process
+
+    def test_cleanup(self):
+        """ Processes registered by the run should be killed with their
+        children """
+        process = self.start()
+        processes.register(process.pid, 'shell')
+        children = []
+        while not children:
+            children = processes.descendants(process.pid)
+        processes.cleanup()
+        assert process.poll() is not None
+        assert not any(processes.running(child) for child in children)
+        assert processes.registered() == []
+
+    def test_orphans(self):
+        """ Only processes belonging to runs which have ended should be
+        cleaned up as orphans """
+        finished_run = subprocess.Popen(['true'])
+        finished_run.wait()
+        orphan = self.start()
+        processes.register(orphan.pid, 'orphan')
+        path = processes.pid_file(orphan.pid)
+        with open(path) as f:
+            data = json.load(f)
+        data['run'] = finished_run.pid
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        current = self.start()
+        processes.register(current.pid, 'current')
+        processes.cleanup_orphans()
+        assert orphan.poll() is not None
+        assert current.poll() is None
+        assert [data['name'] for data in processes.registered()] == ['current']
+
+    def test_reused_pid(self):
+        """ A process should not be killed if its PID has been reused """
+        process = self.start()
+        processes.register(process.pid, 'shell')
+        path = processes.pid_file(process.pid)
+        with open(path) as f:
+            data = json.load(f)
+        data['started'] = 'earlier'
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        processes.cleanup()
+        assert process.poll() is None
+        assert not os.path.exists(path)
+
+    def test_live_server_ports(self):
+        """ The command should find unused ports for the live server """
+        with override_settings(DJANGO_LIVE_TEST_SERVER_ADDRESS='localhost:9090',
+                               SELENIUM_LIVE_SERVER_PORTS=3):
+            address = Command.live_server_address()
+        host, ports = address.split(':')
+        assert host == 'localhost'
+        assert len(set(ports.split(','))) == 3
+        with override_settings(DJANGO_LIVE_TEST_SERVER_ADDRESS='localhost:9090'):
+            assert Command.live_server_address() == 'localhost:9090'
@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from selenium.webdriver.remote.command import Command
+
+from sbo_selenium import SeleniumTestCase, drivers, profile_templates, server
+from sbo_selenium.conf import settings
+
+
+class TestProfileTemplates(SeleniumTestCase):
+    """
+    Test cases for starting browsers with copies of a warmed-up profile.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests use the fake browser')
+        self.directory = tempfile.mkdtemp()
+        self.override = override_settings(
+            SELENIUM_PROFILE_TEMPLATE_URLS=['/good_accessibility/'],
+            SELENIUM_PROFILE_TEMPLATE_DIR=self.directory)
+        self.override.enable()
+        profile_templates._templates.clear()
+        super(TestProfileTemplates, self).setUp()
+
+    def tearDown(self):
+        super(TestProfileTemplates, self).tearDown()
+        self.override.disable()
+        profile_templates._templates.clear()
+        shutil.rmtree(self.directory)
+
+    def test_warm_cache(self):
+        """ Each browser should start with a copy of the warmed-up profile,
+        so pages in it are loaded from the cache """
+        template = profile_templates._templates[('fake', '')]
+        copy = self.sel.browser.user_data_dir
+        assert copy != template
+        assert os.listdir(os.path.join(template, 'Cache')) == \
+            os.listdir(os.path.join(copy, 'Cache'))
+        server.set_current_test(self.id())
+        self.get('/good_accessibility/')
+        assert self.sel.title == 'Example of good (or rather trivial) accessibility'
+        assert server.get_timeline()[1] == []
+
+    def test_isolation(self):
+        """ Changes to a browser's profile shouldn't affect the template or
+        other browsers, and its copy should be deleted when it quits """
+        template = profile_templates._templates[('fake', '')]
+        self.get('/queries/0/')
+        other = drivers.create_driver('fake', self)
+        try:
+            assert len(os.listdir(os.path.join(self.sel.browser.user_data_dir, 'Cache'))) == 2
+            assert len(os.listdir(os.path.join(template, 'Cache'))) == 1
+            assert len(os.listdir(os.path.join(other.browser.user_data_dir, 'Cache'))) == 1
+        finally:
+            other.quit()
+        assert not os.path.exists(other.browser.user_data_dir)
+
+
+class WarmUpDriver(object):
+    """ Stands in for a browser visiting the warm-up URLs slowly """
+
+    def __init__(self, test, profile, proxy=None):
+        self.profile = profile
+        test.launched.append(self)
+
+    def get(self, url):
+        time.sleep(0.2)
+
+    def quit(self):
+        pass
+
+
+class FirefoxProcess(object):
+    """ Stands in for a Firefox process, which exits once asked to quit """
+
+    def __init__(self):
+        self.exited = False
+
+    def poll(self):
+        return 0 if self.exited else None
+
+
+class FirefoxBinary(object):
+
+    def __init__(self):
+        self.process = FirefoxProcess()
+
+    def kill(self):
+        self.process.exited = True
+
+
+class FirefoxDriver(WarmUpDriver):
+    """ Stands in for Firefox running with a temporary copy of its profile,
+    which only finishes writing its cache index as it exits """
+
+    def __init__(self, test, profile, proxy=None):
+        super(FirefoxDriver, self).__init__(test, profile, proxy)
+        self.firefox_profile = type('FirefoxProfile', (object,), {})()
+        self.firefox_profile.tempfolder = tempfile.mkdtemp()
+        self.firefox_profile.path = os.path.join(self.firefox_profile.tempfolder,
+                                                 'profile')
+        shutil.copytree(profile.user_data_dir, self.firefox_profile.path)
+        self.binary = FirefoxBinary()
+
+    def get(self, url):
+        with open(os.path.join(self.firefox_profile.path, 'cache'), 'w') as f:
+            f.write(url)
+
+    def execute(self, command):
+        assert command == Command.QUIT
+        with open(os.path.join(self.firefox_profile.path, 'index'), 'w') as f:
+            f.write('complete')
+        self.binary.process.exited = True
+
+
+class TestBuildingTemplates(SimpleTestCase):
+    """
+    Test cases for building profile templates, using stand-in browsers.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.override = override_settings(
+            SELENIUM_PROFILE_TEMPLATE_URLS=['/good_accessibility/'],
+            SELENIUM_PROFILE_TEMPLATE_DIR=self.directory)
+        self.override.enable()
+        profile_templates._templates.clear()
+        self.launched = []
+        self.live_server_url = 'http://localhost:8081'
+
+    def tearDown(self):
+        self.override.disable()
+        profile_templates._templates.clear()
+        shutil.rmtree(self.directory)
+
+    def get_templates(self, names):
+        """ Get the templates for the named launch profiles at once, one
+        thread each """
+        paths = {}
+
+        def get(name):
+            paths[name] = profile_templates.get_template(
+                'chrome', self, drivers.BrowserProfile(name), WarmUpDriver)
+
+        threads = [threading.Thread(target=get, args=(name,)) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return paths
+
+    def test_concurrent_builds(self):
+        """ Different templates should be built at the same time, and each
+        one only once """
+        start = time.time()
+        paths = self.get_templates(['ci', 'debug', 'ci', 'debug'])
+        assert time.time() - start < 0.35
+        assert sorted(driver.profile.name for driver in self.launched) == ['ci', 'debug']
+        assert paths['ci'] != paths['debug']
+        assert profile_templates._building == {}
+
+    def test_firefox_template(self):
+        """ Firefox's profile should be saved once the browser has exited """
+        path = profile_templates.get_template(
+            'firefox', self, drivers.BrowserProfile(), FirefoxDriver)
+        assert sorted(os.listdir(path)) == ['cache', 'index']
+        with open(os.path.join(path, 'index')) as f:
+            assert f.read() == 'complete'
+        assert not os.path.exists(self.launched[0].firefox_profile.tempfolder)
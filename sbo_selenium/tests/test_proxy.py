@@ -0,0 +1,169 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+from django.utils.six.moves import BaseHTTPServer, socketserver
+from django.utils.six.moves.urllib.request import build_opener, ProxyHandler
+
+from sbo_selenium.fake import FakeWebDriver
+from sbo_selenium.proxy import BLANK_GIF, CachingProxy
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'proxy_cache')
+
+
+class UpstreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Answers every request with its path """
+
+    def do_GET(self):
+        content = ('<p id="path">%s</p>' % self.path).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class EchoHandler(socketserver.BaseRequestHandler):
+    """ Stands in for an HTTPS server, sending back whatever it receives """
+
+    def handle(self):
+        while True:
+            data = self.request.recv(1024)
+            if not data:
+                return
+            self.request.sendall(data)
+
+
+class TestCachingProxy(SimpleTestCase):
+    """
+    Test cases for the local caching proxy, using a fixture directory as the
+    cache and a local server as the upstream host.
+    """
+
+    def setUp(self):
+        self.upstream = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), UpstreamHandler)
+        self.upstream_port = self.upstream.server_address[1]
+        thread = threading.Thread(target=self.upstream.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.proxies = []
+
+    def tearDown(self):
+        for proxy in self.proxies:
+            proxy.stop()
+        self.upstream.shutdown()
+        self.upstream.server_close()
+
+    def start_proxy(self, **kwargs):
+        proxy = CachingProxy(**kwargs)
+        self.proxies.append(proxy)
+        self.opener = build_opener(ProxyHandler({'http': 'http://%s' % proxy.address}))
+        return proxy
+
+    def fetch(self, url):
+        response = self.opener.open(url, timeout=5)
+        return response.getcode(), response.info().get('Content-Type'), response.read()
+
+    def test_cached(self):
+        """ Resources of allowed hosts should be served from the cache """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=['.example.com'],
+                                 fetch_missing=False)
+        status, content_type, content = self.fetch('http://cdn.example.com/js/lib.js')
+        assert status == 200
+        assert content_type.endswith('javascript')
+        assert content == b'window.cachedLibrary = true;\n'
+        assert proxy.stats['cached'] == 1
+
+    def test_stubbed(self):
+        """ Other third-party requests should get canned responses """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=['cdn.example.com'],
+                                 fetch_missing=False)
+        assert self.fetch('http://tracker.example.net/pixel.gif') == (200, 'image/gif', BLANK_GIF)
+        assert self.fetch('http://tracker.example.net/collect')[0] == 204
+        # Not in the cache, and it isn't allowed to fetch it
+        assert self.fetch('http://cdn.example.com/missing.js') == (200, 'application/javascript', b'')
+        assert proxy.stats['stubbed'] == 3
+        assert proxy.stats['missed'] == 1
+
+    def test_direct(self):
+        """ Requests to the live server should pass straight through """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=[])
+        url = 'http://localhost:%d/page/?q=1' % self.upstream_port
+        assert self.fetch(url)[2] == b'<p id="path">/page/?q=1</p>'
+        assert proxy.stats['direct'] == 1
+
+    def connect(self, proxy, target):
+        """ Send a CONNECT request for the target host and port to the
+        proxy, returning the socket and the response headers """
+        host, port = proxy.address.split(':')
+        client = socket.create_connection((host, int(port)), timeout=5)
+        client.sendall(('CONNECT %s HTTP/1.1\r\n\r\n' % target).encode('ascii'))
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            data = client.recv(1)
+            if not data:
+                break
+            response += data
+        return client, response
+
+    def test_connect_refused(self):
+        """ HTTPS requests should be refused right away by default """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=['.example.com'])
+        client, response = self.connect(proxy, 'cdn.example.com:443')
+        client.close()
+        assert response.startswith(b'HTTP/1.0 403 ')
+        assert proxy.stats['refused'] == 1
+
+    def test_connect(self):
+        """ HTTPS requests to the opted-in hosts should be tunnelled to the
+        real host """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=[],
+                                 tunnel_hosts=['127.0.0.1'])
+        echo = socketserver.ThreadingTCPServer(('127.0.0.1', 0), EchoHandler)
+        echo.daemon_threads = True
+        thread = threading.Thread(target=echo.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        client, response = self.connect(proxy, '127.0.0.1:%d' % echo.server_address[1])
+        try:
+            assert response.startswith(b'HTTP/1.0 200 ')
+            client.sendall(b'\x16\x03\x01 hello')
+            assert client.recv(1024) == b'\x16\x03\x01 hello'
+            assert proxy.stats['tunneled'] == 1
+        finally:
+            client.close()
+            echo.shutdown()
+            echo.server_close()
+
+    def test_fetch_missing(self):
+        """ Resources missing from the cache should be fetched and saved """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            proxy = self.start_proxy(cache_dir=cache_dir, cache_hosts=['127.0.0.1'])
+            url = 'http://127.0.0.1:%d/static/app.js' % self.upstream_port
+            expected = b'<p id="path">/static/app.js</p>'
+            assert self.fetch(url)[2] == expected
+            assert self.fetch(url)[2] == expected
+            assert proxy.stats['fetched'] == 1
+            assert proxy.stats['cached'] == 2
+            with open(os.path.join(cache_dir, '127.0.0.1', 'static', 'app.js'), 'rb') as f:
+                assert f.read() == expected
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_browser(self):
+        """ Browsers should load pages via the proxy """
+        proxy = self.start_proxy(cache_dir=CACHE_DIR, cache_hosts=['cdn.example.com'])
+        driver = FakeWebDriver(proxy=proxy.address)
+        try:
+            driver.get('http://ads.example.org/banner.html')
+            assert driver.find_elements_by_css_selector('body') != []
+            assert proxy.stats['stubbed'] == 1
+        finally:
+            driver.quit()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import SkipTest
+from xml.etree import ElementTree
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import SeleniumTestCase, results
+from sbo_selenium.conf import settings
+
+
+class ReportedTest(SeleniumTestCase):
+    """ Tests whose results are written to the results files """
+    __test__ = False  # Only run by TestResults
+
+    def test_pass(self):
+        pass
+
+    def test_fail(self):
+        assert False, 'Broken'
+
+    def test_skip(self):
+        self.skipTest('Not today')
+
+
+class TestResults(SimpleTestCase):
+    """
+    Test cases for the streaming test result files.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests use the fake browser')
+        self.directory = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.directory, 'results.jsonl')
+        self.junit_path = os.path.join(self.directory, 'junit.xml')
+        self.override = override_settings(
+            SELENIUM_RESULTS_JSON=self.json_path,
+            SELENIUM_JUNIT_XML=self.junit_path,
+            SELENIUM_SCREENSHOT_DIR=self.directory)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory)
+
+    def run_reported(self, name):
+        result = unittest.TestResult()
+        ReportedTest(name)(result)
+        return result
+
+    def test_streaming(self):
+        """ Each result should be written as soon as the test finishes """
+        self.run_reported('test_pass')
+        records = results.read(self.json_path)
+        assert len(records) == 1
+        assert records[0]['name'] == 'test_pass'
+        assert records[0]['outcome'] == 'pass'
+        assert records[0]['browser'] == 'fake'
+        assert records[0]['duration'] > 0
+        assert records[0]['run'] == results.run_id()
+        assert len(results.run_id()) == 32
+        assert not os.path.exists(self.junit_path)
+        self.run_reported('test_fail')
+        self.run_reported('test_skip')
+        records = results.read(self.json_path)
+        assert [record['outcome'] for record in records] == ['pass', 'failure', 'skip']
+        failure = records[1]
+        assert failure['message'] == 'Broken'
+        assert len(failure['screenshots']) == 1
+        assert os.path.exists(failure['screenshots'][0])
+        results.write_report()
+        suite = ElementTree.parse(self.junit_path).getroot()
+        assert (suite.get('tests'), suite.get('failures'), suite.get('skipped')) == ('3', '1', '1')
+        case = suite.findall('testcase')[1]
+        assert case.get('name') == 'test_fail'
+        assert case.find('failure').get('message') == 'Broken'
+        assert '[[ATTACHMENT|%s]]' % failure['screenshots'][0] in case.find('system-out').text
+
+    def test_merge(self):
+        """ Results written concurrently should all be kept intact, and only
+        the current run's should be in the JUnit report """
+        record = {'id': 'a.B.test_c', 'classname': 'a.B', 'name': 'test_c',
+                  'outcome': 'pass', 'duration': 0.5, 'browser': 'fake',
+                  'run': 'earlier-run'}
+        results.write(record)
+        record['run'] = results.run_id()
+
+        def write_some():
+            for _i in range(25):
+                results.write(record)
+
+        threads = [threading.Thread(target=write_some) for _i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results.read(self.json_path)) == 101
+        results.write_report()
+        suite = ElementTree.parse(self.junit_path).getroot()
+        assert suite.get('tests') == '100'
+
+    def test_report_offset(self):
+        """ Only the results written since the run started should be read
+        for the JUnit report """
+        self.run_reported('test_pass')
+        offset = results.size()
+        self.run_reported('test_fail')
+        results.write_report(offset)
+        suite = ElementTree.parse(self.junit_path).getroot()
+        assert [case.get('name') for case in suite.findall('testcase')] == ['test_fail']
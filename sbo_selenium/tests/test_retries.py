@@ -0,0 +1,68 @@
+import os
+import unittest
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import SeleniumTestCase, retries
+from sbo_selenium.conf import settings
+
+
+class FlakyTest(SeleniumTestCase):
+    """ Fails until it has been run a given number of times """
+    __test__ = False  # Only run by TestRetries
+    failures = 1
+
+    def test_flaky(self):
+        type(self).drivers.append(self.sel)
+        assert len(type(self).drivers) > self.failures, 'Not yet'
+
+
+class TestRetries(SimpleTestCase):
+    """
+    Test cases for re-running failed Selenium tests.
+    """
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('These tests use the fake browser')
+        FlakyTest.drivers = []
+        retries.clear()
+
+    def tearDown(self):
+        # Keep these attempts out of the real test run's report
+        retries.clear()
+
+    def run_flaky(self, failures, retry_count):
+        FlakyTest.failures = failures
+        test = FlakyTest('test_flaky')
+        result = unittest.TestResult()
+        with override_settings(SELENIUM_RETRIES=retry_count):
+            test(result)
+        return test.id(), result
+
+    def test_passes_on_retry(self):
+        """ A test which passes when retried should be reported as passing,
+        using a new browser for each attempt """
+        test_id, result = self.run_flaky(failures=2, retry_count=2)
+        assert result.wasSuccessful()
+        assert result.testsRun == 1
+        assert len(FlakyTest.drivers) == 3
+        assert len(set(id(driver) for driver in FlakyTest.drivers)) == 3
+        assert retries.attempts()[test_id] == ['failure', 'failure', 'pass']
+        assert '%s: 2 of 3 attempts failed (67%%), flaky' % test_id in retries.report()
+
+    def test_fails_every_time(self):
+        """ Only the last failure should be reported if every attempt fails """
+        _test_id, result = self.run_flaky(failures=5, retry_count=1)
+        assert len(FlakyTest.drivers) == 2
+        assert result.testsRun == 1
+        assert len(result.failures) == 1
+        assert 'Not yet' in result.failures[0][1]
+
+    def test_no_retries(self):
+        """ Tests should only be run once by default """
+        _test_id, result = self.run_flaky(failures=1, retry_count=0)
+        assert len(FlakyTest.drivers) == 1
+        assert len(result.failures) == 1
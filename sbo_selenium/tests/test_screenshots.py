@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+
+from sbo_selenium import screenshots
+from sbo_selenium.fake import _png
+
+
+class TestScreenshots(SimpleTestCase):
+    """
+    Test cases for compact screenshot encoding and element cropping.
+    """
+
+    def test_crop_box(self):
+        """ Element boxes should be converted to device pixels, with a margin,
+        for both viewport and whole page screenshots """
+        box = [100, 50, 200, 30, 0, 500, 1280, 1024, 2]
+        assert screenshots.crop_box((2560, 2048), box) == (180, 80, 620, 180)
+        assert screenshots.crop_box((2560, 6000), box) == (180, 1080, 620, 1180)
+        box = [-5, 1000, 200, 100, 0, 0, 1280, 1024, 1]
+        assert screenshots.crop_box((1280, 1024), box) == (0, 990, 205, 1024)
+        box = [0, 2000, 200, 100, 0, 0, 1280, 1024, 1]
+        assert screenshots.crop_box((1280, 1024), box) is None
+        box = [0, 0, 0, 0, 0, 0, 1280, 1024, 1]
+        assert screenshots.crop_box((1280, 1024), box) is None
+
+    def test_encode(self):
+        """ Screenshots should be cropped, downscaled, and re-encoded in the
+        background """
+        if screenshots.Image is None:
+            raise SkipTest('Encoding screenshots requires Pillow')
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'screenshot.jpg')
+            box = [100, 50, 200, 30, 0, 0, 1280, 1024, 1]
+            screenshots.get_encoder().put(_png(1280, 1024), path,
+                                          ('jpeg', 50, 0.5, True), box)
+            screenshots.flush()
+            image = screenshots.Image.open(path)
+            assert (image.format, image.mode, image.size) == ('JPEG', 'L', (110, 25))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_shared_encoder(self):
+        """ Tests running in several threads should share one encoder """
+        encoders = []
+        threads = [threading.Thread(target=lambda: encoders.append(screenshots.get_encoder()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(encoders) == 8
+        assert all(encoder is screenshots.encoder for encoder in encoders)
@@ -0,0 +1,111 @@
+import logging
+import threading
+
+from django.db import connections
+from django.test import SimpleTestCase
+
+from sbo_selenium import server
+from sbo_selenium.server import LoggingStream, LogQueue
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestServerLogging(SimpleTestCase):
+    """
+    Test cases for the live server's background logging.
+    """
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        server.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        server.logger.removeHandler(self.handler)
+
+    def messages(self):
+        return [record.getMessage() for record in self.handler.records]
+
+    def test_partial_lines(self):
+        """ Stream output should be logged one complete line at a time """
+        stream = LoggingStream()
+        stream.write('Traceback')
+        stream.write(' (most recent call last):\n  File "x.py"')
+        stream.write(', line 1\nError\n')
+        server.get_log_queue().flush()
+        assert self.messages() == ['Traceback (most recent call last):',
+                                   '  File "x.py", line 1', 'Error']
+
+    def test_structured_record(self):
+        """ Request fields should be available as log record attributes """
+        log = LogQueue(10)
+        log.start()
+        record = server.RequestRecord('GET', '/page/', '200', 512, 0, 0.25, 1,
+                                      'tests.Test.test_page')
+        log.put(logging.INFO, 'request', extra=record.as_dict())
+        log.stop()
+        logged = self.handler.records[0]
+        assert logged.path == '/page/'
+        assert logged.duration == 0.25
+        assert logged.test_id == 'tests.Test.test_page'
+
+    def test_full_queue(self):
+        """ Messages which don't fit in the queue should be dropped """
+        log = LogQueue(2)
+        for i in range(5):
+            log.put(logging.INFO, 'message %d', (i,))
+        assert log.dropped == 3
+        log.start()
+        log.stop()
+        assert self.messages() == ['message 0', 'message 1',
+                                   '3 live server log messages were dropped']
+
+    def test_waterfall(self):
+        """ The waterfall should list the slowest requests first """
+        records = [
+            server.RequestRecord('GET', '/page/', '200', 512, 10.0, 0.1, 1, None),
+            server.RequestRecord('GET', '/app.js', '200', 2048, 10.1, 0.3, 2, None),
+            server.RequestRecord('GET', '/app.css', '304', 0, 10.1, 0.05, 2, None),
+        ]
+        lines = server.waterfall(records, 10.0, count=2, width=8).split('\n')
+        assert lines[0] == 'Slowest 2 of 3 requests to the live server:'
+        assert lines[1].endswith('/app.js')
+        assert '|  ######|' in lines[1]
+        assert lines[2].endswith('/page/')
+        assert '|##      |' in lines[2]
+
+    def test_query_counter_threads(self):
+        """ Only the counting thread's queries should be counted, even on a
+        connection shared with another thread """
+        shared = connections['default']
+        shared.allow_thread_sharing = True
+        counter = server.QueryCounter()
+        started = threading.Event()
+        queried = threading.Event()
+
+        def handle():
+            counter.start()
+            started.set()
+            queried.wait(5)
+            shared.cursor().execute('SELECT 1')
+            counter.stop()
+
+        thread = threading.Thread(target=handle)
+        thread.start()
+        try:
+            started.wait(5)
+            for _i in range(3):
+                shared.cursor().execute('SELECT 1')
+            queried.set()
+            thread.join()
+        finally:
+            shared.allow_thread_sharing = False
+        assert counter.count == 1
+        assert counter.time >= 0
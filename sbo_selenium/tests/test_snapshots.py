@@ -0,0 +1,77 @@
+import os
+from unittest import SkipTest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.creation import BaseDatabaseCreation
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from sbo_selenium import SeleniumTestCase, snapshots
+from sbo_selenium.conf import settings
+
+FIXTURES = ('snapshot_users.json',)
+
+
+@override_settings(SELENIUM_DATABASE_SNAPSHOTS=True)
+class TestDatabaseSnapshots(SeleniumTestCase):
+    """
+    Test cases for resetting the database between tests via snapshots.  Each
+    test changes the data, so whichever runs second checks that the changes
+    made by the first were undone.
+    """
+    fixtures = FIXTURES
+
+    def setUp(self):
+        if os.getenv('SELENIUM_BROWSER', settings.SELENIUM_DEFAULT_BROWSER) != 'fake':
+            raise SkipTest('No need to launch a real browser for these tests')
+        super(TestDatabaseSnapshots, self).setUp()
+
+    def assert_fixture_data(self):
+        assert snapshots.get('default', FIXTURES) is not None
+        usernames = list(User.objects.order_by('pk').values_list('username', flat=True))
+        assert usernames == ['alice', 'bob']
+
+    def test_delete(self):
+        """ Deleted rows should be restored for the next test """
+        self.assert_fixture_data()
+        User.objects.filter(username='alice').delete()
+
+    def test_insert_and_update(self):
+        """ Added and changed rows should be reverted for the next test """
+        self.assert_fixture_data()
+        User.objects.create(username='carol')
+        User.objects.filter(username='bob').update(email='robert@example.com')
+
+    def test_clean_snapshot(self):
+        """ The database should be emptied after each test """
+        self.assert_fixture_data()
+        snapshots.get('default', None).restore()
+        assert not User.objects.exists()
+        assert self._use_snapshots
+
+
+class TestSnapshotCleanup(TransactionTestCase):
+    """
+    Test cases for deleting the snapshots at the end of the test run.
+    """
+
+    def snapshot_tables(self):
+        cursor = connection.cursor()
+        snapshots.SQLiteSnapshot.attach(cursor)
+        cursor.execute("SELECT name FROM %s.sqlite_master WHERE type = 'table'"
+                       % snapshots.SQLiteSnapshot.schema)
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_deleted_before_teardown(self):
+        """ Every snapshot of a database should be deleted before its test
+        database is destroyed """
+        if connection.vendor != 'sqlite':
+            raise SkipTest('This test inspects the SQLite snapshot tables')
+        snapshot = snapshots.save('default', ('cleanup.json',))
+        prefix = 's%d_' % snapshot.number
+        assert [name for name in self.snapshot_tables() if name.startswith(prefix)]
+        assert getattr(BaseDatabaseCreation.destroy_test_db, 'deletes_snapshots', False)
+        snapshots.clear('default')
+        assert snapshots.get('default', ('cleanup.json',)) is None
+        assert self.snapshot_tables() == []
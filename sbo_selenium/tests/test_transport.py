@@ -0,0 +1,170 @@
+import json
+import socket
+import threading
+import time
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.utils.six.moves import BaseHTTPServer, http_client, socketserver
+from nose.tools import assert_raises
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+from sbo_selenium import transport
+
+
+class GridHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Answers just enough of the WebDriver wire protocol to run a session,
+    over persistent connections """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+        self.server.sockets.append(self.connection)
+
+    def respond(self, value, status=0):
+        content = json.dumps({'sessionId': 'grid-session', 'status': status,
+                              'value': value}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def drop(self):
+        """ Close the connection without answering, if the test asked for
+        that to happen to the next request """
+        if not self.server.drop_next:
+            return False
+        self.server.drop_next = False
+        self.close_connection = 1
+        return True
+
+    def do_GET(self):
+        if self.drop():
+            return
+        if self.path.endswith('/title'):
+            self.respond('Fake grid')
+        else:
+            self.respond(None, status=9)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if self.path.endswith('/click'):
+            self.server.clicks += 1
+            if self.drop():
+                return
+            time.sleep(0.5)
+        self.respond({'browserName': 'grid'})
+
+    def do_DELETE(self):
+        self.respond(None)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GridServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+    clicks = 0
+    drop_next = False
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.sockets = []
+
+    def close_connections(self):
+        """ Close the open connections from the server's end """
+        for connection in self.sockets:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+@override_settings(SELENIUM_REMOTE_POOL_SIZE=2, SELENIUM_REMOTE_TIMEOUT=5)
+class TestPooledTransport(SimpleTestCase):
+    """
+    Test cases for the keep-alive transport for remote WebDriver sessions,
+    using a local fake grid server.
+    """
+
+    def setUp(self):
+        self.server = GridServer(('127.0.0.1', 0), GridHandler)
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/wd/hub' % self.server.server_address[1]
+        transport.close_pools()
+        transport.command_stats.clear()
+
+    def tearDown(self):
+        transport.close_pools()
+        transport.command_stats.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def driver(self):
+        executor = transport.command_executor(self.url)
+        assert isinstance(executor, transport.PooledRemoteConnection)
+        return RemoteWebDriver(command_executor=executor,
+                               desired_capabilities={'browserName': 'grid'})
+
+    def test_keep_alive(self):
+        """ Commands from every session should reuse the same connection """
+        for _i in range(2):
+            driver = self.driver()
+            for _j in range(5):
+                assert driver.title == 'Fake grid'
+            driver.quit()
+        assert self.server.connections == 1
+        pool = transport.get_pool('http', '127.0.0.1', self.server.server_address[1])
+        assert pool.stats['requests'] == 14
+
+    def test_stale_connection(self):
+        """ A connection closed by the server while idle should be replaced """
+        driver = self.driver()
+        pool = transport.get_pool('http', '127.0.0.1', self.server.server_address[1])
+        self.server.close_connections()
+        time.sleep(0.05)
+        assert driver.title == 'Fake grid'
+        assert self.server.connections == 2
+        assert pool.stats['stale'] == 1
+
+    def test_timeout_not_resent(self):
+        """ A command which times out shouldn't be sent again, since the
+        server may still carry it out """
+        with override_settings(SELENIUM_REMOTE_TIMEOUT=0.2):
+            driver = self.driver()
+            element = driver.create_web_element('grid-element')
+            assert_raises(socket.timeout, element.click)
+        time.sleep(0.5)
+        assert self.server.clicks == 1
+
+    def test_dropped_after_reading(self):
+        """ Only commands which can be repeated should be resent if the
+        server closes the connection after reading them """
+        driver = self.driver()
+        self.server.drop_next = True
+        assert driver.title == 'Fake grid'
+        element = driver.create_web_element('grid-element')
+        self.server.drop_next = True
+        assert_raises(http_client.BadStatusLine, element.click)
+        assert self.server.clicks == 1
+
+    def test_command_stats(self):
+        """ The latency of each type of command should be recorded """
+        driver = self.driver()
+        for _i in range(3):
+            driver.title
+        driver.quit()
+        lines = transport.command_stats.report()
+        assert len(lines) == 3
+        assert [line for line in lines if line.startswith('getTitle: 3 calls, mean ')]
+
+    def test_disabled(self):
+        """ Selenium's own transport should be used if the pool size is 0 """
+        with override_settings(SELENIUM_REMOTE_POOL_SIZE=0):
+            assert transport.command_executor(self.url) == self.url
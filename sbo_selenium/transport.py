@@ -0,0 +1,283 @@
+"""
+A keep-alive HTTP transport for remote WebDriver sessions (Sauce Labs, the
+Selenium standalone server, Appium).  Selenium's own ``RemoteConnection``
+opens a new connection for every command by default, so chatty tests pay for
+connection setup to the grid over and over.  ``PooledRemoteConnection`` sends
+the commands of every remote session in the process over a shared pool of
+persistent connections to each grid host, and keeps latency statistics for
+each type of command.  Enabled by setting ``SELENIUM_REMOTE_POOL_SIZE``.
+"""
+from __future__ import absolute_import
+
+import atexit
+import base64
+from collections import Counter
+import errno
+import logging
+import select
+import socket
+import threading
+import time
+
+from django.utils.six.moves import http_client, queue
+from django.utils.six.moves.urllib.parse import urljoin, urlsplit
+from selenium.webdriver.remote import utils
+from selenium.webdriver.remote.errorhandler import ErrorCode
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+from sbo_selenium.conf import settings
+
+logger = logging.getLogger('sbo_selenium')
+
+# Methods of WebDriver commands which can safely be sent again if the server
+# may already have received them
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET'])
+
+
+class ConnectionPool(object):
+    """
+    Persistent HTTP connections to one host.  Up to ``size`` idle connections
+    are kept open for reuse; if more requests than that are made at once,
+    the extra connections are closed after use.
+    """
+
+    def __init__(self, scheme, host, port, size, timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(size)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def count(self, kind):
+        with self._stats_lock:
+            self.stats[kind] += 1
+
+    def _acquire(self):
+        """ Get an idle connection, or a new one if there are none, and
+        whether or not it has been used before """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._dropped(connection):
+                connection.close()
+                self.count('stale')
+                continue
+            return connection, True
+        if self.scheme == 'https':
+            connection_class = http_client.HTTPSConnection
+        else:
+            connection_class = http_client.HTTPConnection
+        self.count('opened')
+        return connection_class(self.host, self.port,
+                                timeout=self.timeout), False
+
+    @staticmethod
+    def _dropped(connection):
+        """ Whether an idle connection has been closed by the server (so
+        anything can be read from it, even if just the end of the stream) """
+        if connection.sock is None:
+            return True
+        try:
+            readable, _w, _x = select.select([connection.sock], [], [], 0)
+        except (socket.error, ValueError):
+            return True
+        return bool(readable)
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, path, body, headers):
+        """ Make a request, returning the response's status, headers (as a
+        dictionary with lowercase keys), and body """
+        while True:
+            connection, reused = self._acquire()
+            sent = False
+            try:
+                connection.request(method, path, body, headers)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (socket.error, http_client.HTTPException) as e:
+                connection.close()
+                if reused and self._closed_while_idle(e, sent, method):
+                    # The server closed the connection while it was idle, so
+                    # it's safe to resend
+                    self.count('stale')
+                    continue
+                raise
+            self.count('requests')
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, dict(response.getheaders()), data
+
+    @staticmethod
+    def _closed_while_idle(error, sent, method):
+        """ Whether a request failed because the connection had already been
+        closed by the server, rather than timing out or failing after the
+        server may have acted on it """
+        if isinstance(error, socket.timeout):
+            return False
+        if isinstance(error, http_client.BadStatusLine):
+            # Nothing at all came back, but the server may have read the
+            # request before closing the connection; only commands which can
+            # be repeated are resent
+            return not sent or method in IDEMPOTENT_METHODS
+        return not sent and getattr(error, 'errno', None) in (
+            errno.ECONNRESET, errno.EPIPE)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(scheme, host, port):
+    """ Get the shared connection pool for the given host """
+    key = (scheme, host, port)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(scheme, host, port,
+                                         settings.SELENIUM_REMOTE_POOL_SIZE,
+                                         settings.SELENIUM_REMOTE_TIMEOUT)
+        return _pools[key]
+
+
+@atexit.register
+def close_pools():
+    """ Close all the pooled connections """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class CommandStats(object):
+    """
+    The number of times each type of WebDriver command was sent to a remote
+    server, and how long they took in total and at most.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.commands = {}
+
+    def record(self, command, seconds):
+        with self._lock:
+            count, total, longest = self.commands.get(command, (0, 0.0, 0.0))
+            self.commands[command] = (count + 1, total + seconds,
+                                      max(longest, seconds))
+
+    def report(self):
+        """ Describe the latency of each type of command, in descending
+        order of total time spent on it, one per line """
+        with self._lock:
+            commands = sorted(self.commands.items(),
+                              key=lambda item: -item[1][1])
+        return ['%s: %d calls, mean %.1f ms, max %.1f ms' % (
+            command, count, total * 1000 / count, longest * 1000)
+            for command, (count, total, longest) in commands]
+
+
+command_stats = CommandStats()
+
+
+class PooledRemoteConnection(RemoteConnection):
+    """
+    A RemoteConnection which sends its requests over the shared connection
+    pool for the server's host, and records the latency of each command.
+    """
+
+    def __init__(self, remote_server_addr):
+        RemoteConnection.__init__(self, remote_server_addr, keep_alive=False)
+
+    def execute(self, command, params):
+        start = time.time()
+        try:
+            return RemoteConnection.execute(self, command, params)
+        finally:
+            command_stats.record(command, time.time() - start)
+
+    def _request(self, method, url, body=None):
+        parsed = urlsplit(url)
+        if method not in ('POST', 'PUT'):
+            body = None
+        headers = {
+            'Accept': 'application/json',
+            'Connection': 'keep-alive',
+            'Content-Type': 'application/json;charset=UTF-8',
+        }
+        if parsed.username:
+            credentials = '%s:%s' % (parsed.username, parsed.password or '')
+            headers['Authorization'] = 'Basic %s' % base64.b64encode(
+                credentials.encode('utf-8')).decode('ascii')
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        pool = get_pool(parsed.scheme, parsed.hostname,
+                        parsed.port or (443 if parsed.scheme == 'https' else 80))
+        status, response_headers, data = pool.request(
+            method, path, body.encode('utf-8') if body else body, headers)
+        return self._response(url, status, response_headers, data)
+
+    def _response(self, url, status, headers, data):
+        """ Interpret a response the same way RemoteConnection does """
+        if 399 < status < 500:
+            return {'status': status, 'value': data}
+        if 300 <= status < 304:
+            return self._request('GET', urljoin(url, headers.get('location')))
+        body = data.decode('utf-8').replace('\x00', '').strip()
+        if headers.get('content-type', '').startswith('image/png'):
+            return {'status': ErrorCode.SUCCESS, 'value': body}
+        try:
+            data = utils.load_json(body)
+        except ValueError:
+            if 199 < status < 300:
+                status = ErrorCode.SUCCESS
+            else:
+                status = ErrorCode.UNKNOWN_ERROR
+            return {'status': status, 'value': body}
+        assert isinstance(data, dict), 'Invalid server response body: %s' % body
+        assert 'status' in data, 'Invalid server response; no status: %s' % body
+        data.setdefault('value', None)
+        return data
+
+
+def command_executor(url):
+    """ Get the command executor for a remote WebDriver at the given URL:
+    a PooledRemoteConnection if SELENIUM_REMOTE_POOL_SIZE is set, otherwise
+    just the URL (for Selenium's usual non-persistent connections) """
+    if settings.SELENIUM_REMOTE_POOL_SIZE:
+        return PooledRemoteConnection(url)
+    return url
+
+
+def report():
+    """ Describe the remote command latencies and connection reuse so far """
+    lines = command_stats.report()
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        lines.append('%s:%s: %d connections for %d requests' % (
+            pool.host, pool.port, pool.stats['opened'],
+            pool.stats['requests']))
+    return lines
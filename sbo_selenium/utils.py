@@ -1,9 +1,13 @@
+from collections import deque
 import cStringIO
 import uuid
 import threading
 import time
 import os
 
+# Number of lines of output kept by an OutputMonitor
+OUTPUT_LINES = 1000
+
 # Solution for detecting when the Selenium standalone server is ready to go by
 # listening to its console output.  Obtained from
 # http://stackoverflow.com/questions/3076542/how-can-i-read-all-availably-data-from-subprocess-popen-stdout-non-blocking/3078292#3078292
@@ -167,7 +171,8 @@ class OutputMonitor:
         self.stream = InputStreamChunker('\n')
         self.stream.daemon = True
         self.stream.start()
-        self.lines = []
+        # Only the most recent lines, as the process may run for a long time
+        self.lines = deque(maxlen=OUTPUT_LINES)
 
     def wait_for(self, text, seconds):
         """
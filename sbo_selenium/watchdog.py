@@ -0,0 +1,218 @@
+"""
+A watchdog which stops Selenium tests from hanging forever on an unresponsive
+browser.  It limits how long each test (``SELENIUM_TEST_TIMEOUT``) and each
+individual driver command (``SELENIUM_COMMAND_TIMEOUT``) may take; when a
+limit is exceeded, it logs what the test was doing, kills the browser driver
+process (and everything it started), and fails the test so the rest of the
+run can continue.  Remote browsers (Sauce Labs, a Selenium grid, or Appium)
+have no local process to kill, so the watchdog asks the server to end their
+sessions instead, without waiting long for an answer.
+
+The limits are enforced with a ``SIGALRM`` timer, which interrupts whatever
+the test's thread is blocked on, so the watchdog only works in the main thread
+of a process on platforms which support ``signal.setitimer()``.
+"""
+from __future__ import absolute_import
+
+from collections import deque
+import logging
+import signal
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+
+from sbo_selenium import drivers, processes
+
+logger = logging.getLogger('sbo_selenium')
+
+# Number of recent driver commands to include in the diagnostics
+COMMAND_HISTORY = 20
+
+# Seconds to wait for a remote session to be ended after the watchdog fires
+QUIT_TIMEOUT = 3
+
+
+class WatchdogTimeout(TimeoutException):
+    """
+    A test or driver command took longer than the watchdog allows.
+    """
+
+
+def available():
+    """Determine if the watchdog can be used in the current thread"""
+    return (hasattr(signal, 'setitimer') and
+            isinstance(threading.current_thread(), threading._MainThread))
+
+
+def quit_in_background(driver, timeout):
+    """ Try to end a driver's session in a daemon thread, so a server which
+    doesn't answer can't hang the test run; returns True if the driver quit
+    within the given number of seconds """
+    def quit():
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning('Watchdog: could not end the session: %s', e)
+
+    thread = threading.Thread(target=quit, name='watchdog-quit')
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def describe_params(params):
+    """A short description of a driver command's parameters"""
+    if not params:
+        return ''
+    params = dict((key, value) for key, value in params.items()
+                  if key not in ('sessionId', 'id'))
+    text = ', '.join('%s=%r' % item for item in sorted(params.items()))
+    return text if len(text) <= 100 else text[:97] + '...'
+
+
+class Watchdog(object):
+    """
+    Enforces the time limits for one test.  ``start()`` it when the test
+    begins, ``watch()`` its driver once that has been created, call
+    ``end_test()`` when the test itself is done (driver commands are still
+    limited during cleanup), and ``stop()`` it when everything is finished.
+    """
+
+    def __init__(self, test, test_timeout=0, command_timeout=0):
+        self.test = test
+        self.test_timeout = test_timeout
+        self.command_timeout = command_timeout
+        self.commands = deque(maxlen=COMMAND_HISTORY)
+        self.driver = None
+        self.drivers = []
+        self.current = None
+        self.fired = False
+        self.started = None
+        self._test_deadline = None
+        self._command_deadline = None
+        self._previous_handler = None
+        self._reporting = False
+
+    def start(self):
+        self.started = time.time()
+        self._previous_handler = signal.signal(signal.SIGALRM, self._expired)
+        if self.test_timeout:
+            self._test_deadline = self.started + self.test_timeout
+        self._arm()
+
+    def end_test(self):
+        self._test_deadline = None
+        self._arm()
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous_handler or signal.SIG_DFL)
+
+    def watch(self, driver):
+        """ Time and record each command sent to the given driver.  The
+        first driver watched is the one used for diagnostics; commands sent
+        from other threads are recorded, but only limited by the test
+        timeout. """
+        if self.driver is None:
+            self.driver = driver
+        self.drivers.append(driver)
+        execute = driver.execute
+
+        def watched_execute(driver_command, params=None):
+            self.commands.append((time.time(), driver_command,
+                                  describe_params(params)))
+            if not self.command_timeout or self.current is not None or \
+                    not available():
+                return execute(driver_command, params)
+            self.current = driver_command
+            self._command_deadline = time.time() + self.command_timeout
+            self._arm()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.current = None
+                self._command_deadline = None
+                self._arm()
+
+        driver.execute = watched_execute
+
+    def _arm(self):
+        """ Set the timer for the nearest deadline (if any) """
+        deadlines = [deadline for deadline in (self._test_deadline,
+                                               self._command_deadline)
+                     if deadline is not None]
+        if not deadlines:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            return
+        signal.setitimer(signal.ITIMER_REAL,
+                         max(min(deadlines) - time.time(), 0.001))
+
+    def _expired(self, signum, frame):
+        if self._reporting:
+            # Collecting the diagnostics hung too
+            raise WatchdogTimeout('Timed out collecting diagnostics')
+        now = time.time()
+        if self._command_deadline is not None and now >= self._command_deadline:
+            reason = 'The %s driver command took longer than %s seconds' % (
+                self.current, self.command_timeout)
+        elif self._test_deadline is not None and now >= self._test_deadline:
+            reason = '%s took longer than %s seconds' % (self.test.id(),
+                                                         self.test_timeout)
+        else:
+            self._arm()
+            return
+        self._test_deadline = self._command_deadline = None
+        self.fired = True
+        message = '%s\n%s' % (reason, self.diagnostics())
+        logger.error('Watchdog: %s', message)
+        self.kill()
+        raise WatchdogTimeout(message)
+
+    def diagnostics(self):
+        """ Describe the recent driver commands, and if the driver is still
+        responsive (the test timed out between commands), save a screenshot
+        and include the driver's logs """
+        lines = ['Last driver commands:']
+        for when, command, params in self.commands:
+            lines.append('  %+.3fs %s %s' % (when - self.started, command,
+                                             params))
+        if self.driver is None or self.current is not None:
+            return '\n'.join(lines)
+        self._reporting = True
+        self._command_deadline = time.time() + (self.command_timeout or 5)
+        self._arm()
+        try:
+            try:
+                path = self.test.screenshot()
+                if path:
+                    lines.append('Screenshot: %s' % path)
+            except Exception as e:
+                lines.append('Could not take a screenshot: %s' % e)
+            for log_type in ('driver', 'browser'):
+                try:
+                    entries = self.driver.get_log(log_type)
+                except Exception:
+                    continue
+                lines.append('%s log:' % log_type.capitalize())
+                lines.extend('  %s' % entry.get('message', entry)
+                             for entry in entries[-COMMAND_HISTORY:])
+        finally:
+            self._reporting = False
+            self._command_deadline = None
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        return '\n'.join(lines)
+
+    def kill(self):
+        """ Kill the drivers' processes and everything they started, or end
+        the sessions of remote drivers so they don't hold on to a grid or
+        Sauce Labs slot until the server times them out """
+        for driver in self.drivers:
+            pid = drivers.driver_pid(driver)
+            if pid:
+                processes.kill_tree(pid)
+                processes.unregister(pid)
+            elif not quit_in_background(driver, QUIT_TIMEOUT):
+                logger.warning('Watchdog: the session was not ended within '
+                               '%s seconds', QUIT_TIMEOUT)
@@ -47,4 +47,7 @@ setup(
         ],
     },
     install_requires=install_requires,
+    extras_require={
+        'screenshots': ['Pillow'],
+    },
 )
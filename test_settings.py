@@ -4,6 +4,7 @@ DEBUG = False
 JS_DEBUG = False
 ALLOWED_HOSTS = ['localhost']
 DJANGO_LIVE_TEST_SERVER_ADDRESS = 'localhost:9090'
+SELENIUM_DEFAULT_BROWSER = 'fake'
 SELENIUM_SAUCE_VERSION = '2.41.0'
 SELENIUM_TIMEOUT = 10
 
@@ -85,7 +86,14 @@ TEMPLATE_DIRS = (
     # Don't forget to use absolute paths, not relative paths.
 )
 
+FIXTURE_DIRS = (
+    os.path.join(ROOT_PATH, 'sbo_selenium', 'tests', 'fixtures'),
+)
+
 INSTALLED_APPS = (
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
     'django.contrib.staticfiles',
     'sbo_selenium',
     'django_nose',
@@ -1,11 +1,28 @@
 from django.conf import settings
 from django.conf.urls import url, patterns
 from django.conf.urls.static import static
+from django.db import connection
+from django.http import HttpResponse
 from django.views.generic import TemplateView
 
 
+def queries(request, count):
+    """ Make the requested number of trivial database queries """
+    cursor = connection.cursor()
+    for _i in range(int(count)):
+        cursor.execute('SELECT 1')
+    return HttpResponse('<p id="queries">%s</p>' % count)
+
+
+def whoami(request):
+    """ Identify the logged in user, if any """
+    return HttpResponse('<p id="user">%s</p>' % request.user.username)
+
+
 urlpatterns = patterns(
     '',
     url(r'^good_accessibility/$', TemplateView.as_view(template_name='sbo_selenium/good_accessibility.html'), {}, 'good_accessibility'),
+    url(r'^queries/(\d+)/$', queries, {}, 'queries'),
+    url(r'^whoami/$', whoami, {}, 'whoami'),
     url(r'^poor_accessibility/$', TemplateView.as_view(template_name='sbo_selenium/poor_accessibility.html'), {}, 'poor_accessibility'),
 ) + static(settings.STATIC_URL, settings.STATIC_ROOT)